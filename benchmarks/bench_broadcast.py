@@ -0,0 +1,79 @@
+"""
+多会话广播基准：N 个模拟会话各自起时钟线程、各自计算星历 (旧模式)，
+与全部订阅同一个 SkyBroadcaster (新模式) 对比每秒 CPU 时间与线程数。
+
+用法: python benchmarks/bench_broadcast.py [--sessions 1 10 50 200] [--seconds 3]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlink import astro  # noqa: E402
+from starlink.broadcast import BROADCAST_BODIES, SkyBroadcaster  # noqa: E402
+from starlink.transport import get_mount_link  # noqa: E402
+
+
+def legacy_sessions(n, stop):
+    """每个会话一个每秒唤醒的线程，各自算时钟、三个天体与设备状态。"""
+    def clock():
+        while not stop.is_set():
+            frame = astro.ObserverFrame()
+            for body in BROADCAST_BODIES:
+                astro.get_star_coords(body, frame)
+            get_mount_link().pointing_stats("127.0.0.1")
+            time.strftime("%Y-%m-%d %H:%M:%S")
+            stop.wait(1.0)
+    for _ in range(n):
+        threading.Thread(target=clock, daemon=True).start()
+
+
+def shared_sessions(n, broadcaster):
+    received = [0]
+
+    def on_tick(snapshot):
+        received[0] += 1
+    return [broadcaster.subscribe(on_tick, "127.0.0.1") for _ in range(n)], received
+
+
+def measure(seconds):
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    time.sleep(seconds)
+    return (time.process_time() - cpu0) / (time.perf_counter() - t0) * 1000
+
+
+def run(sessions, seconds):
+    get_mount_link().start()
+    SkyBroadcaster().compute()  # 预热历表缓存
+    base_threads = threading.active_count()
+    print(f"{'sessions':>8} {'legacy cpu ms/s':>16} {'threads':>8} {'shared cpu ms/s':>16} {'threads':>8}")
+    for n in sessions:
+        stop = threading.Event()
+        legacy_sessions(n, stop)
+        legacy_cpu = measure(seconds)
+        legacy_threads = threading.active_count() - base_threads
+        stop.set()
+        time.sleep(1.2)
+
+        broadcaster = SkyBroadcaster()
+        broadcaster._services_started = True  # 基准中不监听遥测端口、不联网定位
+        subs, received = shared_sessions(n, broadcaster)
+        shared_cpu = measure(seconds)
+        shared_threads = threading.active_count() - base_threads
+        for sub in subs:
+            sub.close()
+        time.sleep(1.2)
+        assert not broadcaster.running, "最后一个订阅取消后广播线程应退出"
+        print(f"{n:>8} {legacy_cpu:>16.2f} {legacy_threads:>8} {shared_cpu:>16.2f} {shared_threads:>8}"
+              f"   ({received[0]} deliveries, tick max {broadcaster.stats['tick_ms_max']:.2f} ms)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    run(args.sessions, args.seconds)
@@ -0,0 +1,125 @@
+"""
+历表缓存微基准：对比 EphemerisCache 查询、直接公式 (get_real_planet_coords) 与重构前 main.py
+中的原始标量公式的单次延迟。加速比以原始公式为基准，缓存必须比它快才有意义。
+
+用法: python benchmarks/bench_ephemeris_cache.py [--number 20000]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starlink  # noqa: E402
+
+
+def original_julian_date():
+    now = datetime.now(timezone.utc)
+    y, m = now.year, now.month
+    d = now.day + now.hour / 24.0 + now.minute / 1440.0 + now.second / 86400.0
+    if m <= 2:
+        y -= 1
+        m += 12
+    A = math.floor(y / 100)
+    B = 2 - A + math.floor(A / 4)
+    return math.floor(365.25 * (y + 4716)) + math.floor(30.6001 * (m + 1)) + d + B - 1524.5
+
+
+def original_planet_coords(body):
+    """重构前 main.py 的 get_real_planet_coords (纯 math，逐次计算儒略日)，仅作对照。"""
+    D = original_julian_date() - 2451545.0
+    obl = math.radians(23.4393 - 3.563e-7 * D)
+    if body == 'Sun':
+        w = 282.9404 + 4.70935e-5 * D
+        e = 0.016709 - 1.151e-9 * D
+        M_rad = math.radians((356.0470 + 0.9856002585 * D) % 360.0)
+        E = M_rad + e * math.sin(M_rad) * (1.0 + e * math.cos(M_rad))
+        x = math.cos(E) - e
+        y = math.sin(E) * math.sqrt(1 - e * e)
+        v = math.degrees(math.atan2(y, x))
+        lon_rad = math.radians((v + w) % 360.0)
+        x_equat = math.cos(lon_rad)
+        y_equat = math.sin(lon_rad) * math.cos(obl)
+        z_equat = math.sin(lon_rad) * math.sin(obl)
+        return math.degrees(math.atan2(y_equat, x_equat)) % 360.0, math.degrees(math.asin(z_equat))
+    if body == 'Moon':
+        L = (218.316 + 13.176396 * D) % 360.0
+        M = (134.963 + 13.064993 * D) % 360.0
+        F = (93.272 + 13.229350 * D) % 360.0
+        lon_rad = math.radians(L + 6.289 * math.sin(math.radians(M)))
+        lat_rad = math.radians(5.128 * math.sin(math.radians(F)))
+        x = math.cos(lon_rad) * math.cos(lat_rad)
+        y = math.sin(lon_rad) * math.cos(lat_rad)
+        z = math.sin(lat_rad)
+        y_equat = y * math.cos(obl) - z * math.sin(obl)
+        z_equat = y * math.sin(obl) + z * math.cos(obl)
+        return math.degrees(math.atan2(y_equat, x)) % 360.0, math.degrees(math.asin(z_equat))
+    w_m = 286.5016 + 2.92961e-5 * D
+    e_m = 0.093405 + 2.516e-9 * D
+    M_m = (19.3871 + 0.52402073 * D) % 360.0
+    a_m = 1.523688
+    i_m = math.radians(1.8496 - 8.131e-6 * D)
+    node_m = math.radians(49.5581 + 2.11081e-5 * D)
+    M_rad = math.radians(M_m)
+    E_rad = M_rad + e_m * math.sin(M_rad) * (1.0 + e_m * math.cos(M_rad))
+    xv = a_m * (math.cos(E_rad) - e_m)
+    yv = a_m * (math.sqrt(1 - e_m * e_m) * math.sin(E_rad))
+    v_m = math.atan2(yv, xv)
+    r_m = math.sqrt(xv * xv + yv * yv)
+    w_rad = math.radians(w_m)
+    xh = r_m * (math.cos(node_m) * math.cos(v_m + w_rad - node_m) -
+                math.sin(node_m) * math.sin(v_m + w_rad - node_m) * math.cos(i_m))
+    yh = r_m * (math.sin(node_m) * math.cos(v_m + w_rad - node_m) +
+                math.cos(node_m) * math.sin(v_m + w_rad - node_m) * math.cos(i_m))
+    zh = r_m * (math.sin(v_m + w_rad - node_m) * math.sin(i_m))
+    w_s = 282.9404 + 4.70935e-5 * D
+    M_s_rad = math.radians((356.0470 + 0.9856002585 * D) % 360.0)
+    E_s_rad = M_s_rad + 0.016709 * math.sin(M_s_rad)
+    xv_s = math.cos(E_s_rad) - 0.016709
+    yv_s = math.sin(E_s_rad) * math.sqrt(1 - 0.016709 ** 2)
+    lon_s = math.atan2(yv_s, xv_s) + math.radians(w_s)
+    r_s = math.sqrt(xv_s ** 2 + yv_s ** 2)
+    xg, yg, zg = xh + r_s * math.cos(lon_s), yh + r_s * math.sin(lon_s), zh
+    y_equat = yg * math.cos(obl) - zg * math.sin(obl)
+    z_equat = yg * math.sin(obl) + zg * math.cos(obl)
+    dist = math.sqrt(xg ** 2 + y_equat ** 2 + z_equat ** 2)
+    return math.degrees(math.atan2(y_equat, xg)) % 360.0, math.degrees(math.asin(z_equat / dist))
+
+
+def bench(stmt, number):
+    best = min(timeit.repeat(stmt, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def run(number):
+    cache = starlink.EphemerisCache()
+    t0 = time.time()
+    results = []
+    for body in ("Sun", "Moon", "Mars"):
+        cache.radec(body, t0)  # 预热：拟合第一个窗口
+        clock = iter(range(10 ** 9))
+        original_us = bench(lambda: original_planet_coords(body), number)
+        direct_us = bench(lambda: starlink.get_real_planet_coords(body), number)
+        cached_us = bench(lambda: cache.radec(body, t0 + next(clock) * 1e-3), number)
+        ra0, dec0 = starlink.get_real_planet_coords_batch(body, t0 + 1.0)
+        ra1, dec1 = cache.radec(body, t0 + 1.0)
+        err = max(abs((ra1 - float(ra0) + 180) % 360 - 180), abs(dec1 - float(dec0)))
+        results.append((body, original_us, direct_us, cached_us, err))
+
+    print(f"{'body':<6} {'original (us)':>14} {'direct (us)':>12} {'cached (us)':>12} "
+          f"{'vs original':>12} {'err (deg)':>10}")
+    for body, original_us, direct_us, cached_us, err in results:
+        print(f"{body:<6} {original_us:>14.2f} {direct_us:>12.2f} {cached_us:>12.2f} "
+              f"{original_us / cached_us:>11.1f}x {err:>10.2e}")
+    print(f"cache stats: {cache.stats}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    run(parser.parse_args().number)
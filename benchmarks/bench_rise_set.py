@@ -0,0 +1,67 @@
+"""
+升落求解基准：100 个目标 (太阳系天体 + 随机恒星) 一整年的升起 / 落下 / 中天，
+并抽查与逐 10 秒暴力采样的误差。
+
+用法: python benchmarks/bench_rise_set.py [--targets 100] [--days 365]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starlink  # noqa: E402
+
+LAT, LON = 22.3, 114.1
+
+
+def brute_crossings(target, t0, t1, alt_limit):
+    ts = np.arange(t0, t1, 10.0)
+    if isinstance(target, str):
+        ra, dec = starlink.get_real_planet_coords_batch(target, ts)
+    else:
+        ra, dec = target
+    alt = starlink.get_az_alt_batch(ra, dec, ts, LAT, LON)[1] - alt_limit
+    change = np.nonzero(np.sign(alt[:-1]) != np.sign(alt[1:]))[0]
+    return ts[change] + 5.0
+
+
+def run(n_targets, days, alt_limit=0.0):
+    rng = np.random.default_rng(0)
+    bodies = ['Sun', 'Moon', 'Mars']
+    stars = [(float(ra), float(dec)) for ra, dec in
+             zip(rng.uniform(0, 360, n_targets), np.degrees(np.arcsin(rng.uniform(-1, 1, n_targets))))]
+    targets = (bodies + stars)[:n_targets]
+    t0 = 1767225600.0  # 2026-01-01 UTC
+    t1 = t0 + days * 86400
+
+    starlink.rise_set_transit(targets[:2], t0, t0 + 86400, alt_limit, LAT, LON)  # 预热
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        results = starlink.rise_set_transit(targets, t0, t1, alt_limit, LAT, LON)
+        best = min(best, time.perf_counter() - start)
+    events = sum(len(r['rise']) + len(r['set']) + len(r['transit']) for r in results)
+    print(f"{len(targets)} targets x {days} days: {best * 1e3:.1f} ms, {events} events")
+
+    # 精度抽查：前 2 天与 10 s 暴力采样对比 (暴力法本身有 ±5 s 量化误差)
+    worst = 0.0
+    for r in results[:10]:
+        mine = np.sort(np.concatenate([r['rise'], r['set']]))
+        mine = mine[mine < t0 + 2 * 86400]
+        ref = brute_crossings(r['target'], t0, t0 + 2 * 86400, alt_limit)
+        if len(ref) == len(mine) and len(ref):
+            worst = max(worst, float(np.max(np.abs(ref - mine))))
+    print(f"max |error| vs brute force: {worst:.1f} s")
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--targets", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    run(args.targets, args.days)
@@ -0,0 +1,48 @@
+"""
+观测计划调度基准：随机目标下最近邻初始解与 2-opt / or-opt 改进后的总转动时间与耗时。
+
+用法: python benchmarks/bench_scheduler.py [--targets 300] [--dwell 30] [--budget 2]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starlink  # noqa: E402
+
+
+def run(n_targets, dwell, budget, seed=0):
+    rng = np.random.default_rng(seed)
+    night = starlink.night_window(time.time())
+    ra = rng.uniform(0, 360, n_targets)
+    dec = rng.uniform(-20, 85, n_targets)
+    targets = [starlink.SessionTarget(f"T{k}", (ra[k], dec[k]), min_alt=20, dwell=dwell)
+               for k in range(n_targets)]
+
+    t0 = time.perf_counter()
+    scheduler = starlink.SessionScheduler(targets, *night, start=(0.0, 90.0))
+    setup = time.perf_counter() - t0
+    plan = scheduler.plan(time_budget=budget)
+
+    order = [int(e["name"][1:]) for e in plan.entries]
+    assert scheduler.simulate(order) is not None
+    print(f"{n_targets} targets, night {(night[1] - night[0]) / 3600:.1f} h")
+    print(f"setup (windows + slew matrix): {setup * 1000:.1f} ms")
+    print(f"scheduled {len(plan)} / skipped {len(plan.skipped)}, {plan.moves} moves")
+    print(f"slew: greedy {plan.seed_slew / 60:.1f} min -> {plan.total_slew / 60:.1f} min "
+          f"({(1 - plan.total_slew / max(plan.seed_slew, 1e-9)) * 100:.0f}% less), "
+          f"planned in {plan.elapsed * 1000:.0f} ms")
+    return plan
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--targets", type=int, default=300)
+    parser.add_argument("--dwell", type=float, default=30.0)
+    parser.add_argument("--budget", type=float, default=2.0)
+    args = parser.parse_args()
+    run(args.targets, args.dwell, args.budget)
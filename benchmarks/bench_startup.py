@@ -0,0 +1,75 @@
+"""
+启动耗时基准：在全新的解释器里测量各入口的导入时间与第一次坐标计算的延迟 (中位数，已扣除空解释器启动)。
+
+同时检查核心模块没有顺带导入 flet / httpx / requests / dotenv；超出 --max-ms 或导入了
+UI / 网络依赖时返回非零，用于防止启动时间回退。
+
+用法: python benchmarks/bench_startup.py [--runs 7] [--max-ms 400]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("flet", "httpx", "requests", "dotenv")
+
+# (名称, 代码, 是否为核心路径：核心路径不得导入 HEAVY)
+CASES = [
+    ("import starlink", "import starlink", True),
+    ("astro", "import starlink.astro", True),
+    ("track / goto", "import starlink.tracking, starlink.catalog", True),
+    ("solver", "import starlink.solver", True),
+    ("cli --help", "from starlink.cli import build_parser; build_parser()", True),
+    ("first Moon coords", "from starlink.astro import get_star_coords; get_star_coords('Moon')", True),
+    ("ui (flet)", "import starlink.app", False),
+]
+PROBE = "\nimport sys, json; print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+
+
+def _run(code):
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True,
+                         text=True, check=True).stdout
+    return time.perf_counter() - t0, out
+
+
+def measure(code, runs):
+    samples, out = [], ""
+    for _ in range(runs):
+        elapsed, out = _run(code)
+        samples.append(elapsed)
+    return statistics.median(samples), out
+
+
+def run(runs, max_ms):
+    baseline, _ = measure("pass", runs)
+    results, failures = [], []
+    print(f"{'entry':<20} {'ms':>8}  heavy imports")
+    for name, code, core in CASES:
+        try:
+            elapsed, out = measure(code + PROBE.format(heavy=HEAVY), runs)
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<20} {'n/a':>8}  {e.stderr.strip().splitlines()[-1]}")
+            continue
+        ms = (elapsed - baseline) * 1000
+        heavy = json.loads(out.strip().splitlines()[-1])
+        results.append({"entry": name, "ms": ms, "heavy": heavy, "core": core})
+        print(f"{name:<20} {ms:>8.1f}  {', '.join(heavy) or '-'}")
+        if core and (heavy or (max_ms and ms > max_ms)):
+            failures.append(name)
+    print(f"baseline interpreter: {baseline * 1000:.1f} ms")
+    if failures:
+        print(f"REGRESSION: {', '.join(failures)}")
+    return results, failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--max-ms", type=float, default=400.0, help="核心入口的耗时上限 (0 为不检查)")
+    args = parser.parse_args()
+    sys.exit(1 if run(args.runs, args.max_ms)[1] else 0)
@@ -0,0 +1,428 @@
+"""
+离线可复现的基准套件：启动导入、历表 (逐点 / 批量 / 缓存)、地平转换、UDP 命令吞吐与丢包 (FakeMount)、
+端到端解析延迟 (FakeNovaServer 模拟的 nova API、fake_solver 模拟的本地解析器)。
+结果写成 JSON (含环境与配置)，可与基线比较，任一指标退化超过容差时返回 1。
+
+用法:
+  python benchmarks/suite.py [-o results.json] [--only ephemeris,udp] [--quick]
+  python benchmarks/suite.py --save-baseline baseline.json          # 在同一台机器上保存基线
+  python benchmarks/suite.py --baseline baseline.json [--tolerance 0.3]
+  弱网 / 故障: --udp-drop 0.2 --udp-ack-delay 0.01 --nova-latency 0.05 --nova-fail
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from starlink import astro  # noqa: E402
+from starlink.imaging import ImageSource, _fits_header  # noqa: E402
+from starlink.local_solver import LocalSolver  # noqa: E402
+from starlink.nova import FakeNovaServer, NovaClient  # noqa: E402
+from starlink.transport import MOUNT_PORT, FakeMount, MountLink  # noqa: E402
+
+SUITE_VERSION = 1
+
+
+def metric(value, unit, better, slack=0.0, tolerance=None, cpu=False):
+    """
+    better: 'higher' | 'lower'；slack 为绝对容差 (基线接近 0 的比率类指标)，tolerance 覆盖全局相对容差。
+    cpu=True 表示纯计算指标，比较时按两次运行的机器校准速度折算。
+    """
+    m = {"value": float(value), "unit": unit, "better": better}
+    if cpu:
+        m["cpu"] = True
+    if slack:
+        m["slack"] = slack
+    if tolerance is not None:
+        m["tolerance"] = tolerance
+    return m
+
+
+def best_rate(fn, n, repeat=5):
+    """fn() 执行 n 次操作；取 repeat 轮中最快的一轮，返回每秒操作数。"""
+    best = min(_timed(fn) for _ in range(repeat))
+    return n / best
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def calibrate():
+    """固定的 Python 循环 + NumPy 排序工作量，每秒轮数；用于抵消机器负载 / 降频造成的整体快慢。"""
+    data = np.random.default_rng(0).random(20000)
+
+    def work():
+        sum(i * i for i in range(20000))
+        np.sort(data)
+    return best_rate(work, 1, repeat=7)
+
+
+def synthetic_star_field(width=1024, height=768, n_stars=120, seed=0):
+    """固定种子的 16 位 FITS 星场 (高斯星点 + 噪声)，不需要 Pillow。"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    img = rng.normal(800.0, 12.0, (height, width))
+    for x, y, flux in zip(rng.uniform(8, width - 8, n_stars), rng.uniform(8, height - 8, n_stars),
+                          rng.lognormal(8.0, 0.8, n_stars)):
+        r0, r1, c0, c1 = int(y) - 6, int(y) + 7, int(x) - 6, int(x) + 7
+        d2 = (xx[r0:r1, c0:c1] - x) ** 2 + (yy[r0:r1, c0:c1] - y) ** 2
+        img[r0:r1, c0:c1] += flux * np.exp(-d2 / (2 * 1.5 ** 2)) / (2 * np.pi * 1.5 ** 2)
+    data = np.clip(img, -32768, 32767).astype('>i2').tobytes()
+    header = _fits_header([("SIMPLE", True), ("BITPIX", 16), ("NAXIS", 2),
+                           ("NAXIS1", width), ("NAXIS2", height)])
+    return header + data + b"\0" * (-len(data) % 2880)
+
+
+# ---- 各项基准 ----
+
+def bench_ephemeris(opts):
+    n_scalar = 200 if opts.quick else 2000
+    n_batch = 20000 if opts.quick else 200000
+    t0 = time.time()
+    ts = t0 + np.arange(n_batch) * 60.0
+    cache = astro.EphemerisCache()
+    for body in astro.BODIES:
+        cache.radec(body, t0)  # 预热：拟合第一个窗口
+
+    def scalar():
+        for _ in range(n_scalar // len(astro.BODIES)):
+            for body in astro.BODIES:
+                astro.get_real_planet_coords(body)
+
+    def batch():
+        for body in astro.BODIES:
+            astro.get_real_planet_coords_batch(body, ts[:n_batch // len(astro.BODIES)])
+
+    def cached():
+        for k in range(n_scalar // len(astro.BODIES)):
+            for body in astro.BODIES:
+                cache.radec(body, t0 + k * 1e-3)
+
+    scalar_rate = best_rate(scalar, n_scalar // 3 * 3)
+    batch_rate = best_rate(batch, n_batch // 3 * 3)
+    return {
+        "ephemeris.scalar": metric(scalar_rate, "calls/s", "higher", cpu=True),
+        "ephemeris.batch": metric(batch_rate, "points/s", "higher", cpu=True),
+        "ephemeris.cached": metric(best_rate(cached, n_scalar // 3 * 3), "calls/s", "higher", cpu=True),
+        "ephemeris.batch_speedup": metric(batch_rate / scalar_rate, "x", "higher"),
+    }
+
+
+def bench_az_alt(opts):
+    n_scalar = 500 if opts.quick else 5000
+    n_batch = 50000 if opts.quick else 500000
+    rng = np.random.default_rng(1)
+    ra, dec = rng.uniform(0, 360, n_batch), rng.uniform(-90, 90, n_batch)
+    frame = astro.ObserverFrame()
+    now = time.time()
+
+    def scalar():
+        for k in range(n_scalar):
+            astro.get_az_alt(ra[k], dec[k])
+
+    def scalar_frame():
+        for k in range(n_scalar):
+            astro.get_az_alt(ra[k], dec[k], frame)
+
+    def batch():
+        astro.get_az_alt_batch(ra, dec, now)
+
+    # 日 / 月 / 火一次刷新：共享一帧 (get_targets_coords) 与各自取时刻的逐个调用
+    n_refresh = n_scalar // 5
+
+    def targets_shared():
+        for _ in range(n_refresh):
+            astro.get_targets_coords(astro.BODIES)
+
+    def targets_separate():
+        for _ in range(n_refresh):
+            for body in astro.BODIES:
+                astro.get_star_coords(body)
+
+    return {
+        "az_alt.scalar": metric(best_rate(scalar, n_scalar), "calls/s", "higher", cpu=True),
+        "az_alt.shared_frame": metric(best_rate(scalar_frame, n_scalar), "calls/s", "higher", cpu=True),
+        "az_alt.batch": metric(best_rate(batch, n_batch), "points/s", "higher", cpu=True),
+        "az_alt.targets_shared": metric(best_rate(targets_shared, n_refresh), "refreshes/s", "higher",
+                                        cpu=True),
+        "az_alt.targets_separate": metric(best_rate(targets_separate, n_refresh), "refreshes/s",
+                                          "higher", cpu=True),
+    }
+
+
+def _open_fake_mount(opts):
+    mount = FakeMount(drop_rate=opts.udp_drop, ack_delay=opts.udp_ack_delay, seed=0)
+    try:
+        port = mount.start_in_thread(port=opts.udp_port)
+    except OSError:
+        # 8888 被占用 (例如本机正运行真实的桥接程序)：改用临时端口
+        mount.close()
+        mount = FakeMount(drop_rate=opts.udp_drop, ack_delay=opts.udp_ack_delay, seed=0)
+        port = mount.start_in_thread(port=0)
+    return mount, port
+
+
+def bench_udp(opts):
+    mount, port = _open_fake_mount(opts)
+    burst = 2000 if opts.quick else 20000
+    paced_rate, paced_seconds = 50.0, 1.0 if opts.quick else 3.0
+    gotos = 50 if opts.quick else 200
+
+    # 突发吞吐：同步 send() 的调用速率 (新命令会取代未确认的旧命令)
+    link = MountLink().start()
+    t0 = time.perf_counter()
+    for k in range(burst):
+        link.send("127.0.0.1", k % 360, 45.0, port=port, protocol="binary")
+    throughput = burst / (time.perf_counter() - t0)
+    link.stop()
+
+    # 追踪节奏 (50 Hz)：新命令取代未确认的旧命令，统计确认率、设备收到的比例与往返时延
+    link = MountLink().start()
+    received0 = mount.counts["goto"]
+    n = int(paced_rate * paced_seconds)
+    period = 1.0 / paced_rate
+    start = time.perf_counter()
+    for k in range(n):
+        link.send("127.0.0.1", k * 0.01, 45.0, port=port, protocol="binary")
+        time.sleep(max(0.0, start + (k + 1) * period - time.perf_counter()))
+    settle = link.transport.ack_timeout * (link.transport.max_retries + 1) + 0.1
+    time.sleep(settle)
+    tracking = link.stats("127.0.0.1", port)
+    received = mount.counts["goto"] - received0
+    link.stop()
+
+    # 单次 GOTO：逐条等到 ACK 或重传耗尽，统计重传后的丢包率
+    link = MountLink().start()
+    for k in range(gotos):
+        link.send("127.0.0.1", k * 1.0, 30.0, port=port, protocol="binary")
+        deadline = time.monotonic() + settle
+        while time.monotonic() < deadline:
+            s = link.stats("127.0.0.1", port)
+            if s["acked"] + s["lost"] > k:
+                break
+            time.sleep(0.001)
+    goto = link.stats("127.0.0.1", port)
+    link.stop()
+    mount.close()
+    return {
+        "udp.burst_throughput": metric(throughput, "cmds/s", "higher", cpu=True),
+        "udp.tracking_acked": metric(tracking["acked"] / max(tracking["sent"], 1), "ratio",
+                                     "higher", slack=0.05),
+        "udp.tracking_received": metric(received / max(tracking["sent"], 1), "ratio", "higher",
+                                        slack=0.05),
+        "udp.rtt_avg_ms": metric(tracking["rtt_avg_ms"] or 0.0, "ms", "lower", slack=0.5,
+                                 tolerance=1.0),
+        "udp.rtt_max_ms": metric(tracking["rtt_max_ms"] or 0.0, "ms", "lower", slack=2.0,
+                                 tolerance=2.0),
+        "udp.goto_loss_rate": metric(goto["loss_rate"], "ratio", "lower", slack=0.02),
+        "udp.goto_retransmits": metric(goto["retransmits"] / max(goto["sent"], 1), "per cmd",
+                                       "lower", slack=0.1),
+    }
+
+
+def bench_solve(opts):
+    runs = 2 if opts.quick else 5
+    image = synthetic_star_field()
+    server = FakeNovaServer(queue_delay=opts.nova_queue_delay, solve_delay=opts.nova_solve_delay,
+                            latency=opts.nova_latency, fail=opts.nova_fail).start()
+
+    async def nova_runs():
+        # 与 App 相同的轮询 / 超时策略，只把地址指向本地模拟服务
+        async with NovaClient(api_key="bench", base_url=server.url) as client:
+            latencies, ok = [], 0
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                with ImageSource.open(file_bytes=image) as source:
+                    result = await client.solve(source)
+                latencies.append(time.perf_counter() - t0)
+                ok += bool(result[0])
+            return latencies, ok, client.timings_snapshot(), client.last_upload_bytes
+
+    try:
+        latencies, ok, phases, upload_bytes = asyncio.run(nova_runs())
+    finally:
+        server.stop()
+
+    # 本地解析：fake_solver 子进程 (启动、结果解析与临时目录的固定开销)
+    solver = LocalSolver(executable=os.path.join(ROOT, "tools", "fake_solver.py"),
+                         workers=2, timeout=30)
+    local = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        solver.solve(file_bytes=image)
+        local.append(time.perf_counter() - t0)
+
+    out = {
+        "solve.nova_p50_ms": metric(statistics.median(latencies) * 1e3, "ms", "lower"),
+        "solve.nova_max_ms": metric(max(latencies) * 1e3, "ms", "lower"),
+        "solve.nova_success_rate": metric(ok / runs, "ratio", "higher"),
+        "solve.nova_upload_kb": metric(upload_bytes / 1024, "KB", "lower", slack=1.0),
+        "solve.local_p50_ms": metric(statistics.median(local) * 1e3, "ms", "lower",
+                                     slack=20.0),
+    }
+    for phase in ("prepare", "upload", "queue", "solve"):
+        if phases[phase]["count"]:
+            out[f"solve.nova_{phase}_ms"] = metric(phases[phase]["mean_ms"], "ms", "lower",
+                                                   slack=5.0, cpu=phase == "prepare")
+    return out
+
+
+def bench_startup(opts):
+    """复用 bench_startup 的测量：全新解释器中核心入口的导入耗时与是否顺带导入了 UI / 网络依赖。"""
+    import bench_startup
+    runs = 3 if opts.quick else 7
+
+    def fastest(code):
+        # 取最快的一次而不是中位数：进程启动受机器负载影响大，最小值在两次运行间更稳定
+        samples = [bench_startup._run(code) for _ in range(runs)]
+        return min(samples)
+
+    base, _ = fastest("pass")
+    out, heavy = {}, 0
+    for name, code, core in bench_startup.CASES:
+        if not core:
+            continue
+        elapsed, probe = fastest(code + bench_startup.PROBE.format(heavy=bench_startup.HEAVY))
+        heavy += len(json.loads(probe.strip().splitlines()[-1]))
+        key = "startup." + re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+        out[key] = metric((elapsed - base) * 1e3, "ms", "lower", slack=15.0, tolerance=0.5,
+                             cpu=True)
+    out["startup.heavy_imports"] = metric(heavy, "modules", "lower")
+    return out
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "ephemeris": bench_ephemeris,
+    "az_alt": bench_az_alt,
+    "udp": bench_udp,
+    "solve": bench_solve,
+}
+
+
+# ---- 结果与比较 ----
+
+def environment():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        rev = ""
+    return {"git": rev, "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "machine": platform.machine(),
+            "cpus": os.cpu_count()}
+
+
+def speed_factors(results, baseline):
+    """每组基准的机器速度比 (当前 / 基线)，两边都有校准值时才折算。"""
+    cur, base = results.get("calibration", {}), baseline.get("calibration", {})
+    return {g: cur[g] / base[g] for g in cur if base.get(g)}
+
+
+def compare(results, baseline, tolerance):
+    """
+    返回 [(指标, 基线, 当前, 变化百分比, 是否退化)]，只比较两边都有的指标。
+    cpu 指标的基线先按本组的机器速度比折算 (机器整体慢了一半时，吞吐期望也减半)。
+    """
+    factors = speed_factors(results, baseline)
+    rows = []
+    for name, cur in sorted(results["metrics"].items()):
+        base = baseline.get("metrics", {}).get(name)
+        if base is None:
+            continue
+        expected = base["value"]
+        if cur.get("cpu"):
+            factor = factors.get(name.split(".")[0], 1.0)
+            expected = expected * factor if cur["better"] == "higher" else expected / factor
+        tol = cur.get("tolerance", tolerance)
+        worse = (cur["value"] - expected) if cur["better"] == "lower" else (expected - cur["value"])
+        allowed = max(abs(expected) * tol, cur.get("slack", 0.0))
+        change = (cur["value"] / expected - 1) * 100 if expected else 0.0
+        rows.append((name, expected, cur["value"], change, worse > allowed))
+    return rows
+
+
+def run(opts):
+    names = opts.only.split(",") if opts.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"未知基准: {', '.join(unknown)} (可选 {', '.join(BENCHMARKS)})")
+    config = {k: v for k, v in vars(opts).items()
+              if k.startswith(("udp_", "nova_")) or k == "quick"}
+    results = {"suite": "starlink", "version": SUITE_VERSION, "created": time.time(),
+               "environment": environment(), "config": config, "calibration": {}, "metrics": {}}
+    for name in names:
+        t0 = time.perf_counter()
+        before = calibrate()
+        results["metrics"].update(BENCHMARKS[name](opts))
+        results["calibration"][name] = (before + calibrate()) / 2
+        print(f"[{name}] {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+
+    print(f"{'metric':<28} {'value':>14}  unit")
+    for name, m in results["metrics"].items():
+        print(f"{name:<28} {m['value']:>14.4g}  {m['unit']}")
+    for path in (opts.output, opts.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=1, ensure_ascii=False)
+
+    if not opts.baseline:
+        return 0
+    with open(opts.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("config") != config:
+        print(f"⚠️ 基线的配置不同: {baseline.get('config')}", file=sys.stderr)
+    if baseline.get("environment", {}).get("machine") != results["environment"]["machine"]:
+        print("⚠️ 基线来自不同的机器，比较结果仅供参考", file=sys.stderr)
+    rows = compare(results, baseline, opts.tolerance)
+    factors = speed_factors(results, baseline)
+    if factors:
+        print("机器速度比 (当前/基线): " + ", ".join(f"{g} {f:.2f}" for g, f in factors.items()),
+              file=sys.stderr)
+    print(f"\n{'metric':<28} {'expected':>12} {'current':>12} {'change':>8}")
+    for name, base, cur, change, bad in rows:
+        print(f"{name:<28} {base:>12.4g} {cur:>12.4g} {change:>+7.1f}%{'  ✘ REGRESSION' if bad else ''}")
+    regressions = [r[0] for r in rows if r[4]]
+    if regressions:
+        print(f"\n{len(regressions)} 项退化超过容差: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    print(f"\n{len(rows)} 项指标均在容差内", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="结果 JSON")
+    parser.add_argument("--only", help=f"逗号分隔: {','.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="缩小规模，约 10 秒跑完")
+    parser.add_argument("--baseline", help="与该结果 JSON 比较，退化时返回 1")
+    parser.add_argument("--save-baseline", help="把本次结果另存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="相对容差 (缺省 0.3，即变差 30%% 以内不算退化)")
+    parser.add_argument("--udp-port", type=int, default=MOUNT_PORT,
+                        help="FakeMount 监听端口 (被占用时改用临时端口)")
+    parser.add_argument("--udp-drop", type=float, default=0.0, help="FakeMount 丢包率")
+    parser.add_argument("--udp-ack-delay", type=float, default=0.0, help="FakeMount 回 ACK 前的延迟 (秒)")
+    parser.add_argument("--nova-latency", type=float, default=0.0, help="模拟 nova 每个请求的附加延迟 (秒)")
+    parser.add_argument("--nova-queue-delay", type=float, default=0.2, help="上传到分配 job 的秒数")
+    parser.add_argument("--nova-solve-delay", type=float, default=0.5, help="job 到解析完成的秒数")
+    parser.add_argument("--nova-fail", action="store_true", help="模拟 nova 解析失败")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
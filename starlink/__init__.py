@@ -0,0 +1,76 @@
+"""
+StarLink 核心包：天文算法、赤道仪通信、追踪与观测计划、星图解析与星表，不依赖 UI。
+
+子模块按需导入：``import starlink`` 只执行本文件，``starlink.get_star_coords`` 之类的顶层名称
+在第一次访问时才导入所在子模块 (PEP 562)，树莓派上的命令行不会为用不到的功能付出启动时间。
+界面在 ``starlink.app`` (需要 flet)，命令行入口为 ``starlink.cli:main``。
+"""
+import importlib
+
+__version__ = "1.0.0"
+
+_EXPORTS = {
+    "astro": (
+        "BODIES", "EPHEMERIS_CACHE", "EphemerisCache", "ObserverFrame", "VisibilityTargets",
+        "get_az_alt", "get_az_alt_batch", "get_real_planet_coords",
+        "get_real_planet_coords_batch", "get_star_coords", "get_star_coords_batch",
+        "get_targets_coords", "load_cached_location", "rise_set_transit",
+        "set_observer_location", "update_location_from_network", "visibility_windows",
+    ),
+    "transport": (
+        "FakeMount", "MountFleet", "MountLink", "MountRegistry", "Trajectory",
+        "angular_separation_deg", "angular_separation_deg_batch", "get_fleet",
+        "get_mount_link", "send_trajectory_command", "send_udp_command",
+    ),
+    "tracking": (
+        "SessionPlan", "SessionRunner", "SessionScheduler", "SessionTarget",
+        "TrackingEngine", "night_window", "plan_session",
+    ),
+    "imaging": ("ImageSource", "extract_stars", "image_dimensions", "load_image_gray",
+                "write_xylist"),
+    "nova": (
+        "FakeNovaServer", "NovaClient", "NovaError", "SOLVE_CACHE", "SolveCache",
+        "solve_star_image_nova",
+    ),
+    "solver": (
+        "SOLVER_BACKENDS", "StarIndex", "get_star_index", "register_backend", "solve_hints",
+        "solve_offline", "solve_star_image", "solve_star_image_offline",
+    ),
+    "local_solver": ("LocalSolver", "get_local_solver", "solve_star_image_local"),
+    "catalog": ("SkyCatalog", "annotate_field", "get_sky_catalog", "resolve_target"),
+    "batch": ("BatchProgress", "BatchResultWriter", "find_images", "solve_directory"),
+    "broadcast": ("SkyBroadcaster", "get_broadcaster"),
+    "metrics": ("JsonlExporter", "MetricsRegistry", "MetricsServer", "Profiler"),
+}
+_LOCATIONS = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_LOCATIONS) + ["load_env"]
+
+
+def __getattr__(name):
+    module = _LOCATIONS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # 之后的访问不再经过 __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+_env_loaded = False
+
+
+def load_env():
+    """加载 .env (python-dotenv 为可选依赖)。只由入口 (命令行 / App) 调用，导入核心模块没有副作用。"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    try:
+        from dotenv import find_dotenv, load_dotenv
+    except ImportError:
+        return
+    load_dotenv(find_dotenv(usecwd=True))
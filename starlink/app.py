@@ -0,0 +1,864 @@
+"""
+App 界面 UI — 适配 Flet 0.80.5 (1.0 Beta)。只有这里依赖 flet。
+"""
+import asyncio
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+
+import flet as ft
+
+from . import load_env, metrics
+from .astro import get_az_alt, rise_set_transit
+from .broadcast import get_broadcaster
+from .batch import solve_directory
+from .catalog import OBJECT_KINDS, get_sky_catalog, resolve_target
+from .solver import SOLVER_BACKEND, solve_hints, solve_star_image
+from .tracking import SessionRunner, SessionTarget, TrackingEngine, plan_session
+from .transport import MOUNT_PROTOCOL, get_mount_link, send_trajectory_command, send_udp_command
+
+
+UI_MAX_FPS = float(os.getenv("STARLINK_UI_FPS", "15"))
+
+
+class UiScheduler:
+    """
+    Flet 页面的唯一刷新出口。
+
+    生产者 (事件处理器、追踪 / 解析 / 计划线程) 只调用 post(fn, *args) 投递修改控件的回调，
+    或 request() 标记页面需要刷新；调度协程运行在页面的事件循环上，把一帧内到达的请求合并，
+    依次执行回调后只调用一次 page.update()，两帧间隔不小于 1 / max_fps。
+    带 key 的投递只保留同 key 最新的一个 (高频数据源如 50 Hz 追踪只画最后一帧)。
+    回调都在事件循环线程中执行，后台线程从不直接修改控件或调用 page.update()。
+    """
+
+    def __init__(self, page, max_fps=UI_MAX_FPS):
+        self.page = page
+        self.max_fps = max(float(max_fps), 1.0)
+        self.closed = False
+        self.stats = {"posts": 0, "frames": 0, "coalesced": 0, "errors": 0}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._loop = None
+        self._wake = None
+        self._future = None
+        self._metrics = None
+
+    def start(self):
+        if self._future is None:
+            self._loop = self.page.loop
+            self._wake = asyncio.Event()
+            self._future = asyncio.run_coroutine_threadsafe(self._run(), self._loop)
+            self._metrics = metrics.register_collector("ui", lambda: self.stats,
+                                                       session=f"{id(self):x}")
+
+    def stop(self):
+        self.closed = True
+        if self._future is not None:
+            self._future.cancel()
+            metrics.unregister_collector(self._metrics)
+
+    def post(self, fn=None, *args, key=None):
+        """任意线程可调用。fn 为 None 时只请求刷新。"""
+        if self.closed:
+            return
+        with self._lock:
+            if key is None:
+                self._seq += 1
+                key = self._seq
+            else:
+                self._pending.pop(key, None)  # 重新插入，保持与其他回调的先后顺序
+            self._pending[key] = (fn, args)
+            self.stats["posts"] += 1
+        self._loop.call_soon_threadsafe(self._wake.set)
+
+    def request(self):
+        self.post(None, key="__update__")
+
+    async def _run(self):
+        period = 1.0 / self.max_fps
+        last = -period
+        while not self.closed:
+            await self._wake.wait()
+            delay = last + period - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)  # 帧间隔内陆续到达的请求一并合并
+            self._wake.clear()
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            for fn, args in batch.values():
+                if fn is None:
+                    continue
+                try:
+                    fn(*args)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    metrics.inc("ui_callback_failures")
+                    print(f"UI 回调异常: {e}")
+            try:
+                with metrics.timer("ui_update_seconds"):
+                    self.page.update()
+            except Exception as e:
+                print(f"页面已关闭，停止刷新: {e}")
+                self.closed = True
+                break
+            last = self._loop.time()
+            self.stats["frames"] += 1
+            self.stats["coalesced"] = self.stats["posts"] - self.stats["frames"]
+
+
+def main(page: ft.Page):
+    # 定位、遥测监听、时钟与星历都由进程级广播统一负责，每个会话只订阅
+    broadcaster = get_broadcaster()
+    try:
+        page.title = "StarLink Pro"
+        page.theme_mode = ft.ThemeMode.DARK
+        page.padding = 20
+        page.scroll = ft.ScrollMode.AUTO
+        page.horizontal_alignment = ft.CrossAxisAlignment.CENTER
+
+        # 桌面端设置窗口大小
+        try:
+            if hasattr(page, 'window') and hasattr(page.window, 'width'):
+                page.window.width = 390
+                page.window.height = 844
+                page.window.resizable = False
+                page.window.always_on_top = True
+        except Exception:
+            pass
+
+        # 所有刷新经 UiScheduler 合并推送；关闭 Flet 1.0 在每个事件处理器结束时的自动刷新
+        if hasattr(ft, "context") and hasattr(ft.context, "disable_auto_update"):
+            ft.context.disable_auto_update()
+        ui = UiScheduler(page)
+        ui.start()
+
+        # ---- UI 组件 ----
+        header_time_loc = ft.Text(
+            "正在同步卫星定位与时间...",
+            color="#80DEEA", size=12, text_align=ft.TextAlign.CENTER,
+        )
+        status_text = ft.Text(
+            "🚀 Ready / 系统就绪", color="#4CAF50", size=14,
+            weight=ft.FontWeight.BOLD,
+        )
+        guide_text = ft.Text(
+            "AI Vision / 自动识别结果", color="#9C27B0", size=16,
+            weight=ft.FontWeight.BOLD,
+        )
+        object_info = ft.Text("Waiting for image...", color="#FFFFFF", size=14)
+        time_stamp = ft.Text("", color="#BDBDBD", size=12, visible=False)
+
+        ip_input = ft.TextField(
+            label="ESP32 IP (多台用逗号分隔)", value="192.168.68.107",
+            border_color="#00BCD4",
+            expand=True,
+        )
+        protocol_dropdown = ft.Dropdown(
+            label="Protocol / 协议", value=MOUNT_PROTOCOL, width=130,
+            options=[
+                ft.dropdown.Option("text"),
+                ft.dropdown.Option("binary"),
+                ft.dropdown.Option("auto"),
+            ],
+        )
+        ra_input = ft.TextField(label="RA (deg) / 赤经", expand=True)
+        dec_input = ft.TextField(label="Dec (deg) / 赤纬", expand=True)
+        az_input = ft.TextField(label="Az / 方位角", expand=True, read_only=True)
+        alt_input = ft.TextField(
+            label="Alt / 地平高度", expand=True, read_only=True)
+        manual_path_input = ft.TextField(label="手动填入图片路径 / 批量目录", expand=True)
+        sky_search = ft.TextField(
+            label="Search / 搜索 (M31, NGC 7000, Vega)", expand=True,
+        )
+        whats_up_list = ft.Column(spacing=0)
+        vis_target = ft.TextField(
+            label="Visibility / 升落 (Sun, M42, 83.8,-5.4)", expand=True,
+        )
+        vis_limit = ft.TextField(label="Alt ≥ °", value="20", width=90)
+        vis_text = ft.Text("", size=12, color="#B0BEC5")
+        session_input = ft.TextField(
+            label="Session / 今晚计划 (M31; M42; Moon; 83.8,-5.4)", expand=True,
+        )
+        session_text = ft.Text("", size=12, color="#B0BEC5")
+        solver_dropdown = ft.Dropdown(
+            label="Solver / 解析", value=SOLVER_BACKEND, width=170,
+            options=[
+                ft.dropdown.Option("nova", "nova (cloud)"),
+                ft.dropdown.Option("offline", "offline"),
+                ft.dropdown.Option("local", "local (solve-field/ASTAP)"),
+                ft.dropdown.Option("local,nova", "local → nova"),
+            ],
+        )
+        track_switch = ft.Switch(label="Continuous Tracking / 持续追踪", value=False)
+        trajectory_switch = ft.Switch(label="Trajectory / 轨迹上传", value=False)
+        rate_slider = ft.Slider(
+            min=TrackingEngine.MIN_RATE, max=TrackingEngine.MAX_RATE,
+            divisions=49, value=5, label="{value} Hz", expand=True,
+        )
+        track_stats = ft.Text("", color="#BDBDBD", size=11, visible=False)
+        pointing_text = ft.Text("", color="#80DEEA", size=11, visible=False)
+
+        # ---- FilePicker (Flet 0.80: Service, async API) ----
+        file_picker = ft.FilePicker()
+
+        # ---- 实时时钟 (进程级广播的订阅者) ----
+        def show_sky(snapshot):
+            header_time_loc.value = (
+                f"📍 实时位置 ({snapshot['lat']:.2f}°N, {snapshot['lon']:.2f}°E)\n"
+                f"🕒 {snapshot['clock']}"
+            )
+            state = snapshot["mounts"].get((sky_sub.mounts, sky_sub.protocol))
+            if not state:
+                return
+            if "fleet" in state:
+                pointing_text.visible = True
+                pointing_text.value = f"🔭 {state['size']} mounts: " + ", ".join(
+                    f"{n} {s}" for s, n in sorted(state["fleet"].items()))
+                return
+            pointing = state["pointing"]
+            if pointing and pointing["samples"]:
+                pointing_text.visible = True
+                pointing_text.value = (
+                    f"🛰 RMS {pointing['rms_error_deg']:.3f}°"
+                    f" | max {pointing['max_error_deg']:.3f}°"
+                    f" | lag {pointing['max_lag_ms'] or 0:.0f} ms"
+                    f" | n={pointing['samples']}"
+                )
+
+        def on_sky_tick(snapshot):
+            if ui.closed:
+                raise RuntimeError("session closed")  # 广播端据此移除订阅
+            ui.post(show_sky, snapshot, key="clock")
+
+        # ---- 坐标联动 ----
+        def on_coords_change(e):
+            if ra_input.value and dec_input.value:
+                try:
+                    az, alt = get_az_alt(ra_input.value, dec_input.value)
+                    az_input.value = f"{az:.2f}°"
+                    alt_input.value = f"{alt:.2f}°"
+                    ui.request()
+                except Exception:
+                    pass
+
+        ra_input.on_change = on_coords_change
+        dec_input.on_change = on_coords_change
+
+        # ---- 持续追踪 ----
+        def show_track(ra, dec, az, alt, ok, msg):
+            ra_input.value = f"{ra:.4f}"
+            dec_input.value = f"{dec:.4f}"
+            az_input.value = f"{az:.2f}°"
+            alt_input.value = f"{alt:.2f}°"
+            s = tracker.stats.snapshot()
+            track_stats.value = (
+                f"⏱ {tracker.rate_hz:.0f} Hz | jitter {s['jitter_mean_ms']:.1f}"
+                f"/{s['jitter_max_ms']:.1f} ms | missed {s['missed']}"
+                f" | fail {s['send_failures']}"
+            )
+            if tracker.mode == 'trajectory':
+                track_stats.value += f" | segs {s['segments']}"
+            try:
+                link = get_mount_link().stats(tracker.ip)
+                if link["rtt_avg_ms"] is not None:
+                    track_stats.value += (
+                        f"\n📡 loss {link['loss_rate'] * 100:.1f}%"
+                        f" | rtt {link['rtt_avg_ms']:.1f} ms"
+                        f" | retx {link['retransmits']}"
+                    )
+            except Exception:
+                pass
+            if not ok:
+                status_text.value = msg
+                status_text.color = "#F44336"
+
+        def on_track_update(ra, dec, az, alt, ok, msg):
+            # 追踪线程可能以 50 Hz 回调：同一个 key 只保留最新一帧，由调度器按帧率刷新
+            if ui.closed:
+                tracker.stop()
+                return
+            ui.post(show_track, ra, dec, az, alt, ok, msg, key="track")
+
+        def send_to_mount(ip, ra, dec):
+            return send_udp_command(ip, ra, dec, protocol=protocol_dropdown.value)
+
+        def send_trajectory_to_mount(ip, trajectory):
+            return send_trajectory_command(ip, trajectory,
+                                           protocol=protocol_dropdown.value)
+
+        tracker = TrackingEngine(rate_hz=rate_slider.value,
+                                 send_fn=send_to_mount,
+                                 trajectory_fn=send_trajectory_to_mount,
+                                 on_update=on_track_update)
+
+        def track_target(target):
+            """持续追踪开启时把目标交给追踪引擎，返回是否已接管。"""
+            if not track_switch.value:
+                return False
+            tracker.ip = ip_input.value
+            tracker.start(target)
+            track_stats.visible = True
+            return True
+
+        def on_track_toggle(e):
+            if track_switch.value:
+                target = tracker.target
+                if target is None and ra_input.value and dec_input.value:
+                    try:
+                        target = (float(ra_input.value), float(dec_input.value))
+                    except ValueError:
+                        target = None
+                if target is None:
+                    track_switch.value = False
+                    status_text.value = "⚠️ 请先选择目标"
+                    status_text.color = "#FF9800"
+                else:
+                    track_target(target)
+                    status_text.value = f"🎯 Tracking @ {tracker.rate_hz:.0f} Hz"
+                    status_text.color = "#00BCD4"
+            else:
+                tracker.stop()
+                track_stats.visible = False
+                status_text.value = "⏹ 追踪已停止"
+                status_text.color = "#FF9800"
+            ui.request()
+
+        def on_rate_change(e):
+            tracker.set_rate(rate_slider.value)
+
+        def on_trajectory_toggle(e):
+            tracker.set_mode('trajectory' if trajectory_switch.value else 'stream')
+
+        def on_ip_commit(e):
+            # 回车或失焦时才生效：逐键更新会让广播线程去解析输入到一半的主机名
+            tracker.ip = ip_input.value
+            sky_sub.set_mounts(ip_input.value, protocol_dropdown.value)
+
+        track_switch.on_change = on_track_toggle
+        rate_slider.on_change_end = on_rate_change
+        trajectory_switch.on_change = on_trajectory_toggle
+        ip_input.on_submit = on_ip_commit
+        ip_input.on_blur = on_ip_commit
+        protocol_dropdown.on_change = on_ip_commit
+
+        # ---- AI 识别处理 ----
+        async def start_processing(file_path=None, file_bytes=None):
+            if not file_path and not file_bytes:
+                status_text.value = "❌ 未选择文件"
+                status_text.color = "#F44336"
+                ui.request()
+                return
+
+            object_info.value = "Analyzing star map..."
+            status_text.value = "⏳ Processing AI Analysis..."
+            status_text.color = "#FF9800"
+            ui.request()
+
+            def show_progress(msg):
+                status_text.value = msg
+                status_text.color = "#FF9800"
+
+            # 坐标框里总是最近发送给赤道仪的目标：作为位置提示缩小解析搜索范围
+            try:
+                hints = solve_hints(float(ra_input.value), float(dec_input.value))
+            except (TypeError, ValueError):
+                hints = None
+
+            def blocking_solve():
+                """在线程中执行耗时的网络请求"""
+                def progress_cb(msg):
+                    ui.post(show_progress, msg, key="progress")
+                try:
+                    success, ra, dec, az, alt, msg = solve_star_image(
+                        file_path=file_path.strip().strip('"') if file_path else None,
+                        file_bytes=file_bytes,
+                        progress_cb=progress_cb,
+                        backend=solver_dropdown.value,
+                        hints=hints,
+                    )
+                    return ("ok", success, ra, dec, az, alt, msg)
+                except Exception as ex:
+                    return ("error", str(ex))
+
+            # 进度由后台线程经调度器推送，这里只等待结果
+            result = await asyncio.get_running_loop().run_in_executor(None, blocking_solve)
+
+            if result[0] == "ok":
+                _, success, ra, dec, az, alt, msg = result
+                if success:
+                    ra_input.value = f"{ra:.4f}"
+                    dec_input.value = f"{dec:.4f}"
+                    az_input.value = f"{az:.2f}°"
+                    alt_input.value = f"{alt:.2f}°"
+                    object_info.value = f"Target: {msg}"
+                    try:
+                        catalog = get_sky_catalog()
+                        hit = catalog.nearest(ra, dec, max_radius=2.0,
+                                              kinds=[k for k in OBJECT_KINDS if k != '*'])
+                        if hit:
+                            object_info.value += f"\nNearest: {catalog.label(hit[0])} ({hit[1]:.2f}°)"
+                    except Exception:
+                        pass
+                    time_stamp.visible = True
+                    time_stamp.value = f"Resolved: {datetime.now().strftime('%H:%M:%S')}"
+                    if not track_target((ra, dec)):
+                        send_to_mount(ip_input.value, ra, dec)
+                    status_text.value = "✨ Match Found & Sent!"
+                    status_text.color = "#00BCD4"
+                else:
+                    object_info.value = "Analysis Failed"
+                    status_text.value = f"❌ {msg}"
+                    status_text.color = "#F44336"
+            else:
+                _, err_msg = result
+                object_info.value = "Analysis Error"
+                status_text.value = f"❌ 异常: {err_msg}"
+                status_text.color = "#F44336"
+
+            ui.request()
+
+        # ---- 批量解析 (手动路径填目录) ----
+        batch_state = {"stop": None}
+
+        async def on_batch_click(e):
+            if batch_state["stop"] is not None:
+                batch_state["stop"].set()
+                status_text.value = "⏹ 正在停止批量解析 (等待进行中的帧) ..."
+                ui.request()
+                return
+            directory = (manual_path_input.value or "").strip().strip('"')
+            if not os.path.isdir(directory):
+                status_text.value = "❌ 批量解析需要在路径框填入目录"
+                status_text.color = "#F44336"
+                ui.request()
+                return
+            stop = threading.Event()
+            batch_state["stop"] = stop
+            object_info.value = f"Batch: {directory}"
+            status_text.color = "#FF9800"
+            ui.request()
+
+            def show_batch(text):
+                status_text.value = "📚 " + text
+
+            future = asyncio.get_running_loop().run_in_executor(None, lambda: solve_directory(
+                directory, backend=solver_dropdown.value, stop_event=stop,
+                progress_cb=lambda p: ui.post(show_batch, p.format(), key="batch")))
+            try:
+                snap = await future
+                status_text.value = (f"✨ 批量完成: ✔{snap['solved']} ✘{snap['failed']} "
+                                     f"跳过 {snap['skipped']} 重复 {snap['duplicates']} · "
+                                     f"{snap['frames_per_min']:.1f} 帧/分")
+                status_text.color = "#00BCD4"
+            except Exception as ex:
+                status_text.value = f"❌ 批量解析异常: {ex}"
+                status_text.color = "#F44336"
+            batch_state["stop"] = None
+            ui.request()
+
+        # ---- 选择文件 (Flet 0.80: async pick_files 直接返回文件) ----
+        async def on_pick_files_click(e):
+            try:
+                files = await file_picker.pick_files(
+                    allowed_extensions=["jpg", "jpeg", "png", "bmp", "tiff"],
+                )
+                if files and len(files) > 0:
+                    picked = files[0]
+                    fp = getattr(picked, 'path', None)
+                    fb = getattr(picked, 'bytes', None)
+
+                    if fp and os.path.exists(fp):
+                        # 桌面端 / 能直接读取的路径
+                        await start_processing(file_path=fp)
+                    elif fb:
+                        # Android: path 可能为空，用 bytes
+                        status_text.value = "📱 读取图片数据 ..."
+                        status_text.color = "#FF9800"
+                        ui.request()
+                        # 直接以 memoryview 交给解析，不再落临时文件
+                        await start_processing(file_bytes=fb)
+                    elif fp:
+                        # path 存在但 os.path.exists 为 False（可能是 content URI）
+                        # 尝试直接传路径
+                        await start_processing(file_path=fp)
+                    else:
+                        status_text.value = "❌ 无法获取文件 (path 和 bytes 都为空)"
+                        status_text.color = "#F44336"
+                        ui.request()
+                else:
+                    status_text.value = "⚠️ 未选择文件"
+                    status_text.color = "#FF9800"
+                    ui.request()
+            except Exception as ex:
+                status_text.value = f"❌ FilePicker: {ex}"
+                status_text.color = "#F44336"
+                ui.request()
+
+        # ---- 快捷追踪 ----
+        def on_star_click(e):
+            name = e.control.data
+            ra, dec, az, alt = broadcaster.star_coords(name)
+            ra_input.value = f"{ra:.4f}"
+            dec_input.value = f"{dec:.4f}"
+            az_input.value = f"{az:.2f}°"
+            alt_input.value = f"{alt:.2f}°"
+            object_info.value = f"Target: {name} (Locked)"
+            time_stamp.visible = True
+            time_stamp.value = f"Updated: {datetime.now().strftime('%H:%M:%S')}"
+            if track_target(name):
+                msg = f"🎯 Tracking {name} @ {tracker.rate_hz:.0f} Hz"
+            else:
+                _, msg = send_to_mount(ip_input.value, ra, dec)
+            status_text.value = msg
+            status_text.color = "#00BCD4"
+            ui.request()
+
+        # ---- 离线星表：当前可见 / 搜索 ----
+        def on_catalog_pick(e):
+            catalog = get_sky_catalog()
+            i = e.control.data
+            ra, dec = float(catalog.ra[i]), float(catalog.dec[i])
+            az, alt = get_az_alt(ra, dec)
+            name = catalog.label(i)
+            ra_input.value = f"{ra:.4f}"
+            dec_input.value = f"{dec:.4f}"
+            az_input.value = f"{az:.2f}°"
+            alt_input.value = f"{alt:.2f}°"
+            object_info.value = f"Target: {name} (Locked)"
+            time_stamp.visible = True
+            time_stamp.value = f"Updated: {datetime.now().strftime('%H:%M:%S')}"
+            if track_target((ra, dec)):
+                msg = f"🎯 Tracking {name} @ {tracker.rate_hz:.0f} Hz"
+            else:
+                _, msg = send_to_mount(ip_input.value, ra, dec)
+            status_text.value = msg
+            status_text.color = "#00BCD4"
+            ui.request()
+
+        def _show_catalog_hits(hits):
+            catalog = get_sky_catalog()
+            whats_up_list.controls = [
+                ft.TextButton(
+                    content=ft.Text(f"{catalog.label(i)} · Alt {alt:.0f}° Az {az:.0f}°", size=13),
+                    data=int(i), on_click=on_catalog_pick,
+                )
+                for i, az, alt in hits
+            ]
+
+        def on_whats_up_click(e):
+            try:
+                idx, az, alt = get_sky_catalog().above(20.0, max_mag=8.0)
+            except Exception as ex:
+                status_text.value = f"❌ 星表: {ex}"
+                status_text.color = "#F44336"
+                ui.request()
+                return
+            _show_catalog_hits(list(zip(idx[:12], az[:12], alt[:12])))
+            status_text.value = f"🔭 {len(idx)} 个天体高于 20° (显示最亮的 12 个)"
+            status_text.color = "#00BCD4"
+            ui.request()
+
+        def on_sky_search(e):
+            try:
+                catalog = get_sky_catalog()
+                i = catalog.find(sky_search.value or "")
+            except Exception as ex:
+                status_text.value = f"❌ 星表: {ex}"
+                status_text.color = "#F44336"
+                ui.request()
+                return
+            if i is None:
+                status_text.value = f"⚠️ 星表中没有 {sky_search.value}"
+                status_text.color = "#FF9800"
+                ui.request()
+                return
+            az, alt = get_az_alt(float(catalog.ra[i]), float(catalog.dec[i]))
+            _show_catalog_hits([(i, az, alt)])
+            ui.request()
+
+        sky_search.on_submit = on_sky_search
+
+        # ---- 升落 / 中天 / 可见窗口 ----
+        def on_visibility_click(e):
+            try:
+                target, name = resolve_target(vis_target.value or sky_search.value)
+                limit = float(vis_limit.value or 0)
+                now = time.time()
+                r = rise_set_transit([target], now, now + 3 * 86400, alt_limit=limit)[0]
+            except Exception as ex:
+                vis_text.value = f"❌ {ex}"
+                ui.request()
+                return
+
+            def _fmt(ts):
+                return datetime.fromtimestamp(ts).strftime('%m-%d %H:%M')
+            events = sorted([(t, "↑ Rise") for t in r["rise"]] +
+                            [(t, "↓ Set") for t in r["set"]] +
+                            [(t, f"⊤ Transit {a:.0f}°") for t, a in zip(r["transit"], r["transit_alt"])])
+            lines = [f"{name} · 高于 {limit:.0f}° 共 {r['above_seconds'] / 3600:.1f} h / 72 h"]
+            if not len(r["rise"]) and not len(r["set"]):
+                lines.append("始终在限高之上" if r["above_seconds"] > 0 else "72 h 内不会升过限高")
+            lines += [f"{_fmt(t)}  {label}" for t, label in events[:9]]
+            vis_text.value = "\n".join(lines)
+            ui.request()
+
+        # ---- 观测计划：可见窗口约束下按最短转动排序，再按时刻驱动赤道仪 ----
+        session_state = {"runner": None}
+
+        def show_session_event(index, entry, ok, msg):
+            if index is None:
+                session_state["runner"] = None
+                status_text.value = "✨ Session complete / 计划完成"
+            else:
+                status_text.value = f"🗓 {index + 1}. {entry['name']}: {msg}"
+            status_text.color = "#00BCD4" if ok else "#F44336"
+
+        def on_session_event(index, entry, ok, msg):
+            ui.post(show_session_event, index, entry, ok, msg)
+
+        async def on_session_click(e):
+            runner = session_state["runner"]
+            if runner is not None:
+                runner.stop()
+                session_state["runner"] = None
+                status_text.value = "⏹ Session stopped"
+                ui.request()
+                return
+            try:
+                min_alt = float(vis_limit.value or 0)
+                targets = []
+                for text in (session_input.value or "").split(";"):
+                    if text.strip():
+                        target, name = resolve_target(text)
+                        targets.append(SessionTarget(name, target, min_alt=min_alt))
+                if not targets:
+                    raise ValueError("请输入目标，用 ; 分隔")
+                try:
+                    start = (float(ra_input.value), float(dec_input.value))
+                except (TypeError, ValueError):
+                    start = None
+                status_text.value = "⏳ Planning..."
+                ui.request()
+                plan = await asyncio.to_thread(plan_session, targets, start=start)
+            except Exception as ex:
+                session_text.value = f"❌ {ex}"
+                ui.request()
+                return
+
+            lines = [plan.summary()]
+            lines += [f"{datetime.fromtimestamp(e['start']).strftime('%H:%M')}  {e['name']}"
+                      f"  (slew {e['slew_seconds']:.0f}s)" for e in plan.entries[:12]]
+            if plan.skipped:
+                lines.append("不可见 / 排不下: " + ", ".join(plan.skipped[:8]))
+            session_text.value = "\n".join(lines)
+            if plan.entries:
+                runner = SessionRunner(plan, ip=ip_input.value, send_fn=send_to_mount,
+                                       tracker=tracker, on_event=on_session_event)
+                session_state["runner"] = runner
+                runner.start()
+                status_text.value = "🗓 Session armed / 计划已启动 (再次点击停止)"
+            ui.request()
+
+        # ---- 手动发送 ----
+        def on_send_click(e):
+            status_text.value = "Sending..."
+            status_text.color = "#FF9800"
+            ui.request()
+
+            if track_switch.value:
+                try:
+                    track_target((float(ra_input.value), float(dec_input.value)))
+                    success, msg = True, "🎯 Tracking manual target"
+                except ValueError as ex:
+                    success, msg = False, f"Input Error: {ex}"
+            else:
+                success, msg = send_to_mount(
+                    ip_input.value, ra_input.value, dec_input.value
+                )
+            status_text.value = msg
+            status_text.color = "#00BCD4" if success else "#F44336"
+            ui.request()
+
+        # ---- 布局 ----
+        page.add(
+            header_time_loc,
+            ft.Text(
+                "StarLink Pro", size=26,
+                weight=ft.FontWeight.BOLD, color="#00BCD4",
+            ),
+            ft.Divider(height=10),
+            ft.Row([ip_input, protocol_dropdown]),
+            ft.Text("Quick Track / 快捷追踪", size=15, weight=ft.FontWeight.BOLD),
+            ft.Row([
+                ft.ElevatedButton(
+                    content=ft.Text("Sun"),
+                    data="Sun", on_click=on_star_click,
+                    bgcolor="#FF9800", color="#FFFFFF", expand=True,
+                ),
+                ft.ElevatedButton(
+                    content=ft.Text("Moon"),
+                    data="Moon", on_click=on_star_click,
+                    bgcolor="#616161", color="#FFFFFF", expand=True,
+                ),
+                ft.ElevatedButton(
+                    content=ft.Text("Mars"),
+                    data="Mars", on_click=on_star_click,
+                    bgcolor="#F44336", color="#FFFFFF", expand=True,
+                ),
+            ]),
+            ft.Row([track_switch, trajectory_switch], wrap=True),
+            ft.Row([ft.Text("Rate", size=12), rate_slider]),
+            ft.Row([
+                sky_search,
+                ft.IconButton(
+                    icon=ft.Icons.TRAVEL_EXPLORE,
+                    tooltip="What's Up / 当前可见",
+                    on_click=on_whats_up_click,
+                    bgcolor="#3F51B5",
+                    icon_color="#FFFFFF",
+                ),
+            ]),
+            whats_up_list,
+            ft.Row([
+                vis_target, vis_limit,
+                ft.IconButton(
+                    icon=ft.Icons.SCHEDULE,
+                    tooltip="Rise / Set / Transit · 升落与中天 (未来 72 h)",
+                    on_click=on_visibility_click,
+                    bgcolor="#3F51B5",
+                    icon_color="#FFFFFF",
+                ),
+            ]),
+            vis_text,
+            ft.Row([
+                session_input,
+                ft.IconButton(
+                    icon=ft.Icons.PLAYLIST_PLAY,
+                    tooltip="Plan & run tonight · 规划并执行 (最短转动)",
+                    on_click=on_session_click,
+                    bgcolor="#3F51B5",
+                    icon_color="#FFFFFF",
+                ),
+            ]),
+            session_text,
+            ft.Divider(height=10),
+            ft.Container(
+                content=ft.Column(
+                    [guide_text, object_info, time_stamp],
+                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                    spacing=5,
+                ),
+                padding=15,
+                width=350,
+                bgcolor="#111111",
+                border=ft.border.all(2, "#9C27B0"),
+                border_radius=15,
+            ),
+            ft.ElevatedButton(
+                content=ft.Text("Select Photo / 自动识别"),
+                icon=ft.Icons.PHOTO_CAMERA,
+                on_click=on_pick_files_click,
+                bgcolor="#9C27B0",
+                color="#FFFFFF",
+                width=350,
+                height=50,
+            ),
+            ft.Row([
+                manual_path_input,
+                ft.IconButton(
+                    icon=ft.Icons.SEARCH,
+                    on_click=lambda _: start_processing(
+                        manual_path_input.value),
+                    bgcolor="#607D8B",
+                    icon_color="#FFFFFF",
+                ),
+                ft.IconButton(
+                    icon=ft.Icons.FOLDER_OPEN,
+                    tooltip="Batch Solve / 批量解析目录 (再次点击停止)",
+                    on_click=on_batch_click,
+                    bgcolor="#607D8B",
+                    icon_color="#FFFFFF",
+                ),
+                solver_dropdown,
+            ]),
+            ft.Row([ra_input, dec_input]),
+            ft.Row([az_input, alt_input]),
+            ft.ElevatedButton(
+                content=ft.Text("Send to Motors / 手动发送"),
+                icon=ft.Icons.SEND,
+                on_click=on_send_click,
+                width=350,
+                height=45,
+                bgcolor="#2196F3",
+                color="#FFFFFF",
+            ),
+            ft.Card(
+                content=ft.Container(
+                    content=ft.Column(
+                        [status_text, track_stats, pointing_text], spacing=4),
+                    padding=10,
+                    bgcolor="#1a1a1a",
+                    border_radius=10,
+                    width=350,
+                ),
+            ),
+            ft.Container(
+                content=ft.Text(
+                    "✨ AI Star Field Solving Powered by Astrometry.net API",
+                    color="#9E9E9E",
+                    size=10,
+                    italic=True,
+                    text_align=ft.TextAlign.CENTER,
+                ),
+                margin=ft.margin.only(top=10, bottom=20),
+            ),
+        )
+
+        sky_sub = broadcaster.subscribe(on_sky_tick, ip_input.value, protocol_dropdown.value)
+
+        # ---- 会话生命周期：断开时退订，关闭时释放本会话的全部后台任务 ----
+        def on_connect(e):
+            nonlocal sky_sub
+            if sky_sub.closed and not ui.closed:
+                sky_sub = broadcaster.subscribe(on_sky_tick, ip_input.value,
+                                                protocol_dropdown.value)
+
+        def on_disconnect(e):
+            sky_sub.close()
+
+        def on_close(e):
+            sky_sub.close()
+            tracker.stop()
+            if session_state["runner"] is not None:
+                session_state["runner"].stop()
+            if batch_state["stop"] is not None:
+                batch_state["stop"].set()
+            ui.stop()
+
+        page.on_connect = on_connect
+        page.on_disconnect = on_disconnect
+        page.on_close = on_close
+        ui.request()
+
+    except Exception:
+        err = traceback.format_exc()
+        print(f"FATAL ERROR:\n{err}")
+        try:
+            page.add(ft.Text(err, color="#E57373"))
+            page.update()
+        except Exception:
+            pass
+
+
+def run():
+    load_env()
+    metrics.setup_from_env()
+    # Flet 0.80+ 推荐 ft.run()，ft.app() 也仍可用
+    try:
+        ft.run(main)
+    except AttributeError:
+        ft.app(target=main)
@@ -0,0 +1,641 @@
+"""
+天文算法引擎：儒略日与恒星时、太阳 / 月球 / 火星坐标、地平坐标、历表缓存与升落 / 可见窗口计算。
+"""
+import json
+import math
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from . import metrics
+
+
+OBSERVER_LAT = 22.3
+OBSERVER_LON = 114.1
+BODIES = ("Sun", "Moon", "Mars")
+
+# 上次的观测地保存在磁盘上，启动时立即可用；超过 LOCATION_MAX_AGE 才重新联网定位
+LOCATION_FILE = os.getenv(
+    "STARLINK_LOCATION_FILE",
+    os.path.join(os.path.expanduser("~"), ".starlink", "location.json"))
+LOCATION_MAX_AGE = 86400.0
+LOCATION_UPDATED = 0.0
+
+
+def load_cached_location(path=LOCATION_FILE):
+    """读取保存的观测地并设为当前坐标，返回保存时刻 (没有或损坏时返回 None)。"""
+    global OBSERVER_LAT, OBSERVER_LON, LOCATION_UPDATED
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        lat, lon = float(data["lat"]), float(data["lon"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    OBSERVER_LAT, OBSERVER_LON = lat, lon
+    LOCATION_UPDATED = float(data.get("time", 0.0))
+    return LOCATION_UPDATED
+
+
+def set_observer_location(lat, lon, save=True, path=LOCATION_FILE):
+    global OBSERVER_LAT, OBSERVER_LON, LOCATION_UPDATED
+    OBSERVER_LAT, OBSERVER_LON = float(lat), float(lon)
+    LOCATION_UPDATED = time.time()
+    if not save:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"lat": OBSERVER_LAT, "lon": OBSERVER_LON, "time": LOCATION_UPDATED}, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"位置缓存写入失败: {e}")
+
+
+def update_location_from_network(max_age=LOCATION_MAX_AGE):
+    if LOCATION_UPDATED and time.time() - LOCATION_UPDATED < max_age:
+        return
+    try:
+        import requests
+        response = requests.get("https://ipapi.co/json/", timeout=5).json()
+        lat = response.get("latitude")
+        lon = response.get("longitude")
+        if lat is not None and lon is not None:
+            set_observer_location(lat, lon)
+            print(f"位置已自动更新: {OBSERVER_LAT}, {OBSERVER_LON}")
+    except Exception as e:
+        print(f"联网获取位置失败，使用{'缓存' if LOCATION_UPDATED else '默认'}坐标: {e}")
+
+
+load_cached_location()
+
+
+J2000_JD = 2451545.0
+UNIX_EPOCH_JD = 2440587.5
+
+
+def timestamps_to_jd(timestamps):
+    """Unix 时间戳 (UTC 秒) → 儒略日。支持标量或 NumPy 数组。"""
+    return np.asarray(timestamps, dtype=float) / 86400.0 + UNIX_EPOCH_JD
+
+
+def get_julian_date():
+    return float(timestamps_to_jd(time.time()))
+
+
+# 标量走 math (单次调用比 NumPy 0 维数组快数倍)，数组走 NumPy；历表与地平公式只写一份
+_MATH_OPS = SimpleNamespace(sin=math.sin, cos=math.cos, tan=math.tan, atan2=math.atan2,
+                            asin=math.asin, sqrt=math.sqrt, radians=math.radians,
+                            degrees=math.degrees)
+_NUMPY_OPS = SimpleNamespace(sin=np.sin, cos=np.cos, tan=np.tan, atan2=np.arctan2,
+                             asin=np.arcsin, sqrt=np.sqrt, radians=np.radians,
+                             degrees=np.degrees)
+
+
+def _is_scalar(x):
+    return isinstance(x, (int, float)) or np.ndim(x) == 0
+
+
+def gmst_hours(d):
+    """格林尼治平恒星时 (小时)，d 为自 J2000 起的日数。"""
+    return (18.697374558 + 24.06570982441908 * d) % 24
+
+
+class ObserverFrame:
+    """
+    观测历元快照：某一时刻 (或一组时刻) + 某一观测点。
+
+    儒略日、GMST/LST、黄赤交角、太阳轨道项以及纬度的 sin/cos 只在构造时计算一次，
+    同一 tick 内的所有坐标转换共享这些量，RA/Dec 与 Az/Alt 也因此来自同一时刻。
+    单个时刻的帧把这些量存为 Python float，后续计算走 math；一组时刻的帧存为数组，走 NumPy。
+    """
+
+    def __init__(self, timestamp=None, lat=None, lon=None):
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.lat = float(OBSERVER_LAT if lat is None else lat)
+        self.lon = float(OBSERVER_LON if lon is None else lon)
+        self.scalar = _is_scalar(self.timestamp)
+        if self.scalar:
+            self.ops = ops = _MATH_OPS
+            self.jd = float(self.timestamp) / 86400.0 + UNIX_EPOCH_JD
+        else:
+            self.ops = ops = _NUMPY_OPS
+            self.jd = timestamps_to_jd(self.timestamp)
+        self.d = self.jd - J2000_JD
+        obl = ops.radians(23.4393 - 3.563e-7 * self.d)
+        self.sin_obl, self.cos_obl = ops.sin(obl), ops.cos(obl)
+        self.gmst = gmst_hours(self.d)
+        self.lst_deg = (self.gmst * 15 + self.lon) % 360
+        lat_rad = math.radians(self.lat)
+        self.sin_lat, self.cos_lat = math.sin(lat_rad), math.cos(lat_rad)
+        # 太阳近地点经度与平近点角：Sun 与 Mars 分支共用
+        self.sun_w = 282.9404 + 4.70935e-5 * self.d
+        self.sun_M_rad = ops.radians((356.0470 + 0.9856002585 * self.d) % 360.0)
+        self._radec = {}
+
+    def planet_radec(self, body):
+        """天体赤经/赤纬 (度)，同一帧内按天体缓存。"""
+        if body not in self._radec:
+            self._radec[body] = _planet_radec(body, self)
+        return self._radec[body]
+
+    def az_alt(self, ra_deg, dec_deg):
+        """赤道 → 地平转换，返回 (az, alt) (度)。"""
+        if self.scalar and _is_scalar(ra_deg) and _is_scalar(dec_deg):
+            ops = _MATH_OPS
+            RA_deg = float(ra_deg)
+            Dec_rad = math.radians(float(dec_deg))
+        else:
+            ops = _NUMPY_OPS
+            RA_deg = np.asarray(ra_deg, dtype=float)
+            Dec_rad = np.radians(np.asarray(dec_deg, dtype=float))
+        HA_rad = ops.radians(self.lst_deg - RA_deg)
+        sin_Alt = (ops.sin(Dec_rad) * self.sin_lat +
+                   ops.cos(Dec_rad) * self.cos_lat * ops.cos(HA_rad))
+        Alt_rad = ops.asin(sin_Alt)
+        y_az = -ops.sin(HA_rad)
+        x_az = (self.cos_lat * ops.tan(Dec_rad) -
+                self.sin_lat * ops.cos(HA_rad))
+        Az_rad = ops.atan2(y_az, x_az)
+        return ops.degrees(Az_rad) % 360, ops.degrees(Alt_rad)
+
+    def star_coords(self, body):
+        ra, dec = self.planet_radec(body)
+        az, alt = self.az_alt(ra, dec)
+        return ra, dec, az, alt
+
+
+def _planet_radec(body, frame):
+    """计算天体赤经/赤纬 (度)，时间与公共项取自 frame；frame.ops 决定走 math 还是 NumPy。"""
+    D = frame.d
+    m = frame.ops
+    sin_obl, cos_obl = frame.sin_obl, frame.cos_obl
+    if body == 'Sun':
+        w = frame.sun_w
+        e = 0.016709 - 1.151e-9 * D
+        M_rad = frame.sun_M_rad
+        E = M_rad + e * m.sin(M_rad) * (1.0 + e * m.cos(M_rad))
+        x = m.cos(E) - e
+        y = m.sin(E) * m.sqrt(1 - e * e)
+        v = m.degrees(m.atan2(y, x))
+        lon_rad = m.radians((v + w) % 360.0)
+        x_equat = m.cos(lon_rad)
+        y_equat = m.sin(lon_rad) * cos_obl
+        z_equat = m.sin(lon_rad) * sin_obl
+        ra = m.degrees(m.atan2(y_equat, x_equat)) % 360.0
+        dec = m.degrees(m.asin(z_equat))
+        return ra, dec
+
+    elif body == 'Moon':
+        L = (218.316 + 13.176396 * D) % 360.0
+        M = (134.963 + 13.064993 * D) % 360.0
+        F = (93.272 + 13.229350 * D) % 360.0
+        lon = L + 6.289 * m.sin(m.radians(M))
+        lat = 5.128 * m.sin(m.radians(F))
+        lon_rad, lat_rad = m.radians(lon), m.radians(lat)
+        x = m.cos(lon_rad) * m.cos(lat_rad)
+        y = m.sin(lon_rad) * m.cos(lat_rad)
+        z = m.sin(lat_rad)
+        x_equat = x
+        y_equat = y * cos_obl - z * sin_obl
+        z_equat = y * sin_obl + z * cos_obl
+        ra = m.degrees(m.atan2(y_equat, x_equat)) % 360.0
+        dec = m.degrees(m.asin(z_equat))
+        return ra, dec
+
+    elif body == 'Mars':
+        w_m = 286.5016 + 2.92961e-5 * D
+        e_m = 0.093405 + 2.516e-9 * D
+        M_m = (19.3871 + 0.52402073 * D) % 360.0
+        a_m = 1.523688
+        i_m = m.radians(1.8496 - 8.131e-6 * D)
+        node_m = m.radians(49.5581 + 2.11081e-5 * D)
+        M_rad = m.radians(M_m)
+        E_rad = M_rad + e_m * \
+            m.sin(M_rad) * (1.0 + e_m * m.cos(M_rad))
+        xv = a_m * (m.cos(E_rad) - e_m)
+        yv = a_m * (m.sqrt(1 - e_m * e_m) * m.sin(E_rad))
+        v_m = m.atan2(yv, xv)
+        r_m = m.sqrt(xv * xv + yv * yv)
+        w_rad = m.radians(w_m)
+        xh = r_m * (m.cos(node_m) * m.cos(v_m + w_rad - node_m) -
+                    m.sin(node_m) * m.sin(v_m + w_rad - node_m) * m.cos(i_m))
+        yh = r_m * (m.sin(node_m) * m.cos(v_m + w_rad - node_m) +
+                    m.cos(node_m) * m.sin(v_m + w_rad - node_m) * m.cos(i_m))
+        zh = r_m * (m.sin(v_m + w_rad - node_m) * m.sin(i_m))
+        M_s_rad = frame.sun_M_rad
+        E_s_rad = M_s_rad + 0.016709 * m.sin(M_s_rad)
+        xv_s = m.cos(E_s_rad) - 0.016709
+        yv_s = m.sin(E_s_rad) * m.sqrt(1 - 0.016709 ** 2)
+        lon_s = m.atan2(yv_s, xv_s) + m.radians(frame.sun_w)
+        r_s = m.sqrt(xv_s ** 2 + yv_s ** 2)
+        xs, ys = r_s * m.cos(lon_s), r_s * m.sin(lon_s)
+        xg, yg, zg = xh + xs, yh + ys, zh
+        x_equat = xg
+        y_equat = yg * cos_obl - zg * sin_obl
+        z_equat = yg * sin_obl + zg * cos_obl
+        ra = m.degrees(m.atan2(y_equat, x_equat)) % 360.0
+        dist = m.sqrt(x_equat ** 2 + y_equat ** 2 + z_equat ** 2)
+        dec = m.degrees(m.asin(z_equat / dist))
+        return ra, dec
+
+    raise ValueError(f"未知天体: {body}")
+
+
+def get_real_planet_coords_batch(body, timestamps):
+    """
+    批量历表：timestamps 为 Unix 时间戳数组 (UTC 秒)，返回 (ra, dec) 数组 (度)。
+    """
+    return ObserverFrame(timestamps).planet_radec(body)
+
+
+def get_az_alt_batch(ra_deg, dec_deg, timestamps, lat=None, lon=None):
+    """
+    批量赤道 → 地平转换。ra/dec/timestamps 按 NumPy 规则广播，
+    lat/lon 缺省使用当前观测者位置。返回 (az, alt) 数组 (度)。
+    """
+    return ObserverFrame(timestamps, lat, lon).az_alt(ra_deg, dec_deg)
+
+
+def get_star_coords_batch(name, timestamps, lat=None, lon=None):
+    """一次调用得到整条轨迹的 (ra, dec, az, alt) 数组，用于绘图或追踪。"""
+    return ObserverFrame(timestamps, lat, lon).star_coords(name)
+
+
+@metrics.timed("ephemeris_seconds")
+def get_real_planet_coords(body, frame=None):
+    try:
+        ra, dec = (frame or ObserverFrame()).planet_radec(body)
+        return float(ra), float(dec)
+    except Exception as e:
+        metrics.inc("ephemeris_failures")
+        print(f"Math Error: {e}")
+    return 0, 0
+
+
+@metrics.timed("az_alt_seconds")
+def get_az_alt(ra_deg, dec_deg, frame=None):
+    try:
+        az, alt = (frame or ObserverFrame()).az_alt(ra_deg, dec_deg)
+        return float(az), float(alt)
+    except Exception as e:
+        metrics.inc("az_alt_failures")
+        print(f"AzAlt Error: {e}")
+        return 0, 0
+
+
+def get_star_coords(name, frame=None):
+    frame = frame or ObserverFrame()
+    ra, dec = get_real_planet_coords(name, frame)
+    az, alt = get_az_alt(ra, dec, frame)
+    return ra, dec, az, alt
+
+
+def get_targets_coords(names, frame=None):
+    """多目标刷新：所有目标共享同一帧，返回 {name: (ra, dec, az, alt)}。"""
+    frame = frame or ObserverFrame()
+    return {name: get_star_coords(name, frame) for name in names}
+
+
+class _ChebWindow:
+    """单个天体在 [t0, t1] 上的切比雪夫拟合 (单位向量 x/y/z 三个分量)。"""
+
+    def __init__(self, t0, t1, coeffs, max_error_deg):
+        self.t0, self.t1 = t0, t1
+        self.mid = 0.5 * (t0 + t1)
+        self.half = 0.5 * (t1 - t0)
+        self.coeffs = coeffs  # shape (degree+1, 3)
+        # 纯 Python 标量求值用：换成幂基后倒序的 (cx, cy, cz) 元组，Horner 求值比 Clenshaw 少一半运算
+        # (x 限定在 [-1, 1]，8 阶以内换基的舍入误差在 1e-15 量级)
+        power = np.polynomial.chebyshev.cheb2poly
+        rev = [tuple(map(float, c)) for c in
+               np.stack([power(coeffs[:, k]) for k in range(3)], axis=1)[::-1]]
+        self._lead, self._rest = rev[0], rev[1:]
+        self.max_error_deg = max_error_deg
+
+    def covers(self, t):
+        return self.t0 <= t <= self.t1
+
+    def eval_scalar(self, t):
+        # Horner，三个分量一起算
+        x = (t - self.mid) / self.half
+        px, py, pz = self._lead
+        for cx, cy, cz in self._rest:
+            px = px * x + cx
+            py = py * x + cy
+            pz = pz * x + cz
+        return px, py, pz
+
+    def eval_batch(self, t):
+        x = (np.asarray(t, dtype=float) - self.mid) / self.half
+        return np.polynomial.chebyshev.chebval(x, self.coeffs)
+
+
+def _radec_to_unit(ra_deg, dec_deg):
+    ra, dec = np.radians(ra_deg), np.radians(dec_deg)
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra),
+                     np.sin(dec)], axis=-1)
+
+
+def _unit_to_radec(x, y, z):
+    r = np.sqrt(x * x + y * y + z * z)
+    return (np.degrees(np.arctan2(y, x)) % 360.0,
+            np.degrees(np.arcsin(np.clip(z / r, -1.0, 1.0))))
+
+
+class EphemerisCache:
+    """
+    切比雪夫插值历表缓存。
+
+    每个天体在一个滑动时间窗内用 degree 阶切比雪夫多项式拟合方向单位向量，
+    查询时只做多项式求值。拟合后在节点之间的检查点上与直接公式对比，
+    误差超过 max_error_deg 时窗口减半重拟合；每个天体最多保留 max_windows 个窗口，
+    拟合新窗口时淘汰离本次查询时刻最远的 (计划 / 可见性查询的过去或未来窗口不会因墙钟而作废)。
+    """
+
+    def __init__(self, window=3600.0, degree=8, max_error_deg=1e-5,
+                 max_windows=4, min_window=10.0):
+        self.window = float(window)
+        self.degree = int(degree)
+        self.max_error_deg = float(max_error_deg)
+        self.max_windows = int(max_windows)
+        self.min_window = float(min_window)
+        self._windows = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "fits": 0, "refits": 0, "evictions": 0}
+
+    def _fit(self, body, t):
+        """拟合覆盖时刻 t 的窗口；每次减半都重新定位，t 始终在窗口内。"""
+        span = self.window
+        n = self.degree + 1
+        nodes = np.cos(np.pi * (np.arange(n) + 0.5) / n)
+        # 检查点取在节点之间，插值误差在这些位置最大
+        check = np.cos(np.pi * np.arange(1, n) / n)
+        while True:
+            # 查询点放在窗口前部，持续追踪时窗口向前覆盖更久
+            t0 = t - min(0.05 * self.window, 0.5 * span)
+            t1 = t0 + span
+            mid, half = 0.5 * (t0 + t1), 0.5 * span
+            xyz = _radec_to_unit(*get_real_planet_coords_batch(body, mid + half * nodes))
+            coeffs = np.polynomial.chebyshev.chebfit(nodes, xyz, self.degree)
+            approx = np.polynomial.chebyshev.chebval(check, coeffs).T
+            exact = _radec_to_unit(*get_real_planet_coords_batch(body, mid + half * check))
+            approx /= np.linalg.norm(approx, axis=1, keepdims=True)
+            chord = np.linalg.norm(approx - exact, axis=1)
+            err = float(np.degrees(2 * np.arcsin(np.clip(chord / 2, 0.0, 1.0))).max())
+            if err <= self.max_error_deg or span <= self.min_window:
+                self.stats["fits"] += 1
+                return _ChebWindow(t0, t1, coeffs, err)
+            self.stats["refits"] += 1
+            span /= 2
+
+    def _evict(self, windows, t):
+        """按与查询时刻 t 的距离淘汰窗口，为新窗口留出一个名额。"""
+        keep = max(self.max_windows - 1, 0)
+        if len(windows) <= keep:
+            return windows
+        alive = sorted(windows, key=lambda w: max(w.t0 - t, t - w.t1, 0.0))[:keep]
+        self.stats["evictions"] += len(windows) - len(alive)
+        return sorted(alive, key=lambda w: w.t0)
+
+    def _window_for(self, body, t):
+        windows = self._windows.get(body, ())
+        for w in windows:
+            if w.t0 <= t <= w.t1:
+                return w
+        with self._lock:
+            w = self._fit(body, t)
+            windows = self._evict(list(self._windows.get(body, ())), t)
+            windows.append(w)
+            self._windows[body] = windows
+        return w
+
+    def radec(self, body, timestamp=None):
+        """单点查询，返回 (ra, dec) (度)。"""
+        t = time.time() if timestamp is None else float(timestamp)
+        w = self._window_for(body, t)
+        if not w.covers(t):
+            # 不应发生；万一窗口没有覆盖 t，宁可走直接公式也不外推
+            return get_real_planet_coords(body, ObserverFrame(t))
+        self.stats["hits"] += 1
+        x, y, z = w.eval_scalar(t)
+        r = math.sqrt(x * x + y * y + z * z)
+        return (math.degrees(math.atan2(y, x)) % 360.0,
+                math.degrees(math.asin(max(-1.0, min(1.0, z / r)))))
+
+    def radec_batch(self, body, timestamps):
+        """批量查询，返回 (ra, dec) 数组 (度)。"""
+        t = np.atleast_1d(np.asarray(timestamps, dtype=float))
+        xyz = np.empty((3, t.size))
+        todo = np.ones(t.size, dtype=bool)
+        while todo.any():
+            w = self._window_for(body, float(t[todo][0]))
+            sel = todo & (t >= w.t0) & (t <= w.t1)
+            if not sel.any():
+                # 同 radec：窗口没有覆盖时直接计算剩余点，避免死循环
+                xyz[:, todo] = _radec_to_unit(*get_real_planet_coords_batch(body, t[todo])).T
+                break
+            xyz[:, sel] = w.eval_batch(t[sel])
+            todo &= ~sel
+        self.stats["hits"] += t.size
+        ra, dec = _unit_to_radec(*xyz)
+        return ra.reshape(np.shape(timestamps)), dec.reshape(np.shape(timestamps))
+
+    def star_coords(self, body, frame=None):
+        """与 get_star_coords 相同的返回值，RA/Dec 走缓存，Az/Alt 使用同一帧。"""
+        frame = frame or ObserverFrame()
+        ra, dec = self.radec(body, frame.timestamp)
+        az, alt = frame.az_alt(ra, dec)
+        return ra, dec, float(az), float(alt)
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+EPHEMERIS_CACHE = EphemerisCache()
+
+
+# ---- 升落 / 中天 / 可见窗口 ----
+RISE_SET_STEP = 7200.0  # 粗采样步长 (秒)：只需保证时角每步变化 < 180°
+
+
+class VisibilityTargets:
+    """把太阳系天体名与 (ra, dec) 固定目标统一成按 (目标下标, 时刻) 求值的向量化坐标源。"""
+
+    def __init__(self, targets):
+        self.targets = list(targets)
+        n = len(self.targets)
+        self.ra = np.zeros(n)
+        self.dec = np.zeros(n)
+        self.bodies = {}
+        for k, target in enumerate(self.targets):
+            if isinstance(target, str):
+                self.bodies.setdefault(target, []).append(k)
+            else:
+                self.ra[k], self.dec[k] = target
+
+    def radec(self, k, ts):
+        """k、ts 为同形数组，返回每个 (目标, 时刻) 的 (ra, dec)。"""
+        ra, dec = self.ra[k], self.dec[k]
+        for body, ks in self.bodies.items():
+            m = np.isin(k, ks)
+            if m.any():
+                ra[m], dec[m] = get_real_planet_coords_batch(body, ts[m])
+        return ra, dec
+
+
+def _wrap180(deg):
+    return (deg + 180.0) % 360.0 - 180.0
+
+
+def _refine_roots(f, k, lo, hi, f_lo, f_hi, tol=0.5, max_iter=40):
+    """
+    向量化 Illinois 试位法：对每个区间 [lo, hi] (f 在两端异号) 同时迭代，
+    保持括号不丢根，同侧连续两次时把保留端的函数值减半以保证超线性收敛。返回根 (秒)。
+    """
+    lo, hi = lo.astype(float), hi.astype(float)
+    f_lo, f_hi = f_lo.astype(float), f_hi.astype(float)
+    side = np.zeros(lo.shape, dtype=np.int8)
+    t = prev = (lo + hi) / 2
+    for _ in range(max_iter):
+        if lo.size == 0:
+            break
+        denom = f_hi - f_lo
+        t = np.where(denom != 0, hi - f_hi * (hi - lo) / np.where(denom != 0, denom, 1), (lo + hi) / 2)
+        ft = f(k, t)
+        left = np.sign(ft) == np.sign(f_lo)
+        f_hi = np.where(left & (side == 1), f_hi / 2, f_hi)
+        f_lo = np.where(~left & (side == -1), f_lo / 2, f_lo)
+        lo, f_lo = np.where(left, t, lo), np.where(left, ft, f_lo)
+        hi, f_hi = np.where(left, hi, t), np.where(left, f_hi, ft)
+        side = np.where(left, 1, -1).astype(np.int8)
+        # Illinois 的一端可能一直不动，括号宽度不一定收缩，以相邻两次估计的差判断收敛
+        if np.all((np.abs(t - prev) < tol) | (hi - lo < tol) | (ft == 0)):
+            break
+        prev = t
+    return t
+
+
+def rise_set_transit(targets, t_start, t_end, alt_limit=0.0, lat=None, lon=None,
+                     step=RISE_SET_STEP):
+    """
+    批量计算升起 / 落下 / 上中天与高于 alt_limit 的累计时长。
+
+    targets: 天体名 ('Sun'、'Moon'、'Mars' ...) 或 (ra, dec) 元组的列表；时间为 Unix 秒。
+    做法：粗采样时角 (单调增加，步长 2 h 也不会漏) 找出上 / 下中天，
+    地平高度的极值就在中天附近，相邻极值之间高度单调，两端异号时必有且只有一次穿越，
+    用 _refine_roots 求根。比逐分钟计算少两个数量级的求值次数。
+
+    返回每个目标一个 dict: rise / set / transit (时间戳数组)、transit_alt (度)、
+    above_seconds (区间内高于 alt_limit 的总秒数)。
+    """
+    vt = VisibilityTargets(targets)
+    n = len(vt.targets)
+    sin_limit = math.sin(math.radians(alt_limit))
+
+    lat_rad = math.radians(OBSERVER_LAT if lat is None else lat)
+    sin_lat, cos_lat = math.sin(lat_rad), math.cos(lat_rad)
+    lon = OBSERVER_LON if lon is None else lon
+
+    # 求根时每次迭代都要求值，只算恒星时，不构造完整的 ObserverFrame
+    def lst_deg(ts):
+        return gmst_hours(timestamps_to_jd(ts) - J2000_JD) * 15 + lon
+
+    def hour_angle(k, ts):
+        ra, _ = vt.radec(k, ts)
+        return _wrap180(lst_deg(ts) - ra)
+
+    def sin_alt(k, ts):
+        ra, dec = vt.radec(k, ts)
+        dec = np.radians(dec)
+        ha = np.radians(lst_deg(ts) - ra)
+        return np.sin(dec) * sin_lat + np.cos(dec) * cos_lat * np.cos(ha)
+
+    # 1) 粗采样时角，找上中天 (-→+) 与下中天 (+180 → -180 回绕)
+    grid = np.arange(t_start, t_end + step, step, dtype=float)
+    grid[-1] = min(grid[-1], t_end)
+    K, T = np.meshgrid(np.arange(n), grid, indexing='ij')
+    ha = hour_angle(K.ravel(), T.ravel()).reshape(n, -1)
+    a, b = ha[:, :-1], ha[:, 1:]
+    upper = (a < 0) & (b >= 0) & (b - a < 180)
+    lower = (a > 0) & (b < 0) & (a - b > 180)
+
+    def _roots(mask, fn):
+        kk, ii = np.nonzero(mask)
+        lo, hi = grid[ii], grid[ii + 1]
+        return kk, _refine_roots(fn, kk, lo, hi, fn(kk, lo), fn(kk, hi))
+
+    k_up, t_up = _roots(upper, hour_angle)
+    k_low, t_low = _roots(lower, lambda k, ts: _wrap180(hour_angle(k, ts) - 180.0))
+
+    # 2) 以区间端点 + 中天时刻为分段点，相邻分段点之间高度单调
+    k_all = np.concatenate([np.arange(n), np.arange(n), k_up, k_low])
+    t_all = np.concatenate([np.full(n, float(t_start)), np.full(n, float(t_end)), t_up, t_low])
+    order = np.lexsort((t_all, k_all))
+    k_all, t_all = k_all[order], t_all[order]
+    f_all = sin_alt(k_all, t_all) - sin_limit
+    same = k_all[:-1] == k_all[1:]
+    cross = same & (np.sign(f_all[:-1]) != np.sign(f_all[1:])) & (f_all[:-1] != 0)
+    idx = np.nonzero(cross)[0]
+    k_cross = k_all[idx]
+    t_cross = _refine_roots(lambda k, ts: sin_alt(k, ts) - sin_limit, k_cross,
+                            t_all[idx], t_all[idx + 1], f_all[idx], f_all[idx + 1])
+    rising = f_all[idx + 1] > 0
+
+    # 3) 按目标整理
+    transit_alt = np.degrees(np.arcsin(np.clip(sin_alt(k_up, t_up), -1, 1)))
+    up_at_start = f_all[np.searchsorted(k_all, np.arange(n))] > 0
+    results = []
+    for k in range(n):
+        mk = k_cross == k
+        times, rises = t_cross[mk], rising[mk]
+        # 区间内可见时长：从起点状态出发，在每个穿越处切换
+        edges = np.concatenate([[t_start], times, [t_end]])
+        state = np.empty(len(edges) - 1, dtype=bool)
+        state[0] = up_at_start[k]
+        if len(rises):
+            state[1:] = rises
+        above = float(np.sum(np.diff(edges)[state]))
+        mu = k_up == k
+        results.append({
+            "target": vt.targets[k],
+            "rise": times[rises],
+            "set": times[~rises],
+            "transit": t_up[mu],
+            "transit_alt": transit_alt[mu],
+            "above_seconds": above,
+        })
+    return results
+
+
+def visibility_windows(targets, t_start, t_end, alt_limit=0.0, lat=None, lon=None):
+    """
+    每个目标在 [t_start, t_end] 内高于限高的时间窗 [(开始, 结束), ...]。
+    alt_limit 可以是标量或逐目标数组；同一限高的目标合并成一次 rise_set_transit 批量计算。
+    """
+    targets = list(targets)
+    limits = np.broadcast_to(np.asarray(alt_limit, dtype=float), (len(targets),))
+    windows = [[] for _ in targets]
+    for limit in np.unique(limits):
+        ks = np.nonzero(limits == limit)[0]
+        results = rise_set_transit([targets[k] for k in ks], t_start, t_end,
+                                   alt_limit=float(limit), lat=lat, lon=lon)
+        for k, r in zip(ks, results):
+            events = sorted([(float(t), True) for t in r["rise"]] +
+                            [(float(t), False) for t in r["set"]])
+            # 第一个事件是落下 => 起点时已在限高之上
+            up = (not events[0][1]) if events else r["above_seconds"] > 0
+            opened = float(t_start) if up else None
+            for t, rising in events:
+                if rising:
+                    opened = t
+                elif opened is not None:
+                    windows[k].append((opened, t))
+                    opened = None
+            if opened is not None:
+                windows[k].append((opened, float(t_end)))
+    return windows
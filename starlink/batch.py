@@ -0,0 +1,255 @@
+"""
+批量解析：目录扫描、并发解析、断点续跑与结果输出 (JSONL / CSV)。
+"""
+import json
+import os
+import threading
+import time
+
+from .imaging import ImageSource
+from .solver import SOLVER_BACKEND, SOLVER_BACKENDS, backend_chain, solve_star_image
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff',
+                    '.fits', '.fit', '.fts')
+BATCH_FIELDS = ("file", "sha256", "success", "ra", "dec", "az", "alt", "label",
+                "seconds", "backend", "duplicate_of", "finished")
+
+
+def find_images(directory, recursive=True):
+    """按路径排序列出目录下的星图文件。"""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        found.extend(os.path.join(root, f) for f in sorted(files)
+                     if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not recursive:
+            break
+    return found
+
+
+def _file_digest(path):
+    with ImageSource.open(path) as source:
+        return source.digest()
+
+
+class BatchResultWriter:
+    """逐行追加 JSONL 或 CSV (按扩展名)，每条结果立即 flush，中断后可据此续跑。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.csv = path.lower().endswith('.csv')
+        self._lock = threading.Lock()
+
+    def rows(self):
+        """已写入的结果行 (dict)，文件不存在时为空。"""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            if self.csv:
+                import csv
+                return list(csv.DictReader(f))
+            return [json.loads(line) for line in f if line.strip()]
+
+    def completed(self, rows=None):
+        """已成功的 sha256 集合 (失败的不算，续跑时重试)。"""
+        return {row.get("sha256") for row in (self.rows() if rows is None else rows)
+                if str(row.get("success")) in ("True", "true", "1")}
+
+    def recorded_duplicates(self, rows=None):
+        """已有 duplicate_of 行的文件路径，续跑时不再重复记录。"""
+        return {row.get("file") for row in (self.rows() if rows is None else rows)
+                if row.get("duplicate_of")}
+
+    def write(self, row):
+        with self._lock:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', encoding='utf-8', newline='') as f:
+                if self.csv:
+                    import csv
+                    w = csv.DictWriter(f, fieldnames=BATCH_FIELDS, extrasaction='ignore')
+                    if new:
+                        w.writeheader()
+                    w.writerow(row)
+                else:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+class BatchProgress:
+    def __init__(self):
+        self.total = 0
+        self.scanned = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.queued = 0
+        self.running = 0
+        self.solved = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            done = self.solved + self.failed
+            minutes = (time.monotonic() - self.started) / 60
+            return {
+                "total": self.total, "scanned": self.scanned, "skipped": self.skipped,
+                "duplicates": self.duplicates, "queued": self.queued,
+                "running": self.running, "solved": self.solved,
+                "failed": self.failed, "done": done,
+                "frames_per_min": done / minutes if minutes > 0 else 0.0,
+            }
+
+    def format(self):
+        s = self.snapshot()
+        if s['scanned'] < s['total']:
+            return f"扫描 {s['scanned']}/{s['total']} · 待解析 {s['queued']}"
+        return (f"{s['done']}/{s['total'] - s['skipped'] - s['duplicates']} "
+                f"(✔{s['solved']} ✘{s['failed']}) · 队列 {s['queued']} · "
+                f"运行 {s['running']} · {s['frames_per_min']:.1f} 帧/分")
+
+
+def solve_directory(directory, output=None, backend=None, concurrency=4,
+                    recursive=True, progress_cb=None, stop_event=None):
+    """
+    批量解析目录中的星图。
+
+    先按内容 sha256 去重 (哈希在工作线程中并行计算；重复帧不再提交，原帧解析成功后
+    才以 duplicate_of 记录同样的结果)，跳过 output 中已成功的帧与已记录过的重复帧，
+    无法读取的文件记为失败行，其余以 concurrency 个工作线程提交给 solve_star_image(backend)。
+    每扫描或完成一帧都回调 progress_cb(BatchProgress)，每完成一帧就追加一行到
+    output (.jsonl 或 .csv，缺省为目录下 solve_results.jsonl)。
+    stop_event (threading.Event) 置位后停止扫描、不再提交新帧。返回最终 snapshot。
+    """
+    import concurrent.futures
+
+    output = output or os.path.join(directory, "solve_results.jsonl")
+    writer = BatchResultWriter(output)
+    rows = writer.rows()
+    already = writer.completed(rows)
+    recorded = writer.recorded_duplicates(rows)
+    progress = BatchProgress()
+    backend = backend or SOLVER_BACKEND
+    paths = find_images(directory, recursive)
+    progress.total = len(paths)
+
+    def _notify():
+        if progress_cb:
+            try:
+                progress_cb(progress)
+            except Exception:
+                pass
+
+    def _hash(path):
+        try:
+            return _file_digest(path), None
+        except (OSError, ValueError) as e:  # 无权限、扫描途中被删除、失效的符号链接等
+            return None, e
+
+    def _work(path, digest):
+        with progress._lock:
+            progress.queued -= 1
+            progress.running += 1
+        t0 = time.perf_counter()
+        try:
+            success, ra, dec, az, alt, label = solve_star_image(file_path=path, backend=backend)
+        except Exception as e:
+            success, ra, dec, az, alt, label = False, 0, 0, 0, 0, str(e)
+        row = {"file": path, "sha256": digest, "success": success,
+               "ra": ra, "dec": dec, "az": az, "alt": alt, "label": label,
+               "seconds": round(time.perf_counter() - t0, 3), "backend": backend,
+               "duplicate_of": None, "finished": time.time()}
+        writer.write(row)
+        if success:
+            # 失败的原帧续跑时会连同重复帧再来一次，这里不写失败的重复行
+            for dup in duplicates.get(digest, ()):
+                writer.write(dict(row, file=dup, seconds=0.0, duplicate_of=path,
+                                  finished=time.time()))
+        with progress._lock:
+            progress.running -= 1
+            if success:
+                progress.solved += 1
+            else:
+                progress.failed += 1
+        _notify()
+        return row
+
+    def _stopped():
+        return stop_event is not None and stop_event.is_set()
+
+    first_by_hash = {}
+    duplicates = {}
+    todo = []
+    _notify()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # 按目录顺序取哈希结果：同内容的帧中排在最前的作为原帧
+        hashes = pool.map(_hash, paths)
+        for path, (digest, error) in zip(paths, hashes):
+            if _stopped():
+                break
+            if error is not None:
+                writer.write({"file": path, "sha256": None, "success": False,
+                              "ra": 0, "dec": 0, "az": 0, "alt": 0,
+                              "label": f"读取失败: {error}", "seconds": 0.0,
+                              "backend": backend, "duplicate_of": None,
+                              "finished": time.time()})
+            with progress._lock:
+                progress.scanned += 1
+                if error is not None:
+                    progress.failed += 1
+                elif digest in already or path in recorded:
+                    progress.skipped += 1
+                elif digest in first_by_hash:
+                    progress.duplicates += 1
+                    duplicates.setdefault(digest, []).append(path)
+                else:
+                    first_by_hash[digest] = path
+                    todo.append((path, digest))
+                    progress.queued += 1
+            _notify()
+        hashes.close()  # 中途停止时取消尚未开始的哈希任务
+
+        pending = set()
+        for path, digest in todo:
+            # 有界提交：线程池里最多 2*concurrency 个任务，其余留在 todo 中
+            while len(pending) >= 2 * concurrency:
+                _, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            if _stopped():
+                break
+            pending.add(pool.submit(_work, path, digest))
+        concurrent.futures.wait(pending)
+    with progress._lock:
+        progress.queued = 0
+    return progress.snapshot()
+
+
+def _backend_arg(text):
+    import argparse
+    try:
+        backend_chain(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return text
+
+
+def batch_cli(argv=None):
+    """命令行: starlink batch DIR [-o results.jsonl|.csv] [--backend local,nova] [-j 4]"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="starlink batch", description="批量解析目录中的星图")
+    parser.add_argument("directory")
+    parser.add_argument("-o", "--output", help="结果文件 (.jsonl 或 .csv)")
+    parser.add_argument("--backend", type=_backend_arg, default=None,
+                        help=f"{' | '.join(sorted(SOLVER_BACKENDS))}，可用逗号给出回退顺序")
+    parser.add_argument("-j", "--concurrency", type=int, default=4)
+    parser.add_argument("--no-recursive", action="store_true")
+    args = parser.parse_args(argv)
+
+    def _print(progress):
+        print("\r" + progress.format(), end="", flush=True)
+
+    snap = solve_directory(args.directory, args.output, args.backend, args.concurrency,
+                           not args.no_recursive, progress_cb=_print)
+    print()
+    print(json.dumps(snap, ensure_ascii=False))
+    return 0 if snap["failed"] == 0 else 1
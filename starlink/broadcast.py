@@ -0,0 +1,185 @@
+"""
+进程级天空广播：Flet Web 多会话部署时，时钟、太阳系天体坐标与赤道仪状态每个周期只算一次，
+再分发给所有订阅的会话。会话断开时取消订阅，没有订阅者时广播线程自行退出。
+"""
+import math
+import threading
+import time
+from datetime import datetime
+
+from . import astro, metrics
+from .astro import EPHEMERIS_CACHE, ObserverFrame
+from .transport import get_fleet, get_mount_link
+
+BROADCAST_BODIES = ("Sun", "Moon", "Mars")
+BROADCAST_PERIOD = 1.0
+
+
+class Subscription:
+    """subscribe() 的返回值。mounts 为界面里填写的地址 (逗号分隔为多台)，决定要附带哪台设备的状态。"""
+
+    def __init__(self, broadcaster, callback, mounts=None, protocol=None):
+        self.broadcaster = broadcaster
+        self.callback = callback
+        self.mounts = mounts or ""
+        self.protocol = protocol
+        self.closed = False
+
+    def set_mounts(self, mounts, protocol=None):
+        self.mounts = mounts or ""
+        self.protocol = protocol
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broadcaster.unsubscribe(self)
+
+
+class SkyBroadcaster:
+    """
+    单线程按 period 对齐到整秒计算一次快照，依次回调所有订阅者。
+
+    快照 (dict): timestamp、clock ('%Y-%m-%d %H:%M:%S')、lat / lon、
+    bodies {name: (ra, dec, az, alt)} (共享同一个 ObserverFrame)、
+    mounts {(地址, 协议): 状态}，每个不同的地址只查询一次。
+    回调在广播线程中执行，必须很快 (界面端只投递给 UiScheduler)；回调抛异常的订阅被移除。
+    线程数与每周期的计算量与订阅者数量无关。
+    """
+
+    def __init__(self, period=BROADCAST_PERIOD, bodies=BROADCAST_BODIES, cache=None):
+        self.period = float(period)
+        self.bodies = tuple(bodies)
+        self.stats = {"ticks": 0, "deliveries": 0, "dropped": 0, "tick_ms_max": 0.0}
+        self._cache = cache or EPHEMERIS_CACHE
+        self._subs = []
+        self._latest = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._services_started = False
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def subscribers(self):
+        return len(self._subs)
+
+    def latest(self):
+        return self._latest
+
+    def subscribe(self, callback, mounts=None, protocol=None):
+        """注册回调 callback(snapshot)；已有快照时立即回调一次，新会话不必等下一个周期。"""
+        sub = Subscription(self, callback, mounts, protocol)
+        with self._lock:
+            self._subs.append(sub)
+            if not self.running:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if self._latest is not None:
+            self._deliver(sub, self._latest)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+            if not self._subs:
+                self._stop.set()
+
+    def star_coords(self, name):
+        """Quick Track 用：广播中的天体直接取本周期的结果，否则走历表缓存。"""
+        snapshot = self._latest
+        if (snapshot is not None and name in snapshot["bodies"]
+                and time.time() - snapshot["timestamp"] < self.period):
+            return snapshot["bodies"][name]
+        return self._cache.star_coords(name)
+
+    def _start_services(self):
+        """整个进程只做一次：遥测端口监听与联网定位 (有新鲜缓存时直接返回)。"""
+        if self._services_started:
+            return
+        self._services_started = True
+        try:
+            get_mount_link().start_telemetry()
+        except Exception as e:
+            metrics.inc("telemetry_listen_failures")
+            print(f"遥测端口监听失败: {e}")
+        threading.Thread(target=astro.update_location_from_network, daemon=True).start()
+
+    def _mount_state(self, mounts, protocol):
+        # 每个 tick 都会调用：只读已有统计，不做 DNS 查询 (设备地址在发送时解析)
+        if ',' in mounts:
+            health = get_fleet(mounts, protocol).health()
+            counts = {}
+            for h in health.values():
+                counts[h["status"]] = counts.get(h["status"], 0) + 1
+            return {"fleet": counts, "size": len(health)}
+        return {"pointing": get_mount_link().pointing_stats(mounts)}
+
+    def compute(self, now=None):
+        now = time.time() if now is None else float(now)
+        frame = ObserverFrame(now)
+        bodies = {name: self._cache.star_coords(name, frame) for name in self.bodies}
+        mounts = {}
+        for sub in list(self._subs):
+            key = (sub.mounts, sub.protocol)
+            if sub.mounts and key not in mounts:
+                try:
+                    mounts[key] = self._mount_state(*key)
+                except Exception:
+                    mounts[key] = None
+        return {
+            "timestamp": now,
+            "clock": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+            "lat": astro.OBSERVER_LAT,
+            "lon": astro.OBSERVER_LON,
+            "bodies": bodies,
+            "mounts": mounts,
+        }
+
+    def _deliver(self, sub, snapshot):
+        try:
+            sub.callback(snapshot)
+            self.stats["deliveries"] += 1
+        except Exception:
+            self.stats["dropped"] += 1
+            sub.close()
+
+    def _run(self):
+        self._start_services()
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            snapshot = self.compute()
+            self._latest = snapshot
+            for sub in list(self._subs):
+                self._deliver(sub, snapshot)
+            elapsed = time.perf_counter() - t0
+            metrics.observe("broadcast_tick_seconds", elapsed)
+            self.stats["ticks"] += 1
+            self.stats["tick_ms_max"] = max(self.stats["tick_ms_max"], elapsed * 1000)
+            # 对齐到下一个整周期，时钟在秒边界跳变
+            now = time.time()
+            self._stop.wait(math.floor(now / self.period + 1) * self.period - now)
+        with self._lock:
+            if self._subs:
+                # 退出前又有会话订阅：交给新线程继续
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            _broadcaster = SkyBroadcaster()
+            metrics.register_collector("broadcast", lambda: dict(
+                _broadcaster.stats, subscribers=_broadcaster.subscribers))
+        return _broadcaster
@@ -0,0 +1,226 @@
+"""
+离线深空星表：按赤纬分带索引的 OpenNGC + 亮星表，锥形检索、"现在可见" 查询与名称解析。
+"""
+import json
+import math
+import os
+
+import numpy as np
+
+from .astro import BODIES, ObserverFrame, _radec_to_unit
+from .transport import angular_separation_deg_batch
+
+
+CATALOG_DIR = os.getenv("STARLINK_CATALOG_DIR",
+                        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+# OpenNGC 类型代码；'*' 为 Hipparcos 亮星
+OBJECT_KINDS = ('*', '**', '*Ass', 'OCl', 'GCl', 'Cl+N', 'G', 'GPair', 'GTrpl',
+                'GGroup', 'PN', 'HII', 'DrkN', 'EmN', 'Neb', 'RfN', 'SNR', 'Nova', 'Other')
+CATALOG_ZONE_DEG = 2.0
+
+
+class SkyCatalog:
+    """
+    梅西耶 / NGC / IC / 亮星离线星表，内存映射的 objects.npy + 赤纬分带索引。
+
+    objects.npy: 结构化数组 (id, messier, kind, ra, dec, mag, size)，先按赤纬带、带内按赤经排序，
+    因此一次锥形检索只需在相交的几个带内各做两次二分查找，再用单位向量精确筛选。
+    (约 2 万个天体，分带索引比 HEALPix / k-d 树更简单，查询同样是亚毫秒级。)
+    object_names.json: {id: 俗名}
+    """
+
+    def __init__(self, directory=CATALOG_DIR):
+        self.objects = np.load(os.path.join(directory, "objects.npy"), mmap_mode='r')
+        self.ra = self.objects['ra']
+        self.dec = self.objects['dec']
+        nz = int(round(180 / CATALOG_ZONE_DEG))
+        zones = self._zone(self.dec)
+        self._zone_start = np.searchsorted(zones, np.arange(nz + 1))
+        self.unit = _radec_to_unit(self.ra, self.dec)
+        self._sort_mag = np.nan_to_num(self.objects['mag'], nan=99.0)  # 未知星等排在最后
+        self._ids = None
+        names_path = os.path.join(directory, "object_names.json")
+        self.names = {}
+        if os.path.exists(names_path):
+            with open(names_path, 'r', encoding='utf-8') as f:
+                self.names = json.load(f)
+
+    def __len__(self):
+        return len(self.objects)
+
+    @staticmethod
+    def _zone(dec):
+        nz = int(round(180 / CATALOG_ZONE_DEG))
+        return np.clip(((np.asarray(dec) + 90) // CATALOG_ZONE_DEG).astype(int), 0, nz - 1)
+
+    def _filter(self, idx, kinds=None, max_mag=None):
+        if kinds is not None:
+            codes = [OBJECT_KINDS.index(k) for k in kinds]
+            idx = idx[np.isin(self.objects['kind'][idx], codes)]
+        if max_mag is not None:
+            idx = idx[self.objects['mag'][idx] <= max_mag]
+        return idx
+
+    def _candidates(self, ra, dec, radius_deg):
+        """分带索引粗筛：覆盖锥形区域的赤纬带 × 赤经区间内的全部下标 (未做精确角距筛选)。"""
+        lo, hi = self._zone(max(dec - radius_deg, -90.0)), self._zone(min(dec + radius_deg, 90.0))
+        cos_dec = max(math.cos(math.radians(min(abs(dec) + radius_deg, 90.0))), 0.0)
+        if radius_deg >= 90 or cos_dec < 1e-9 or math.sin(math.radians(radius_deg)) >= cos_dec:
+            half = 180.0  # 跨极区：整带都是候选
+        else:
+            half = math.degrees(math.asin(math.sin(math.radians(radius_deg)) / cos_dec))
+        parts = []
+        for z in range(int(lo), int(hi) + 1):
+            a, b = self._zone_start[z], self._zone_start[z + 1]
+            if half >= 180.0:
+                parts.append(np.arange(a, b))
+                continue
+            ras = self.ra[a:b]
+            for r0, r1 in _ra_ranges(ra - half, ra + half):
+                i0, i1 = np.searchsorted(ras, [r0, r1])
+                parts.append(np.arange(a + i0, a + i1))
+        return np.concatenate(parts) if parts else np.empty(0, int)
+
+    def cone(self, ra, dec, radius_deg, kinds=None, max_mag=None):
+        """锥形检索，返回 (下标, 角距) 按角距升序。"""
+        idx = self._filter(self._candidates(ra, dec, radius_deg), kinds, max_mag)
+        dots = self.unit[idx] @ _radec_to_unit(ra, dec)
+        keep = dots >= math.cos(math.radians(radius_deg))
+        idx = idx[keep]
+        sep = angular_separation_deg_batch(ra, dec, self.ra[idx], self.dec[idx])
+        order = np.argsort(sep)
+        return idx[order], sep[order]
+
+    def nearest(self, ra, dec, max_radius=10.0, kinds=None, max_mag=None):
+        """最近的天体 (下标, 角距)，max_radius 内没有则返回 None。"""
+        radius = 0.5
+        while True:
+            idx, sep = self.cone(ra, dec, radius, kinds, max_mag)
+            if len(idx):
+                return int(idx[0]), float(sep[0])
+            if radius >= max_radius:
+                return None
+            radius = min(radius * 4, max_radius)
+
+    def above(self, alt_min=20.0, frame=None, kinds=None, max_mag=None):
+        """
+        当前地平高度高于 alt_min 的天体，返回 (下标, az, alt) 按星等升序。
+        先用分带索引取天顶 (RA=LST, Dec=纬度) 周围半径 90-alt_min 的候选，再对候选做向量化地平转换。
+        """
+        frame = frame or ObserverFrame()
+        idx = self._candidates(frame.lst_deg % 360.0, frame.lat, max(90.0 - alt_min, 0.0))
+        idx = self._filter(idx, kinds, max_mag)
+        # sin(alt) = 单位向量 · 天顶方向，先用点积筛掉地平线以下的，只对剩余的做完整转换
+        zenith = _radec_to_unit(frame.lst_deg % 360.0, frame.lat)
+        idx = idx[self.unit[idx] @ zenith >= math.sin(math.radians(alt_min))]
+        idx = idx[np.argsort(self._sort_mag[idx], kind='stable')]
+        az, alt = frame.az_alt(self.ra[idx], self.dec[idx])
+        return idx, az, alt
+
+    def named(self):
+        """有梅西耶编号或俗名的天体掩码 (首次调用时计算)。"""
+        if getattr(self, '_named', None) is None:
+            ids = np.array(sorted(self.names), dtype=self.objects.dtype['id'])
+            self._named = (self.objects['messier'] > 0) | np.isin(self.objects['id'], ids)
+        return self._named
+
+    def field_objects(self, ra, dec, radius_deg, limit=3):
+        """视场 (中心 ra/dec、半径 radius_deg) 内有名字的天体，按亮度排序，返回显示名列表。"""
+        idx, _ = self.cone(ra, dec, radius_deg)
+        idx = idx[self.named()[idx]]
+        idx = idx[np.argsort(self._sort_mag[idx], kind='stable')]
+        labels = []
+        for i in idx:
+            label = self.label(i)
+            if label not in labels:  # 同名的双星/成员星只列一次
+                labels.append(label)
+                if len(labels) >= limit:
+                    break
+        return labels
+
+    def label(self, i):
+        """显示名：M31 Andromeda Galaxy / NGC 7000 North America Nebula / Sirius。"""
+        obj = self.objects[i]
+        oid = obj['id'].decode()
+        name = self.names.get(oid, "")
+        if obj['messier']:
+            prefix = f"M{int(obj['messier'])}"
+        elif obj['kind'] == 0:
+            return name or oid
+        else:
+            prefix = oid
+            for cat in ("NGC", "IC"):
+                if oid.startswith(cat) and oid[len(cat):].isdigit():
+                    prefix = f"{cat} {int(oid[len(cat):])}"
+        return f"{prefix} {name}".strip()
+
+    def find(self, text):
+        """按名称查找：'M31'、'NGC224'、'NGC 224'、'HIP 32349'、'Sirius' (不区分大小写)。"""
+        key = text.strip().upper().replace(" ", "")
+        if key.startswith("M") and key[1:].isdigit():
+            hits = np.nonzero(self.objects['messier'] == int(key[1:]))[0]
+            return int(hits[0]) if len(hits) else None
+        if self._ids is None:
+            self._ids = {oid.decode().replace(" ", ""): i for i, oid in enumerate(self.objects['id'])}
+            for oid, name in self.names.items():
+                i = self._ids.get(oid.replace(" ", ""))
+                if i is not None:
+                    self._ids.setdefault(name.upper().replace(" ", ""), i)
+        for cand in (key, _pad_ngc_id(key)):
+            if cand in self._ids:
+                return self._ids[cand]
+        return None
+
+
+def _ra_ranges(r0, r1):
+    """把可能跨 0°/360° 的赤经区间拆成 [0, 360) 内的一到两段。"""
+    r0, r1 = r0 % 360.0, r1 % 360.0
+    if r0 <= r1:
+        return [(r0, r1)]
+    return [(r0, 360.0), (0.0, r1)]
+
+
+def _pad_ngc_id(key):
+    """NGC224 → NGC0224 (OpenNGC 编号补零到 4 位)。"""
+    for prefix in ("NGC", "IC"):
+        if key.startswith(prefix) and key[len(prefix):].isdigit():
+            return f"{prefix}{int(key[len(prefix):]):04d}"
+    return key
+
+
+_sky_catalog = None
+
+
+def get_sky_catalog():
+    global _sky_catalog
+    if _sky_catalog is None:
+        _sky_catalog = SkyCatalog()
+    return _sky_catalog
+
+
+def annotate_field(ra, dec, radius_deg=None, limit=3):
+    """
+    本地视场标注 (代替 nova 的 /info/)：返回视场内最亮的 limit 个有名字的天体。
+    radius_deg 缺省 5°；星表不可用时返回 None。
+    """
+    try:
+        catalog = get_sky_catalog()
+    except (OSError, ValueError):
+        return None
+    return catalog.field_objects(float(ra), float(dec), float(radius_deg or 5.0), limit)
+
+
+def resolve_target(text):
+    """'Sun' / 'Moon' / 'Mars'、星表名称 (M42, Vega) 或 'ra,dec'。返回 (target, 显示名)。"""
+    text = (text or "").strip()
+    if text.capitalize() in BODIES:
+        return text.capitalize(), text.capitalize()
+    if "," in text:
+        ra, dec = (float(v) for v in text.split(",", 1))
+        return (ra, dec), f"RA {ra:.2f}° Dec {dec:.2f}°"
+    catalog = get_sky_catalog()
+    i = catalog.find(text)
+    if i is None:
+        raise ValueError(f"星表中没有 {text}")
+    return (float(catalog.ra[i]), float(catalog.dec[i])), catalog.label(i)
@@ -0,0 +1,221 @@
+"""
+命令行入口，供树莓派等无界面环境使用:
+
+    starlink track Moon --ip 192.168.4.1 [--rate 5] [--trajectory] [--duration 600]
+    starlink goto M42 --ip 192.168.4.1
+    starlink solve img.jpg [--backend local,nova] [--near M42] [--ip 192.168.4.1]
+    starlink plan "M31; M42; Moon" [--min-alt 30] [--dwell 600] [--run --ip 192.168.4.1]
+    starlink batch DIR [-o results.jsonl]
+    starlink ui
+    starlink --metrics-port 9108 --profile sample track Moon --ip 192.168.4.1
+
+每个子命令只在执行时导入自己用到的模块：track / goto 不加载解析器与 httpx，除 ui 外都不加载 flet。
+"""
+import argparse
+import json
+import sys
+import time
+
+
+def _print_json(data):
+    print(json.dumps(data, ensure_ascii=False, default=float))
+
+
+def _apply_location(args):
+    from . import astro
+    if args.lat is not None and args.lon is not None:
+        astro.set_observer_location(args.lat, args.lon, save=args.save_location)
+    elif args.locate:
+        astro.update_location_from_network(max_age=0)
+
+
+def _send(args, ra, dec):
+    from .transport import send_udp_command
+    return send_udp_command(args.ip, ra, dec, protocol=args.protocol)
+
+
+def cmd_track(args):
+    from .catalog import resolve_target
+    from .tracking import TrackingEngine
+    target, name = resolve_target(args.target)
+    last = [0.0]
+
+    def on_update(ra, dec, az, alt, ok, msg):
+        now = time.monotonic()
+        if now - last[0] < 1.0 and ok:
+            return
+        last[0] = now
+        print(f"\r{name}  RA {ra:7.3f}° Dec {dec:+7.3f}°  Az {az:6.2f}° Alt {alt:+6.2f}°  {msg}",
+              end="", flush=True)
+
+    engine = TrackingEngine(ip=args.ip, rate_hz=args.rate, on_update=on_update,
+                            mode='trajectory' if args.trajectory else 'stream',
+                            send_fn=lambda ip, ra, dec: _send(args, ra, dec))
+    engine.start(target)
+    try:
+        deadline = time.monotonic() + args.duration if args.duration else None
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        print()
+    _print_json(engine.stats.snapshot())
+    return 0 if engine.stats.send_failures == 0 else 1
+
+
+def cmd_goto(args):
+    from .astro import get_real_planet_coords
+    from .catalog import resolve_target
+    target, name = resolve_target(args.target)
+    ra, dec = get_real_planet_coords(target) if isinstance(target, str) else target
+    ok, msg = _send(args, ra, dec)
+    print(f"{name}: {msg}")
+    return 0 if ok else 1
+
+
+def cmd_solve(args):
+    from . import load_env
+    from .solver import solve_hints, solve_star_image
+    load_env()
+    hints = solve_hints(radius=args.radius, scale=args.scale)
+    if args.near:
+        from .astro import get_real_planet_coords
+        from .catalog import resolve_target
+        target, _ = resolve_target(args.near)
+        ra, dec = get_real_planet_coords(target) if isinstance(target, str) else target
+        hints = solve_hints(ra, dec, args.radius, args.scale)
+    success, ra, dec, az, alt, label = solve_star_image(
+        file_path=args.image, backend=args.backend, hints=hints,
+        progress_cb=lambda msg: print(msg, file=sys.stderr))
+    _print_json({"success": success, "ra": ra, "dec": dec, "az": az, "alt": alt,
+                 "label": label})
+    if success and args.ip:
+        ok, msg = _send(args, ra, dec)
+        print(msg, file=sys.stderr)
+        return 0 if ok else 1
+    return 0 if success else 1
+
+
+def cmd_plan(args):
+    from .catalog import resolve_target
+    from .tracking import SessionRunner, SessionTarget, plan_session
+    targets = []
+    for text in args.targets.split(";"):
+        if text.strip():
+            target, name = resolve_target(text)
+            targets.append(SessionTarget(name, target, min_alt=args.min_alt, dwell=args.dwell))
+    plan = plan_session(targets)
+    for n, e in enumerate(plan.entries, 1):
+        print(f"{n:3d}. {time.strftime('%H:%M', time.localtime(e['start']))}  "
+              f"{e['name']:<24} slew {e['slew_seconds']:5.0f}s  wait {e['wait_seconds']:6.0f}s")
+    if plan.skipped:
+        print("skipped: " + ", ".join(plan.skipped))
+    print(plan.summary())
+    if not args.run:
+        return 0
+    if not args.ip:
+        print("--run 需要 --ip", file=sys.stderr)
+        return 2
+
+    def on_event(index, entry, ok, msg):
+        print(msg if index is None else f"{index + 1}. {entry['name']}: {msg}", flush=True)
+
+    runner = SessionRunner(plan, ip=args.ip, on_event=on_event,
+                           send_fn=lambda ip, ra, dec: _send(args, ra, dec))
+    runner.start()
+    try:
+        while runner.running:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        runner.stop()
+    return 0
+
+
+def cmd_batch(args):
+    from . import load_env
+    from .batch import batch_cli
+    load_env()
+    return batch_cli(args.argv)
+
+
+def cmd_ui(args):
+    from .app import run
+    run()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="starlink", description="StarLink Pro 命令行")
+    parser.add_argument("--lat", type=float, help="观测地纬度 (缺省用缓存的位置)")
+    parser.add_argument("--lon", type=float, help="观测地经度")
+    parser.add_argument("--save-location", action="store_true", help="把 --lat/--lon 写入位置缓存")
+    parser.add_argument("--locate", action="store_true", help="联网刷新观测地 (ipapi.co)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="在 127.0.0.1 上提供 /metrics (缺省 STARLINK_METRICS_PORT)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="定期把指标写入滚动 JSONL 文件 (缺省 STARLINK_METRICS_FILE)")
+    parser.add_argument("--profile", choices=("sample", "cprofile"), default=None,
+                        help="运行期间开启分析器，退出时报告写到 ~/.starlink/")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def mount_args(p, required):
+        p.add_argument("--ip", required=required, help="赤道仪地址 (多台用逗号分隔)")
+        p.add_argument("--protocol", choices=("text", "binary", "auto"), default=None)
+
+    p = sub.add_parser("track", help="持续追踪目标")
+    p.add_argument("target", help="Sun / Moon / Mars、星表名称或 'ra,dec'")
+    mount_args(p, True)
+    p.add_argument("--rate", type=float, default=5.0, help="推送频率 Hz")
+    p.add_argument("--trajectory", action="store_true", help="上传轨迹段，由下位机插值")
+    p.add_argument("--duration", type=float, default=0.0, help="追踪秒数 (0 为直到 Ctrl-C)")
+    p.set_defaults(func=cmd_track)
+
+    p = sub.add_parser("goto", help="指向目标一次")
+    p.add_argument("target")
+    mount_args(p, True)
+    p.set_defaults(func=cmd_goto)
+
+    p = sub.add_parser("solve", help="解析一张星图")
+    p.add_argument("image")
+    p.add_argument("--backend", default=None,
+                   help="nova | offline | local，逗号分隔为回退顺序 (缺省 STARLINK_SOLVER)")
+    p.add_argument("--near", help="位置提示：当前指向的目标 (名称或 'ra,dec')")
+    p.add_argument("--radius", type=float, default=10.0, help="位置提示的搜索半径 (度)")
+    p.add_argument("--scale", type=float, default=None, help="尺度提示 (角秒/像素)")
+    mount_args(p, False)
+    p.set_defaults(func=cmd_solve)
+
+    p = sub.add_parser("plan", help="为今晚排观测计划 (可见窗口 + 最短转动)")
+    p.add_argument("targets", help="目标列表，用 ; 分隔")
+    p.add_argument("--min-alt", type=float, default=30.0)
+    p.add_argument("--dwell", type=float, default=600.0, help="每个目标停留秒数")
+    p.add_argument("--run", action="store_true", help="按计划驱动赤道仪")
+    mount_args(p, False)
+    p.set_defaults(func=cmd_plan)
+
+    # 参数由 batch_cli 自己解析，构造解析器时不必导入解析器模块
+    p = sub.add_parser("batch", help="批量解析目录 (starlink batch -h 查看参数)", add_help=False)
+    p.add_argument("argv", nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("ui", help="启动图形界面 (需要 flet)")
+    p.set_defaults(func=cmd_ui)
+    return parser
+
+
+def main(argv=None):
+    from . import metrics
+    args = build_parser().parse_args(argv)
+    metrics.setup_from_env(args.metrics_port, args.metrics_file, args.profile)
+    _apply_location(args)
+    try:
+        return args.func(args)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"starlink: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
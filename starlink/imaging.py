@@ -0,0 +1,265 @@
+"""
+星图输入与星点提取：零拷贝的 ImageSource、最小 FITS 读写、xylist 生成与向量化星点检测。
+"""
+import math
+import mmap
+import os
+
+import numpy as np
+
+
+UPLOAD_CHUNK = 1 << 20
+
+
+class ImageSource:
+    """
+    星图输入的统一封装：文件以只读 mmap 映射，内存数据 (Android 的 bytes) 用 memoryview 包装，
+    都不做整幅复制。每次解析各自打开一个 ImageSource，并发解析互不干扰。
+    """
+
+    def __init__(self, view, path=None, mm=None, obj=None):
+        self.view = view
+        self.path = path
+        self.obj = obj
+        self._mmap = mm
+
+    @classmethod
+    def open(cls, file_path=None, file_bytes=None):
+        if file_bytes is not None and len(file_bytes):
+            return cls(memoryview(file_bytes).cast('B'), path=None, obj=file_bytes)
+        if file_path and os.path.exists(file_path):
+            with open(file_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return cls(memoryview(b''), path=file_path)
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return cls(memoryview(mm), path=file_path, mm=mm)
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+
+    def __len__(self):
+        return self.view.nbytes
+
+    def chunks(self, size=UPLOAD_CHUNK):
+        """按块产出 memoryview 切片；mmap 来源在每块用完后归还页面，常驻内存只有约一个块。"""
+        for start in range(0, len(self), size):
+            yield self.view[start:start + size]
+            if self._mmap is not None and hasattr(mmap, 'MADV_DONTNEED'):
+                self._mmap.madvise(mmap.MADV_DONTNEED, start, min(size, len(self) - start))
+
+    def release(self, arr):
+        """归还 arr (引用本 source 缓冲区的连续数组片段) 覆盖的 mmap 页面，用于逐条带处理大图。"""
+        if self._mmap is None or not hasattr(mmap, 'MADV_DONTNEED') or arr.size == 0:
+            return
+        base = np.frombuffer(self.view, np.uint8).ctypes.data
+        start = arr.ctypes.data - base
+        end = start + arr.nbytes
+        if not 0 <= start < end <= len(self):
+            return
+        start = -(-start // mmap.PAGESIZE) * mmap.PAGESIZE
+        if end > start:
+            self._mmap.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def digest(self):
+        import hashlib
+        h = hashlib.sha256()
+        for chunk in self.chunks():
+            h.update(chunk)
+        return h.hexdigest()
+
+    def close(self):
+        try:
+            self.view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            pass  # 仍有数组引用该缓冲区，交给 GC 回收
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_fits_header(buf):
+    """读取 FITS 主头，返回 ({关键字: 字符串值}, 数据区偏移)。缺少 END 时读到 buf 末尾为止。"""
+    header = {}
+    pos = 0
+    while pos < len(buf):
+        block = bytes(buf[pos:pos + 2880]).decode('ascii', 'replace')
+        pos += 2880
+        for i in range(0, 2880, 80):
+            card = block[i:i + 80]
+            key = card[:8].strip()
+            if key == 'END':
+                break
+            if card[8:10] == '= ':
+                header[key] = card[10:].split('/')[0].strip().strip("'").strip()
+        else:
+            continue
+        break
+    return header, pos
+
+
+def _read_fits_image(buf):
+    """
+    最小 FITS 读取：主 HDU 的 2D (或 3D 取第一平面) 图像，返回直接引用 buf 的只读数组 (不复制)。
+    BSCALE/BZERO 是线性变换，星点检测对其不敏感，因此不做换算。
+    """
+    header, pos = read_fits_header(buf)
+    dtype = {8: '>u1', 16: '>i2', 32: '>i4', -32: '>f4', -64: '>f8'}[int(header['BITPIX'])]
+    w, h = int(header['NAXIS1']), int(header['NAXIS2'])
+    return np.frombuffer(buf, dtype=dtype, count=w * h, offset=pos).reshape(h, w)
+
+
+def _fits_header(cards):
+    """cards: [(key, value)]，按 FITS 定长 80 字符卡片拼装并补齐到 2880 字节。"""
+    lines = []
+    for key, value in cards:
+        if isinstance(value, bool):
+            value = 'T' if value else 'F'
+        elif isinstance(value, str):
+            # 字符串左对齐从第 11 列开始，其余值右对齐到第 30 列
+            lines.append(f"{key:<8}= '{value:<8}'".ljust(80))
+            continue
+        lines.append(f"{key:<8}= {value:>20}".ljust(80))
+    lines.append("END".ljust(80))
+    return "".join(lines).ljust(-(-len(lines) * 80 // 2880) * 2880).encode('ascii')
+
+
+def write_xylist(x, y, flux, width, height):
+    """
+    把星点写成 astrometry.net 的 xylist：空主 HDU + BINTABLE (X, Y, FLUX)。
+    坐标转为 FITS 约定的 1 起始像素，按亮度降序排列。
+    """
+    table = np.empty(len(x), dtype=[('X', '>f4'), ('Y', '>f4'), ('FLUX', '>f4')])
+    table['X'], table['Y'], table['FLUX'] = np.asarray(x) + 1, np.asarray(y) + 1, flux
+    primary = _fits_header([("SIMPLE", True), ("BITPIX", 8), ("NAXIS", 0), ("EXTEND", True)])
+    header = _fits_header([
+        ("XTENSION", "BINTABLE"), ("BITPIX", 8), ("NAXIS", 2),
+        ("NAXIS1", table.dtype.itemsize), ("NAXIS2", len(table)),
+        ("PCOUNT", 0), ("GCOUNT", 1), ("TFIELDS", 3),
+        ("TTYPE1", "X"), ("TFORM1", "E"), ("TTYPE2", "Y"), ("TFORM2", "E"),
+        ("TTYPE3", "FLUX"), ("TFORM3", "E"),
+        ("IMAGEW", int(width)), ("IMAGEH", int(height)),
+    ])
+    data = table.tobytes()
+    return primary + header + data + b"\0" * (-len(data) % 2880)
+
+
+def image_dimensions(source):
+    """
+    只读文件头得到 (宽, 高)：支持 FITS、PNG、JPEG，不解码像素、不需要 Pillow。无法识别时返回 None。
+    """
+    view = source.view
+    head = bytes(view[:32])
+    try:
+        if head.startswith(b'SIMPLE  ='):
+            header, _ = read_fits_header(view)
+            return int(header['NAXIS1']), int(header['NAXIS2'])
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            return int.from_bytes(head[16:20], 'big'), int.from_bytes(head[20:24], 'big')
+        if head.startswith(b'\xff\xd8'):
+            # 逐段跳过 JPEG 标记，直到 SOFn (C0..CF，除去 C4 DHT / C8 / CC DAC)
+            pos = 2
+            while pos + 9 < len(view):
+                if view[pos] != 0xFF:
+                    pos += 1
+                    continue
+                marker = view[pos + 1]
+                if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                    pos += 1 if marker == 0xFF else 2
+                    continue
+                seg = int.from_bytes(bytes(view[pos + 2:pos + 4]), 'big')
+                if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                    h = int.from_bytes(bytes(view[pos + 5:pos + 7]), 'big')
+                    w = int.from_bytes(bytes(view[pos + 7:pos + 9]), 'big')
+                    return w, h
+                pos += 2 + seg
+    except (KeyError, ValueError):
+        pass
+    return None
+
+
+def load_image_gray(source):
+    """
+    读取 ImageSource 为灰度数组。FITS 直接映射 (数组引用 source 的缓冲区，用完前不要关闭 source)，
+    其它格式需要 Pillow。
+    """
+    if bytes(source.view[:9]) == b'SIMPLE  =':
+        return _read_fits_image(source.view)
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("解码 JPEG/PNG/TIFF 需要安装 Pillow (pip install pillow)")
+    import io
+    with Image.open(source.path or io.BytesIO(source.obj)) as im:
+        return np.asarray(im.convert('F'), dtype=np.float32)
+
+
+def extract_stars(img, max_stars=60, max_size=1024, snr=5.0, release=None):
+    """
+    向量化星点提取：降采样 → 分块中值背景扣除 → 3x3 局部极大 → 5x5 加权质心。
+    返回按亮度降序的 (x, y, flux)，坐标为原图像素 (y 向下)。
+    release(rows) 可选，每处理完一个行条带调用一次 (ImageSource.release 归还 mmap 页面)。
+    """
+    img = np.asarray(img)
+    if img.ndim == 3:
+        img = img.mean(axis=2, dtype=np.float32)
+    h0, w0 = img.shape
+    k = max(1, int(math.ceil(max(h0, w0) / max_size)))
+    h, w = h0 // k, w0 // k
+    # 按行条带降采样：mmap 上的大图只在条带内转换为 float32，不整幅复制
+    small = np.empty((h, w), dtype=np.float32)
+    step = max(1, (1 << 20) // (k * k * max(w, 1)))
+    for r in range(0, h, step):
+        rows = img[r * k:(r + step) * k]
+        strip = np.asarray(rows[:, :w * k], dtype=np.float32)
+        small[r:r + step] = strip.reshape(-1, k, w, k).mean(axis=(1, 3))
+        if release is not None and rows.flags.c_contiguous:
+            release(rows)
+
+    # 分块中值背景 (32 像素块)，最近邻放大回原尺寸
+    tile = 32
+    th, tw = max(1, h // tile), max(1, w // tile)
+    cropped = small[:th * tile, :tw * tile] if h >= tile and w >= tile else small
+    bs_h, bs_w = cropped.shape[0] // th, cropped.shape[1] // tw
+    tiles = cropped[:th * bs_h, :tw * bs_w].reshape(th, bs_h, tw, bs_w)
+    bg_tiles = np.median(tiles.transpose(0, 2, 1, 3).reshape(th, tw, -1), axis=2)
+    rows = np.minimum(np.arange(h) // bs_h, th - 1)
+    cols = np.minimum(np.arange(w) // bs_w, tw - 1)
+    res = small - bg_tiles[rows][:, cols]
+    sigma = 1.4826 * float(np.median(np.abs(res - np.median(res)))) or 1e-6
+
+    # 3x3 局部极大 (边缘 2 像素不检测，保证 5x5 窗口完整)
+    pad = np.pad(res, 1, mode='edge')
+    local_max = pad[:h, :w].copy()
+    for dy in range(3):
+        for dx in range(3):
+            np.maximum(local_max, pad[dy:dy + h, dx:dx + w], out=local_max)
+    peaks = (res >= local_max) & (res > snr * sigma)
+    peaks[:2, :] = peaks[-2:, :] = False
+    peaks[:, :2] = peaks[:, -2:] = False
+    py, px = np.nonzero(peaks)
+    if py.size == 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+
+    # 5x5 窗口加权质心
+    off = np.arange(-2, 3)
+    wy = py[:, None, None] + off[None, :, None]
+    wx = px[:, None, None] + off[None, None, :]
+    win = np.clip(res[wy, wx], 0, None)
+    flux = win.sum(axis=(1, 2))
+    cy = py + (win.sum(axis=2) * off).sum(axis=1) / flux
+    cx = px + (win.sum(axis=1) * off).sum(axis=1) / flux
+
+    # 亮度排序 + 近邻抑制 (平顶峰会产生相邻的重复极大)
+    order = np.argsort(-flux)[:max_stars * 4]
+    cx, cy, flux = cx[order], cy[order], flux[order]
+    keep = []
+    for i in range(cx.size):
+        if all((cx[i] - cx[j]) ** 2 + (cy[i] - cy[j]) ** 2 > 9 for j in keep):
+            keep.append(i)
+            if len(keep) >= max_stars:
+                break
+    keep = np.array(keep)
+    return (cx[keep] + 0.5) * k - 0.5, (cy[keep] + 0.5) * k - 0.5, flux[keep]
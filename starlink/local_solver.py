@@ -0,0 +1,263 @@
+"""
+本地解析后端：在有界工作池中以子进程运行 astrometry.net 的 solve-field 或 ASTAP，
+结果换算为与其它后端相同的 (success, ra, dec, az, alt, label)。
+"""
+import atexit
+import math
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+from . import metrics
+from .astro import get_az_alt
+from .catalog import annotate_field
+from .imaging import ImageSource, image_dimensions, read_fits_header
+
+
+LOCAL_SOLVER = os.getenv("STARLINK_LOCAL_SOLVER", "")       # 可执行文件路径，空则在 PATH 中查找
+LOCAL_SOLVER_KIND = os.getenv("STARLINK_LOCAL_KIND", "")    # solve-field | astap，空则按文件名判断
+LOCAL_SOLVER_WORKERS = int(os.getenv("STARLINK_LOCAL_WORKERS", "2"))
+LOCAL_SOLVER_TIMEOUT = float(os.getenv("STARLINK_LOCAL_TIMEOUT", "60"))
+LOCAL_EXECUTABLES = ("solve-field", "astap_cli", "astap")
+LOCAL_SCALE_TOL = 0.1       # 尺度提示的相对范围 (±10%)
+
+
+def _image_suffix(source):
+    head = bytes(source.view[:9])
+    if head == b'SIMPLE  =':
+        return '.fits'
+    if head.startswith(b'\x89PNG'):
+        return '.png'
+    if head.startswith(b'II*\x00') or head.startswith(b'MM\x00*'):
+        return '.tif'
+    return '.jpg'
+
+
+def _terminate(proc):
+    """结束子进程及其派生的进程 (solve-field 会再启动 astrometry-engine 等)。"""
+    try:
+        if os.name == 'posix':
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except OSError:
+        pass
+    proc.wait()
+
+
+class LocalSolver:
+    """
+    solve-field / ASTAP 子进程池。同时运行的进程数不超过 workers，排队超过 timeout 或
+    进程运行超过 timeout 都按失败返回，由 solve_star_image 转交下一个后端。
+    每次解析使用独立的临时目录，可安全并发。
+    """
+
+    def __init__(self, executable=None, kind=None, workers=LOCAL_SOLVER_WORKERS,
+                 timeout=LOCAL_SOLVER_TIMEOUT):
+        self.executable = executable or LOCAL_SOLVER or self.find_executable()
+        name = os.path.basename(self.executable or "").lower()
+        self.kind = kind or LOCAL_SOLVER_KIND or ("astap" if "astap" in name else "solve-field")
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self.scale_memory = {}      # (宽, 高) -> 角秒/像素，同一相机后续解析给出紧尺度范围
+        self.stats = {"solved": 0, "failed": 0, "timeouts": 0, "rejected": 0, "peak": 0}
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._procs = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def find_executable():
+        for name in LOCAL_EXECUTABLES:
+            path = shutil.which(name)
+            if path:
+                return path
+        return None
+
+    @property
+    def available(self):
+        return bool(self.executable)
+
+    @property
+    def running(self):
+        return len(self._procs)
+
+    def command(self, image, workdir, hints, size):
+        """返回 (argv, 输出文件前缀)。hints 见 solve_star_image。"""
+        base = os.path.join(workdir, "solve")
+        ra, dec = hints.get("ra"), hints.get("dec")
+        radius = hints.get("radius")
+        scale = hints.get("scale") or (self.scale_memory.get(size) if size else None)
+        if self.kind == "astap":
+            argv = [self.executable, "-f", image, "-o", base, "-z", "0",
+                    "-r", f"{radius if ra is not None and radius else 180:g}"]
+            if ra is not None and dec is not None:
+                argv += ["-ra", f"{ra / 15.0:.6f}", "-spd", f"{dec + 90.0:.6f}"]
+            if scale and size:
+                argv += ["-fov", f"{scale * size[1] / 3600.0:.4f}"]
+            return argv, base
+        argv = [self.executable, "--overwrite", "--no-plots", "--dir", workdir, "--out", "solve",
+                "--new-fits", "none", "--corr", "none", "--rdls", "none", "--match", "none",
+                "--index-xyls", "none", "--cpulimit", f"{self.timeout:.0f}"]
+        if size and max(size) > 2048:
+            argv += ["--downsample", str(math.ceil(max(size) / 1024))]
+        if scale:
+            argv += ["--scale-units", "arcsecperpix",
+                     "--scale-low", f"{scale * (1 - LOCAL_SCALE_TOL):.4f}",
+                     "--scale-high", f"{scale * (1 + LOCAL_SCALE_TOL):.4f}"]
+        if ra is not None and dec is not None and radius:
+            argv += ["--ra", f"{ra:.6f}", "--dec", f"{dec:.6f}", "--radius", f"{radius:g}"]
+        return argv + [image], base
+
+    def read_solution(self, base, size):
+        """
+        解析输出的 WCS (solve-field: .wcs，ASTAP: .ini)，返回 dict 或 None。
+        未解出、输出不完整 (缺少 CRVAL 等关键字) 或数值无法解析都返回 None，按解析失败处理。
+        """
+        try:
+            if self.kind == "astap":
+                with open(base + ".ini") as f:
+                    wcs = dict(line.strip().split("=", 1) for line in f if "=" in line)
+                if wcs.get("PLTSOLVD", "F").strip() != "T":
+                    return None
+            else:
+                if not os.path.exists(base + ".solved"):
+                    return None
+                with open(base + ".wcs", "rb") as f:
+                    wcs, _ = read_fits_header(f.read())
+            num = {k: float(v) for k, v in wcs.items()
+                   if k.startswith(("CRVAL", "CRPIX", "CD", "IMAGE"))}
+            if "IMAGEW" in num:
+                size = int(num["IMAGEW"]), int(num["IMAGEH"])
+            ra0, dec0 = num["CRVAL1"], num["CRVAL2"]
+        except (OSError, KeyError, ValueError, OverflowError):
+            return None
+        cd11, cd12 = num.get("CD1_1", 0.0), num.get("CD1_2", 0.0)
+        cd21, cd22 = num.get("CD2_1", 0.0), num.get("CD2_2", 0.0)
+        ra, dec = ra0, dec0
+        if size:
+            # 参考像素不一定在图像中心：按 CD 矩阵换到中心再做心射逆投影
+            dx = (size[0] + 1) / 2 - num.get("CRPIX1", (size[0] + 1) / 2)
+            dy = (size[1] + 1) / 2 - num.get("CRPIX2", (size[1] + 1) / 2)
+            xi, eta = cd11 * dx + cd12 * dy, cd21 * dx + cd22 * dy
+            if xi or eta:
+                from .solver import inverse_gnomonic
+                ra, dec = inverse_gnomonic(ra0, dec0, complex(math.radians(xi), math.radians(eta)))
+                ra, dec = float(ra), float(dec)
+        pixscale = math.sqrt(abs(cd11 * cd22 - cd12 * cd21)) * 3600.0
+        return {"ra": ra, "dec": dec, "pixscale": pixscale, "size": size,
+                "rotation": math.degrees(math.atan2(cd21, cd22))}
+
+    def _run(self, argv, cwd):
+        proc = subprocess.Popen(argv, cwd=cwd, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                start_new_session=os.name == 'posix')
+        with self._lock:
+            self._procs.add(proc)
+            self.stats["peak"] = max(self.stats["peak"], len(self._procs))
+        try:
+            _, err = proc.communicate(timeout=self.timeout)
+            return proc.returncode, err.decode('utf-8', 'replace').strip()
+        except subprocess.TimeoutExpired:
+            _terminate(proc)
+            raise
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+
+    def solve(self, file_path=None, file_bytes=None, progress_cb=None, hints=None):
+        def _report(msg):
+            if progress_cb:
+                try:
+                    progress_cb(msg)
+                except Exception:
+                    pass
+
+        if not self.available:
+            return False, 0, 0, 0, 0, "未找到 solve-field / ASTAP (可设置 STARLINK_LOCAL_SOLVER)"
+        hints = hints or {}
+        t0 = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            _report("⏳ 等待本地解析进程 ...")
+            if not self._slots.acquire(timeout=self.timeout):
+                self.stats["rejected"] += 1
+                return False, 0, 0, 0, 0, f"本地解析排队超时 (>{self.timeout:.0f}s)"
+        try:
+            # 拿到名额后才打开 (映射) 图像，排队中不占文件句柄与 mmap
+            try:
+                source = ImageSource.open(file_path, file_bytes)
+            except FileNotFoundError as e:
+                return False, 0, 0, 0, 0, str(e)
+            with source, tempfile.TemporaryDirectory(prefix="starlink-solve-") as workdir:
+                size = image_dimensions(source)
+                if file_bytes is not None or not file_path:
+                    image = os.path.join(workdir, "input" + _image_suffix(source))
+                    with open(image, 'wb') as f:
+                        for chunk in source.chunks():
+                            f.write(chunk)
+                else:
+                    image = os.path.abspath(file_path)
+                argv, base = self.command(image, workdir, hints, size)
+                near = " (有位置提示)" if hints.get("ra") is not None else ""
+                _report(f"🖥 本地解析中 ({self.kind}){near} ...")
+                try:
+                    with metrics.timer("solve_phase_seconds", backend="local", phase=self.kind):
+                        code, err = self._run(argv, workdir)
+                except subprocess.TimeoutExpired:
+                    self.stats["timeouts"] += 1
+                    return False, 0, 0, 0, 0, f"本地解析超时 (>{self.timeout:.0f}s)"
+                result = self.read_solution(base, size)
+            if result is None:
+                self.stats["failed"] += 1
+                detail = f" ({err.splitlines()[-1]})" if err else f" (exit {code})" if code else ""
+                return False, 0, 0, 0, 0, f"解析失败: 无法匹配星图 (本地){detail}"
+        except OSError as e:
+            self.stats["failed"] += 1
+            return False, 0, 0, 0, 0, f"本地解析出错: {e}"
+        finally:
+            self._slots.release()
+
+        self.stats["solved"] += 1
+        size = result["size"]
+        if size and result["pixscale"]:
+            self.scale_memory[tuple(size)] = result["pixscale"]
+        ra, dec = result["ra"], result["dec"]
+        az, alt = get_az_alt(ra, dec)
+        radius = (math.hypot(*size) * result["pixscale"] / 7200.0) if size else 1.0
+        names = annotate_field(ra, dec, radius)
+        label = ", ".join(names[:3]) if names else "Star Field"
+        return True, ra, dec, az, alt, (f"{label} ({self.kind}, {result['pixscale']:.2f}\"/px, "
+                                        f"{time.monotonic() - t0:.1f}s)")
+
+    def close(self):
+        """结束仍在运行的解析进程 (程序退出时调用)。"""
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            _terminate(proc)
+
+
+_local_solver = None
+_local_solver_lock = threading.Lock()
+
+
+def get_local_solver():
+    global _local_solver
+    with _local_solver_lock:
+        if _local_solver is None:
+            _local_solver = LocalSolver()
+            atexit.register(_local_solver.close)
+            metrics.register_collector("local_solver", lambda: dict(
+                _local_solver.stats, running=_local_solver.running))
+        return _local_solver
+
+
+def solve_star_image_local(file_path=None, file_bytes=None, progress_cb=None, hints=None):
+    """
+    本地 solve-field / ASTAP 解析。hints 可含 ra/dec/radius (度) 与 scale (角秒/像素)，
+    用于缩小搜索范围；返回 (success, ra, dec, az, alt, label)。
+    """
+    return get_local_solver().solve(file_path, file_bytes, progress_cb, hints)
@@ -0,0 +1,475 @@
+"""
+轻量埋点：计数器与直方图、已有统计 (链路 / 追踪 / 解析缓存 / UI 调度 / 广播) 的汇集，
+Prometheus 文本端点与滚动 JSONL 导出，以及 cProfile / 采样分析器开关。
+
+缺省关闭；关闭时每个埋点只多一次属性判断。开启方式见 setup_from_env。
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+
+# 直方图桶上限 (秒)：50 µs ~ 60 s
+BUCKETS = (5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_PREFIX = "starlink_"
+# 采样时视为空闲的栈顶 (阻塞等待中的线程)，不计入报告
+IDLE_FRAMES = frozenset({"threading.py:wait", "selectors.py:select", "queue.py:get"})
+
+
+def _env_flag(name):
+    return os.getenv(name, "").strip().lower() not in ("", "0", "false", "off", "no")
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    """固定桶的耗时直方图 (秒)，另记总数、总和与最大值。"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        """按桶线性插值的近似分位数 (秒)。"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lo + (hi - lo) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def snapshot(self):
+        return {"count": self.count,
+                "mean_ms": self.sum / self.count * 1e3 if self.count else 0.0,
+                "p50_ms": self.quantile(0.5) * 1e3,
+                "p95_ms": self.quantile(0.95) * 1e3,
+                "max_ms": self.max * 1e3}
+
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """
+    进程级的指标表。histogram / counter 以 (名称, 标签) 为键；collector 为返回
+    {指标: 数值} (可嵌套) 的函数，导出时才调用，用来汇集各模块已有的 stats。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._hists = {}
+        self._counters = {}
+        self._collectors = {}
+        self._next_handle = 0
+        self._lock = threading.Lock()
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        hist = self._hists.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._hists.setdefault(key, Histogram())
+        return hist
+
+    def observe(self, name, seconds, **labels):
+        if self.enabled:
+            self.histogram(name, **labels).observe(seconds)
+
+    def inc(self, name, n=1, **labels):
+        if self.enabled:
+            key = (name, tuple(sorted(labels.items())))
+            with self._lock:
+                self._counters[key] = self._counters.get(key, 0) + n
+
+    def timer(self, name, **labels):
+        """with metrics.timer("x_seconds"): ...，关闭时返回空操作的上下文。"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(name, **labels))
+
+    def timed(self, name, ok=None, **labels):
+        """
+        函数耗时装饰器。ok(result) 可选：返回假值时计入 <name 去掉 _seconds>_failures 计数，
+        用于以返回值表示失败的函数 (如 send_udp_command 的 (False, msg))。异常同样计为失败。
+        """
+        failures = name.rsplit("_seconds", 1)[0] + "_failures"
+
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException:
+                    self.inc(failures, **labels)
+                    raise
+                finally:
+                    self.histogram(name, **labels).observe(time.perf_counter() - t0)
+                if ok is not None and not ok(result):
+                    self.inc(failures, **labels)
+                return result
+            return wrapper
+        return deco
+
+    def register_collector(self, prefix, fn, **labels):
+        """注册汇集函数，返回用于 unregister_collector 的句柄。"""
+        with self._lock:
+            self._next_handle += 1
+            self._collectors[self._next_handle] = (prefix, fn, tuple(sorted(labels.items())))
+            return self._next_handle
+
+    def unregister_collector(self, handle):
+        with self._lock:
+            self._collectors.pop(handle, None)
+
+    def gauges(self):
+        """调用全部 collector，展平为 {(名称, 标签): 数值}；None 与非数值字段跳过。"""
+        with self._lock:
+            collectors = list(self._collectors.values())
+        out = {}
+
+        def walk(name, value, labels):
+            if isinstance(value, dict):
+                for k, v in value.items():
+                    walk(f"{name}_{k}", v, labels)
+            elif isinstance(value, (bool, int, float)):
+                out[(name, labels)] = float(value)
+
+        for prefix, fn, labels in collectors:
+            try:
+                walk(prefix, fn(), labels)
+            except Exception:
+                continue
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            hists = list(self._hists.items())
+            counters = dict(self._counters)
+        return {
+            "time": time.time(),
+            "histograms": {_series(n, l): h.snapshot() for (n, l), h in hists if h.count},
+            "counters": {_series(n, l): v for (n, l), v in counters.items()},
+            "gauges": {_series(n, l): v for (n, l), v in self.gauges().items()},
+        }
+
+    def prometheus_text(self):
+        """Prometheus 文本格式 (0.0.4)。"""
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            hists = sorted(self._hists.items())
+            counters = sorted(self._counters.items())
+        for (name, labels), h in hists:
+            name = METRICS_PREFIX + name
+            header(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float("inf"),), h.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{_series(name + '_bucket', labels + (('le', le),))} {cumulative}")
+            lines.append(f"{_series(name + '_sum', labels)} {h.sum!r}")
+            lines.append(f"{_series(name + '_count', labels)} {h.count}")
+        for (name, labels), v in counters:
+            name = METRICS_PREFIX + name + "_total"
+            header(name, "counter")
+            lines.append(f"{_series(name, labels)} {v}")
+        for (name, labels), v in sorted(self.gauges().items()):
+            name = METRICS_PREFIX + name
+            header(name, "gauge")
+            lines.append(f"{_series(name, labels)} {v!r}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(enabled=_env_flag("STARLINK_METRICS"))
+observe = REGISTRY.observe
+inc = REGISTRY.inc
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+register_collector = REGISTRY.register_collector
+unregister_collector = REGISTRY.unregister_collector
+
+
+class Profiler:
+    """
+    诊断用分析器。mode='sample'：后台线程每 interval 秒对全部线程的调用栈采样，
+    开销低、覆盖 UI / 传输 / 解析各线程，结果为 flamegraph 可用的折叠栈；
+    mode='cprofile'：确定性分析调用 start() 的线程 (适合命令行的单次解析、批量解析)。
+    采样模式跳过空闲线程 (栈顶在 IDLE_FRAMES 中)，profile_for 还跳过等待中的调用线程。
+    """
+
+    def __init__(self, mode="sample", interval=0.005):
+        if mode not in ("sample", "cprofile"):
+            raise ValueError(f"未知分析模式: {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.idle = 0
+        self._skip = None
+        self._profile = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.mode == "cprofile":
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._thread = threading.Thread(target=self._sample, name="starlink-profiler",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident in (me, self._skip):
+                    continue
+                code = frame.f_code
+                if f"{os.path.basename(code.co_filename)}:{code.co_name}" in IDLE_FRAMES:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self, path=None, top=25):
+        """停止并返回文字报告；给出 path 时另存原始结果 (.prof 或折叠栈文本)。"""
+        if self.mode == "cprofile":
+            import io
+            import pstats
+            self._profile.disable()
+            if path:
+                self._profile.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(top)
+            return out.getvalue()
+        self._stop.set()
+        self._thread.join()
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(f"{k} {v}\n" for k, v in self.stacks.items())
+        own, total = {}, {}
+        for key, n in self.stacks.items():
+            frames = key.split(";")
+            own[frames[-1]] = own.get(frames[-1], 0) + n
+            for fr in set(frames):
+                total[fr] = total.get(fr, 0) + n
+        lines = [f"{self.samples} 次采样 (间隔 {self.interval * 1e3:.0f} ms，空闲线程栈 {self.idle} 个已跳过)",
+                 f"{'self':>7} {'total':>7}  function"]
+        for fr, n in sorted(own.items(), key=lambda kv: -kv[1])[:top]:
+            lines.append(f"{n:>7} {total[fr]:>7}  {fr}")
+        return "\n".join(lines) + "\n"
+
+    def profile_for(self, seconds):
+        self._skip = threading.get_ident()
+        self.start()
+        time.sleep(seconds)
+        return self.stop()
+
+
+class MetricsServer:
+    """
+    本地 HTTP 端点：/metrics (Prometheus 文本)、/metrics.json (快照)、
+    /profile?seconds=10 (采样分析指定秒数后返回报告)。缺省只监听 127.0.0.1。
+    """
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlparse
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    body, ctype = registry.prometheus_text(), "text/plain; version=0.0.4"
+                elif url.path == "/metrics.json":
+                    body, ctype = json.dumps(registry.snapshot(), ensure_ascii=False), "application/json"
+                elif url.path == "/profile":
+                    query = parse_qs(url.query)
+                    seconds = min(float(query.get("seconds", ["10"])[0]), 300.0)
+                    body = Profiler("sample").profile_for(seconds)
+                    ctype = "text/plain; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="starlink-metrics",
+                         daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class JsonlExporter:
+    """每 interval 秒把 snapshot() 追加一行到 JSONL，文件超过 max_bytes 时滚动 (保留 backups 个)。"""
+
+    def __init__(self, path, registry=REGISTRY, interval=10.0, max_bytes=4 << 20, backups=3):
+        from logging.handlers import RotatingFileHandler
+        self.registry = registry
+        self.interval = interval
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                            encoding="utf-8")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        import logging
+        line = json.dumps(self.registry.snapshot(), ensure_ascii=False)
+        self._handler.emit(logging.makeLogRecord({"msg": line}))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="starlink-metrics-jsonl",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+        self._handler.close()
+
+
+_setup_done = False
+
+
+def setup_from_env(port=None, path=None, profile=None):
+    """
+    入口 (命令行 / App) 调用一次，参数缺省取环境变量:
+      STARLINK_METRICS=1              开启埋点
+      STARLINK_METRICS_PORT=9108      开启埋点并在 127.0.0.1 上提供 /metrics
+      STARLINK_METRICS_FILE=path      开启埋点并每 STARLINK_METRICS_INTERVAL 秒写一行 JSONL
+      STARLINK_PROFILE=sample|cprofile  整个运行期间开启分析器，退出时把报告写到 ~/.starlink/
+    返回启动的 (MetricsServer 或 None, JsonlExporter 或 None)；重复调用无副作用。
+    """
+    global _setup_done
+    if _setup_done:
+        return None, None
+    _setup_done = True
+    port = port if port is not None else int(os.getenv("STARLINK_METRICS_PORT", "0") or 0)
+    path = path or os.getenv("STARLINK_METRICS_FILE", "")
+    profile = profile or os.getenv("STARLINK_PROFILE", "")
+    REGISTRY.enabled = REGISTRY.enabled or _env_flag("STARLINK_METRICS") or bool(port or path)
+    server = exporter = None
+    if port:
+        try:
+            server = MetricsServer(port=port).start()
+            print(f"指标端点: {server.url}/metrics", file=sys.stderr)
+        except OSError as e:
+            print(f"指标端点启动失败: {e}", file=sys.stderr)
+    if path:
+        exporter = JsonlExporter(path, interval=float(os.getenv("STARLINK_METRICS_INTERVAL", "10")))
+        atexit.register(exporter.stop)
+        exporter.start()
+    if profile:
+        profiler = Profiler(profile).start()
+        base = os.path.join(os.path.expanduser("~"), ".starlink", f"profile-{os.getpid()}")
+
+        def _dump():
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            raw = base + (".prof" if profiler.mode == "cprofile" else ".folded")
+            report = profiler.stop(raw)
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(report)
+            print(f"分析报告: {base}.txt ({raw})", file=sys.stderr)
+
+        atexit.register(_dump)
+    return server, exporter
@@ -0,0 +1,669 @@
+"""
+在线解析：nova.astrometry.net 异步客户端、按内容寻址的解析缓存与本地替身服务器 (FakeNovaServer)。
+"""
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+
+from . import metrics
+from .astro import get_az_alt
+from .catalog import annotate_field
+from .imaging import ImageSource, UPLOAD_CHUNK, extract_stars, load_image_gray, write_xylist
+
+
+def nova_api_key():
+    return os.getenv("ASTROMETRY_API_KEY", "如果没有读到就用备用字符")
+
+
+def multipart_stream(fields, file_field, filename, source, chunk_size=UPLOAD_CHUNK):
+    """
+    流式 multipart/form-data：返回 (headers, 异步字节迭代器)。
+    文件部分按块从 source 读出，Content-Length 预先算好，不拼出完整请求体。
+    """
+    boundary = os.urandom(16).hex()
+    head = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode()
+        for k, v in fields.items())
+    head += (f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+             f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n').encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}",
+               "Content-Length": str(len(head) + len(source) + len(tail))}
+
+    async def body():
+        yield head
+        for chunk in source.chunks(chunk_size):
+            yield bytes(chunk)
+        yield tail
+    return headers, body()
+
+
+SOLVE_CACHE_DIR = os.getenv(
+    "STARLINK_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".starlink", "solve_cache"))
+
+
+class SolveCache:
+    """
+    按图片内容 (sha256) 寻址的解析结果磁盘缓存，每个条目一个 JSON 文件。
+
+    条目字段: state ('pending' | 'done')、subid、job_id、calibration、objects_in_field。
+    pending 条目记录进行中的 nova 任务，重启后据此继续轮询而不是重新上传；
+    超过 pending_max_age 秒仍未完成的视为失效，丢弃后重新上传。
+    淘汰：超过 max_age 秒的条目删除；总大小超过 max_bytes 时按最近访问时间 (mtime) 删除最旧的。
+    """
+
+    def __init__(self, directory=SOLVE_CACHE_DIR, max_bytes=16 * 1024 * 1024,
+                 max_age=30 * 86400, pending_max_age=6 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.pending_max_age = pending_max_age
+        self.stats = {"hits": 0, "resumed": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(data):
+        """data 为 ImageSource 或 bytes-like。"""
+        if isinstance(data, ImageSource):
+            return data.digest()
+        import hashlib
+        return hashlib.sha256(data).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """读取条目 (dict) 并刷新其访问时间；不存在或损坏返回 None。"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        age = time.time() - entry.get("created", 0)
+        if age > self.max_age or (entry.get("state") == "pending" and age > self.pending_max_age):
+            self.discard(key)
+            return None
+        return entry
+
+    def put(self, key, **fields):
+        """合并写入条目 (临时文件 + os.replace，中途崩溃不会留下半个文件)。"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            entry = self.get(key) or {"key": key, "created": time.time()}
+            entry.update(fields)
+            tmp = self._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+            self._evict()
+        return entry
+
+    def discard(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except OSError:
+            return
+        now = time.time()
+        files = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            # 按访问时间判断过期 (get 中还会按创建时间再判断一次)
+            if total <= self.max_bytes and now - mtime <= self.max_age:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+                if name.endswith(".json"):
+                    self.discard(name[:-5])
+
+
+SOLVE_CACHE = SolveCache()
+metrics.register_collector("solve_cache", lambda: SOLVE_CACHE.stats)
+
+
+def _hint_params(hints, params):
+    """solve_hints → nova 上传参数。已有 (记忆的) 尺度估计时不覆盖。"""
+    hints = hints or {}
+    out = {}
+    if hints.get("ra") is not None and hints.get("dec") is not None:
+        out.update(center_ra=hints["ra"], center_dec=hints["dec"],
+                   radius=hints.get("radius") or 10.0)
+    if hints.get("scale") and "scale_units" not in params:
+        out.update(scale_units="arcsecperpix", scale_type="ev",
+                   scale_est=hints["scale"], scale_err=10)
+    return out
+
+
+def _cached_solve_result(entry):
+    cal = entry["calibration"]
+    ra, dec = cal["ra"], cal["dec"]
+    az, alt = get_az_alt(ra, dec)
+    objs = entry.get("objects_in_field") or []
+    label = ", ".join(objs[:3]) if objs else "Star Field"
+    return True, ra, dec, az, alt, label
+
+
+NOVA_URL = os.getenv("STARLINK_NOVA_URL", "https://nova.astrometry.net")
+NOVA_PHASES = ("prepare", "login", "upload", "queue", "solve", "fetch")
+NOVA_UPLOAD = os.getenv("STARLINK_NOVA_UPLOAD", "xylist")  # xylist | image
+XYLIST_MAX_STARS = 300
+XYLIST_MIN_STARS = 12
+
+
+class NovaError(RuntimeError):
+    pass
+
+
+def backoff_delays(initial=0.5, factor=1.5, maximum=5.0):
+    """自适应轮询间隔：开始时频繁，逐渐放慢到 maximum。"""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+
+_call_timings = contextvars.ContextVar("nova_call_timings", default=None)
+
+
+class NovaClient:
+    """
+    Astrometry.net (nova) 的原生 asyncio 客户端。
+
+    一个 httpx.AsyncClient 连接池贯穿所有请求；session 缓存到 session_ttl 过期，
+    服务端报告 session 失效时自动重新登录一次。轮询使用 backoff_delays，
+    /calibration 与 /info/ 并发获取。每个阶段的耗时累计在 phase_stats 中，
+    单次调用的耗时通过 solve(timings=...) 取得 (并发的 solve 互不干扰)。
+    """
+
+    def __init__(self, api_key=None, base_url=NOVA_URL, session_ttl=1800,
+                 queue_timeout=60.0, solve_timeout=90.0, poll_initial=0.5,
+                 poll_max=5.0, request_timeout=15.0, upload_timeout=60.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.session_ttl = session_ttl
+        self.queue_timeout = queue_timeout
+        self.solve_timeout = solve_timeout
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.request_timeout = request_timeout
+        self.upload_timeout = upload_timeout
+        self.phase_stats = {p: {"count": 0, "total": 0.0, "max": 0.0} for p in NOVA_PHASES}
+        self._http = None
+        self._session = None
+        self._session_expiry = 0.0
+        self._login_lock = None
+        self.upload_mode = NOVA_UPLOAD
+        self.local_annotation = True
+        self.scale_memory = {}  # (宽, 高) → 上次解析得到的 arcsec/pixel
+        self.last_upload_bytes = 0
+
+    def prepare_upload(self, source, progress_cb=None):
+        """
+        xylist 模式下在本地提取星点，返回 (payload, filename, params, size)；
+        星点过少、图片无法解码 (如缺少 Pillow) 或 image 模式时退回上传原图，
+        退回的原因通过 progress_cb 报告。
+        size 为 (宽, 高) 或 None，解析成功后用来记住该尺寸的像素比例。
+        """
+        if self.upload_mode == "xylist":
+            try:
+                img = load_image_gray(source)
+                x, y, flux = extract_stars(img, max_stars=XYLIST_MAX_STARS,
+                                           release=source.release)
+                h, w = img.shape[:2]
+                del img
+                reason = f"星点过少 ({len(x)})"
+            except Exception as e:
+                x, reason = (), str(e)
+            if len(x) < XYLIST_MIN_STARS:
+                metrics.inc("nova_xylist_fallbacks")
+                if progress_cb:
+                    progress_cb(f"⚠️ 无法上传星点表: {reason}，改为上传原图")
+            else:
+                params = {"image_width": w, "image_height": h}
+                # 同一相机/镜头的像素比例不变：用上次结果给出 ±10% 的紧尺度范围
+                pixscale = self.scale_memory.get((w, h))
+                if pixscale:
+                    params.update(scale_units="arcsecperpix", scale_type="ev",
+                                  scale_est=pixscale, scale_err=10)
+                payload = ImageSource.open(file_bytes=write_xylist(x, y, flux, w, h))
+                return payload, 'stars.xyls', params, (w, h)
+        return source, 'star.jpg', {}, None
+
+    async def _client(self):
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url, timeout=self.request_timeout,
+                limits=httpx.Limits(max_connections=8, max_keepalive_connections=4))
+            self._login_lock = asyncio.Lock()
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def __aenter__(self):
+        await self._client()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def _record(self, phase, seconds):
+        metrics.observe("solve_phase_seconds", seconds, backend="nova", phase=phase)
+        timings = _call_timings.get()
+        if timings is not None:
+            timings[phase] = seconds
+        s = self.phase_stats[phase]
+        s["count"] += 1
+        s["total"] += seconds
+        s["max"] = max(s["max"], seconds)
+
+    def timings_snapshot(self):
+        """各阶段平均/最大耗时 (ms)。"""
+        return {p: {"count": s["count"],
+                    "mean_ms": s["total"] / s["count"] * 1e3 if s["count"] else 0.0,
+                    "max_ms": s["max"] * 1e3}
+                for p, s in self.phase_stats.items()}
+
+    async def _get_json(self, path):
+        http = await self._client()
+        res = await http.get(path)
+        res.raise_for_status()
+        return res.json()
+
+    async def _post_json(self, path, payload):
+        http = await self._client()
+        res = await http.post(path, data={'request-json': json.dumps(payload)})
+        res.raise_for_status()
+        return res.json()
+
+    async def login(self, force=False):
+        """返回缓存的 session，过期或 force 时重新登录。"""
+        await self._client()
+        async with self._login_lock:
+            if not force and self._session and time.monotonic() < self._session_expiry:
+                return self._session
+            t0 = time.perf_counter()
+            res = await self._post_json('/api/login', {"apikey": self.api_key or nova_api_key()})
+            self._record("login", time.perf_counter() - t0)
+            session = res.get('session')
+            if not session:
+                raise NovaError("Astrometry 登录失败")
+            self._session = session
+            self._session_expiry = time.monotonic() + self.session_ttl
+            return session
+
+    async def upload(self, source, filename='star.jpg', **params):
+        """
+        流式上传图片或 xylist 并返回 subid。source 为 ImageSource 或 bytes；
+        未给尺度参数时缺省为 degwidth 0.1~180。
+        """
+        if not isinstance(source, ImageSource):
+            source = ImageSource.open(file_bytes=source)
+        if "scale_units" not in params:
+            params.update(scale_units="degwidth", scale_lower=0.1, scale_upper=180)
+        for attempt in range(2):
+            session = await self.login(force=attempt > 0)
+            t0 = time.perf_counter()
+            fields = {'request-json': json.dumps(dict(session=session, publicly_visible="y", **params))}
+            headers, body = multipart_stream(fields, 'file', filename, source)
+            http = await self._client()
+            res = await http.post('/api/upload', content=body, headers=headers,
+                                  timeout=self.upload_timeout)
+            res.raise_for_status()
+            res = res.json()
+            self._record("upload", time.perf_counter() - t0)
+            if res.get('subid'):
+                return res['subid']
+            if 'session' not in str(res.get('errormessage', '')):
+                break
+        raise NovaError("上传失败")
+
+    async def _poll(self, fn, timeout, progress_cb, label):
+        """按 backoff_delays 调用 fn() 直到返回非 None，超时返回 None。"""
+        start = time.monotonic()
+        for delay in backoff_delays(self.poll_initial, maximum=self.poll_max):
+            elapsed = time.monotonic() - start
+            if elapsed >= timeout:
+                return None
+            await asyncio.sleep(min(delay, timeout - elapsed))
+            if progress_cb:
+                progress_cb(f"{label} ({time.monotonic() - start:.0f}s)")
+            try:
+                result = await fn()
+            except NovaError:
+                raise
+            except Exception:
+                continue
+            if result is not None:
+                return result
+
+    async def wait_job(self, sub_id, progress_cb=None):
+        """等待 submission 分配 job_id。"""
+        async def _check():
+            jobs = (await self._get_json(f'/api/submissions/{sub_id}')).get('jobs', [])
+            return jobs[0] if jobs and jobs[0] is not None else None
+
+        t0 = time.perf_counter()
+        job_id = await self._poll(_check, self.queue_timeout, progress_cb, "⏳ 等待分配任务 ...")
+        self._record("queue", time.perf_counter() - t0)
+        return job_id
+
+    async def wait_solved(self, job_id, progress_cb=None):
+        """等待 job 结束，返回 'success' / 'failure'，超时返回 None。"""
+        async def _check():
+            status = (await self._get_json(f'/api/jobs/{job_id}')).get('status', '')
+            return status if status in ('success', 'failure') else None
+
+        t0 = time.perf_counter()
+        status = await self._poll(_check, self.solve_timeout, progress_cb, "🔍 解析中 ...")
+        self._record("solve", time.perf_counter() - t0)
+        return status
+
+    async def fetch_results(self, job_id):
+        """
+        获取 calibration，返回 (calibration, objects_in_field)。视场天体用本地星表标注
+        (annotate_field)，星表不可用时才并发请求 /info/。
+        """
+        t0 = time.perf_counter()
+        objects = None
+        if self.local_annotation:
+            cal = await self._get_json(f'/api/jobs/{job_id}/calibration')
+            if cal and cal.get('ra') is not None:
+                objects = annotate_field(cal['ra'], cal['dec'], cal.get('radius'))
+            if objects is None:
+                info = await self._get_json(f'/api/jobs/{job_id}/info/')
+                objects = info.get('objects_in_field', [])
+        else:
+            cal, info = await asyncio.gather(self._get_json(f'/api/jobs/{job_id}/calibration'),
+                                             self._get_json(f'/api/jobs/{job_id}/info/'))
+            objects = info.get('objects_in_field', [])
+        self._record("fetch", time.perf_counter() - t0)
+        return cal, objects
+
+    async def solve(self, source, cache=None, progress_cb=None, hints=None, timings=None):
+        """
+        完整流程，返回 (success, ra, dec, az, alt, label)。source 为 ImageSource 或 bytes。
+        cache 为 SolveCache 时命中直接返回，subid/job_id 落盘以便中断后继续。
+        hints (见 solver.solve_hints) 转为 center_ra/center_dec/radius 与尺度参数随上传提交。
+        timings 为 dict 时写入本次调用各阶段的耗时 (秒)。
+        """
+        # 按调用 (asyncio 上下文) 记录耗时，同一客户端上的并发 solve 不会互相覆盖
+        token = _call_timings.set(timings)
+        try:
+            return await self._solve(source, cache, progress_cb, hints)
+        finally:
+            _call_timings.reset(token)
+
+    async def _solve(self, source, cache, progress_cb, hints):
+        def _report(msg):
+            if progress_cb:
+                try:
+                    progress_cb(msg)
+                except Exception:
+                    pass
+
+        key = entry = None
+        if not isinstance(source, ImageSource):
+            source = ImageSource.open(file_bytes=source)
+        if cache is not None:
+            key = await asyncio.to_thread(cache.key_for, source)
+            entry = cache.get(key)
+        entry = entry or {}
+        if entry.get("state") == "done":
+            cache.stats["hits"] += 1
+            _report("⚡ 命中解析缓存")
+            return _cached_solve_result(entry)
+        sub_id, job_id = entry.get("subid"), entry.get("job_id")
+        size = entry.get("image_size")
+        if cache is not None:
+            cache.stats["resumed" if sub_id else "misses"] += 1
+
+        try:
+            result = await self._run_job(source, cache, key, sub_id, job_id, size, hints, _report)
+        except Exception as e:
+            result = False, 0, 0, 0, 0, str(e)
+            if sub_id:
+                # 续传的任务已失效 (如 submission / job 不存在)：放弃它，重新上传一次
+                if cache is not None:
+                    cache.discard(key)
+                _report(f"♻️ 未完成的任务已失效 ({e})，重新上传 ...")
+                try:
+                    result = await self._run_job(source, cache, key, None, None, None, hints,
+                                                 _report)
+                except Exception as e:
+                    result = False, 0, 0, 0, 0, str(e)
+        if not result[0] and cache is not None:
+            # 超时或出错的 pending 条目不保留，否则这张图以后只会续传同一个失效的任务
+            cache.discard(key)
+        return result
+
+    async def _run_job(self, source, cache, key, sub_id, job_id, size, hints, report):
+        """solve 的上传 (或续传) → 轮询 → 取结果，出错时抛出。"""
+        if sub_id:
+            report(f"♻️ 继续未完成的任务 (Sub #{sub_id}) ...")
+        else:
+            t0 = time.perf_counter()
+            payload, filename, params, size = await asyncio.to_thread(
+                self.prepare_upload, source, report)
+            params.update(_hint_params(hints, params))
+            self._record("prepare", time.perf_counter() - t0)
+            self.last_upload_bytes = len(payload)
+            report(f"📤 上传{'星点表' if size else '星图'}中 ({len(payload) / 1024:.0f} KB) ...")
+            sub_id = await self.upload(payload, filename, **params)
+            if cache is not None:
+                cache.put(key, state="pending", subid=sub_id, image_size=size)
+        if not job_id:
+            job_id = await self.wait_job(sub_id, report)
+            if not job_id:
+                return False, 0, 0, 0, 0, "等待超时: 未获取任务ID"
+            if cache is not None:
+                cache.put(key, job_id=job_id)
+
+        report(f"🔍 解析中 (Job #{job_id}) ...")
+        status = await self.wait_solved(job_id, report)
+        if status is None:
+            return False, 0, 0, 0, 0, f"解析超时 (>{self.solve_timeout:.0f}s)"
+        if status == 'failure':
+            return False, 0, 0, 0, 0, "解析失败: 无法匹配星图"
+
+        report("✅ 匹配成功! 获取坐标 ...")
+        cal, objects = await self.fetch_results(job_id)
+        if not cal or cal.get('ra') is None:
+            return False, 0, 0, 0, 0, "校准数据为空"
+        if size and cal.get('pixscale'):
+            self.scale_memory[tuple(size)] = float(cal['pixscale'])
+        entry = {"calibration": cal, "objects_in_field": objects}
+        if cache is not None:
+            cache.put(key, state="done", **entry)
+        return _cached_solve_result(entry)
+
+
+class FakeNovaServer:
+    """
+    本地模拟 nova API 的 HTTP 服务 (login / upload / submissions / jobs / calibration / info)，
+    供开发与测试使用，不需要 API Key 与外网。
+
+    queue_delay / solve_delay 为上传到分配 job、job 到完成的秒数，latency 为每个请求附加的延迟，
+    fail=True 时 job 返回 failure；session_ttl 到期后上传返回 "no session"。
+    """
+
+    def __init__(self, ra=83.82, dec=-5.39, objects=("M 42", "Orion Nebula"),
+                 queue_delay=1.0, solve_delay=2.0, latency=0.0, fail=False,
+                 session_ttl=None):
+        self.ra, self.dec = ra, dec
+        self.objects = list(objects)
+        self.queue_delay = queue_delay
+        self.solve_delay = solve_delay
+        self.latency = latency
+        self.fail = fail
+        self.session_ttl = session_ttl
+        self.counts = {}
+        self.uploads = []
+        self._sessions = {}
+        self._subs = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host='127.0.0.1', port=0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, obj):
+                body = json.dumps(obj).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._reply(fake.handle("POST", self.path, body))
+
+            def do_GET(self):
+                self._reply(fake.handle("GET", self.path, b""))
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @staticmethod
+    def _request_json(body):
+        # 登录为 urlencoded，上传为 multipart；两者都只需要 request-json 字段
+        import re
+        from urllib.parse import parse_qs
+        text = body.decode('utf-8', 'replace')
+        m = re.search(r'name="request-json"\r\n\r\n(.*?)\r\n--', text, re.S)
+        raw = m.group(1) if m else parse_qs(text).get('request-json', ['{}'])[0]
+        return json.loads(raw)
+
+    def handle(self, method, path, body):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = path.strip('/').split('/')[1:]  # 去掉 'api'
+        name = parts[0] if parts else ''
+        if name == 'jobs' and len(parts) > 2:
+            name = parts[2] or 'info'
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+        now = time.monotonic()
+        if name == 'login':
+            session = f"s{len(self._sessions) + 1}"
+            self._sessions[session] = now
+            return {"status": "success", "session": session}
+        if name == 'upload':
+            req = self._request_json(body)
+            started = self._sessions.get(req.get('session'))
+            if started is None or (self.session_ttl and now - started > self.session_ttl):
+                return {"status": "error", "errormessage": "no session with key"}
+            with self._lock:
+                sub_id = len(self._subs) + 1
+                self._subs[sub_id] = now
+                self.uploads.append(len(body))
+            return {"status": "success", "subid": sub_id}
+        if name == 'submissions':
+            t = self._subs.get(int(parts[1]))
+            ready = t is not None and now - t >= self.queue_delay
+            return {"jobs": [int(parts[1]) if ready else None]}
+        job_t = self._subs.get(int(parts[1]), now) + self.queue_delay
+        if name == 'jobs':
+            done = now - job_t >= self.solve_delay
+            return {"status": ("failure" if self.fail else "success") if done else "solving"}
+        if name == 'calibration':
+            return {"ra": self.ra, "dec": self.dec, "radius": 5.0,
+                    "pixscale": 60.0, "orientation": 0.0, "parity": 1.0}
+        return {"objects_in_field": self.objects, "status": "success"}
+
+
+_nova_lock = threading.Lock()
+_nova_loop = None
+_nova_client = None
+
+
+def get_nova_client():
+    """
+    共享的 NovaClient 及其后台事件循环 (与 MountLink 同样的模式)，
+    线程池中的同步调用通过 run_coroutine_threadsafe 投递，连接池与 session 跨调用复用。
+    """
+    global _nova_loop, _nova_client
+    with _nova_lock:
+        if _nova_loop is None:
+            _nova_loop = asyncio.new_event_loop()
+            threading.Thread(target=_nova_loop.run_forever, daemon=True).start()
+            _nova_client = NovaClient()
+            metrics.register_collector("nova_phase", _nova_client.timings_snapshot)
+        return _nova_client, _nova_loop
+
+
+def solve_star_image_nova(file_path=None, file_bytes=None, progress_cb=None,
+                          cache=None, hints=None):
+    """
+    Astrometry.net 云端识别。支持 file_path 或 file_bytes（Android 可能只有 bytes）。
+    progress_cb(msg) 可选回调，用于更新 UI 进度。
+    cache 缺省为 SOLVE_CACHE：相同图片直接返回缓存结果，未完成的任务从 subid/job_id 继续轮询。
+    hints 可选的位置/尺度提示，缩小服务端搜索范围。
+    """
+    try:
+        source = ImageSource.open(file_path, file_bytes)
+    except FileNotFoundError as e:
+        return False, 0, 0, 0, 0, str(e)
+
+    client, loop = get_nova_client()
+    with source:
+        future = asyncio.run_coroutine_threadsafe(
+            client.solve(source, cache or SOLVE_CACHE, progress_cb, hints), loop)
+        return future.result()
@@ -0,0 +1,360 @@
+"""
+离线星图解析 (四星组几何哈希) 与解析后端分发。
+"""
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from . import metrics
+from .astro import _radec_to_unit, _unit_to_radec, get_az_alt
+from .catalog import CATALOG_DIR, annotate_field
+from .imaging import ImageSource, extract_stars, load_image_gray
+from .local_solver import solve_star_image_local
+from .nova import solve_star_image_nova
+
+
+# nova | offline | local，或用逗号给出回退顺序，如 "local,nova"
+SOLVER_BACKEND = os.getenv("STARLINK_SOLVER", "nova")
+SOLVE_HINT_RADIUS = 10.0   # 位置提示的搜索半径 (度)：指向误差 + 相机与镜筒的偏差
+
+# 四星组 (quad) 几何哈希：每维分箱宽度与取值范围，键 = 4 维箱号拼成的 u32
+QUAD_BIN = 0.025
+QUAD_MIN = -0.25
+QUAD_NBINS = 64
+QUAD_CODE_TOL = 0.02
+_QUAD_PAIRS = np.array([(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)])
+_QUAD_OTHERS = np.array([(2, 3), (1, 3), (1, 2), (0, 3), (0, 2), (0, 1)])
+
+
+def quad_codes(points):
+    """
+    计算四星组的几何哈希码，points 为 (M, 4) 复数坐标。
+
+    距离最远的一对记为 A、B，把 A 映射到 (0,0)、B 映射到 (1,1)，C、D 在该坐标系下的
+    (xc, yc, xd, yd) 即为平移/旋转/缩放不变的码。规范化：xc + xd <= 1 (否则交换 A、B)，
+    xc <= xd (否则交换 C、D)。返回 (codes (M, 4), 规范顺序下的点下标 (M, 4))。
+    """
+    P = np.asarray(points, dtype=complex)
+    m = np.arange(P.shape[0])
+    dist = np.abs(P[:, _QUAD_PAIRS[:, 0]] - P[:, _QUAD_PAIRS[:, 1]])
+    k = np.argmax(dist, axis=1)
+    order = np.concatenate([_QUAD_PAIRS[k], _QUAD_OTHERS[k]], axis=1)
+    a, b = P[m, order[:, 0]], P[m, order[:, 1]]
+    zc = (P[m, order[:, 2]] - a) / (b - a) * (1 + 1j)
+    zd = (P[m, order[:, 3]] - a) / (b - a) * (1 + 1j)
+    flip = zc.real + zd.real > 1
+    zc = np.where(flip, (1 + 1j) - zc, zc)
+    zd = np.where(flip, (1 + 1j) - zd, zd)
+    order[flip, 0], order[flip, 1] = order[flip, 1], order[flip, 0].copy()
+    swap = zc.real > zd.real
+    zc, zd = np.where(swap, zd, zc), np.where(swap, zc, zd)
+    order[swap, 2], order[swap, 3] = order[swap, 3], order[swap, 2].copy()
+    codes = np.stack([zc.real, zc.imag, zd.real, zd.imag], axis=1)
+    return codes, order
+
+
+def _code_bins(codes):
+    return np.clip(((codes - QUAD_MIN) / QUAD_BIN).astype(np.int64), 0, QUAD_NBINS - 1)
+
+
+def _bins_to_key(q):
+    return ((q[..., 0] * QUAD_NBINS + q[..., 1]) * QUAD_NBINS + q[..., 2]) * QUAD_NBINS + q[..., 3]
+
+
+def quad_hash_keys(codes):
+    return _bins_to_key(_code_bins(codes))
+
+
+def gnomonic(ra0, dec0, ra, dec):
+    """以 (ra0, dec0) 为切点的心射投影 (度 → 弧度)，返回复数 xi + i*eta (xi 指向东)。"""
+    ra0, dec0 = math.radians(ra0), math.radians(dec0)
+    ra, dec = np.radians(ra), np.radians(dec)
+    cos_c = (math.sin(dec0) * np.sin(dec) +
+             math.cos(dec0) * np.cos(dec) * np.cos(ra - ra0))
+    xi = np.cos(dec) * np.sin(ra - ra0) / cos_c
+    eta = (math.cos(dec0) * np.sin(dec) -
+           math.sin(dec0) * np.cos(dec) * np.cos(ra - ra0)) / cos_c
+    return xi + 1j * eta
+
+
+def inverse_gnomonic(ra0, dec0, w):
+    """gnomonic 的逆变换：复数切平面坐标 → (ra, dec) (度)。"""
+    ra0, dec0 = math.radians(ra0), math.radians(dec0)
+    xi, eta = np.real(w), np.imag(w)
+    rho = np.hypot(xi, eta)
+    c = np.arctan(rho)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dec = np.where(rho > 0, np.arcsin(np.cos(c) * math.sin(dec0) +
+                                          eta * np.sin(c) * math.cos(dec0) / rho), dec0)
+    ra = ra0 + np.arctan2(xi * np.sin(c),
+                          rho * math.cos(dec0) * np.cos(c) - eta * math.sin(dec0) * np.sin(c))
+    return np.degrees(ra) % 360.0, np.degrees(dec)
+
+
+class StarIndex:
+    """
+    离线解析用的亮星表 + 四星组几何哈希索引，均为内存映射的 .npy 文件，加载几乎不耗时。
+
+    stars.npy: 结构化数组 (hip, ra, dec, mag)，J2000，按星等升序
+    quads.npy: 结构化数组 (key, code[4], stars[4])，按 key 升序，stars 为 stars.npy 下标
+    star_names.json: {hip: 专名}
+    """
+
+    def __init__(self, directory=CATALOG_DIR):
+        self.stars = np.load(os.path.join(directory, "stars.npy"), mmap_mode='r')
+        self.quads = np.load(os.path.join(directory, "quads.npy"), mmap_mode='r')
+        self.keys = self.quads['key']
+        self.unit = _radec_to_unit(self.stars['ra'], self.stars['dec'])
+        names_path = os.path.join(directory, "star_names.json")
+        self.names = {}
+        if os.path.exists(names_path):
+            with open(names_path, 'r', encoding='utf-8') as f:
+                self.names = {int(k): v for k, v in json.load(f).items()}
+
+    def lookup(self, codes, tol=QUAD_CODE_TOL):
+        """返回 (图像四星组下标, 星表四星组下标, 码距离)，按距离升序。"""
+        q = _code_bins(codes)
+        offsets = np.stack(np.meshgrid(*[[-1, 0, 1]] * 4, indexing='ij'), -1).reshape(-1, 4)
+        nq = np.clip(q[:, None, :] + offsets[None], 0, QUAD_NBINS - 1)
+        keys = _bins_to_key(nq)
+        lo = np.searchsorted(self.keys, keys.ravel(), 'left')
+        hi = np.searchsorted(self.keys, keys.ravel(), 'right')
+        counts = hi - lo
+        img_idx = np.repeat(np.repeat(np.arange(len(codes)), offsets.shape[0]), counts)
+        starts = np.repeat(lo - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+        cat_idx = starts + np.arange(counts.sum())
+        dist = np.linalg.norm(self.quads['code'][cat_idx] - codes[img_idx], axis=1)
+        ok = dist < tol
+        order = np.argsort(dist[ok])
+        return img_idx[ok][order], cat_idx[ok][order], dist[ok][order]
+
+    def cone(self, ra, dec, radius_deg):
+        """锥形检索：返回角距小于 radius_deg 的星下标。"""
+        center = _radec_to_unit(ra, dec)
+        return np.nonzero(self.unit @ center > math.cos(math.radians(radius_deg)))[0]
+
+
+_star_index = None
+
+
+def get_star_index():
+    global _star_index
+    if _star_index is None:
+        _star_index = StarIndex()
+    return _star_index
+
+
+def _fit_similarity(z, w):
+    """最小二乘相似变换 w ≈ s*z + t (复数)，返回 (s, t)。"""
+    zm, wm = z.mean(), w.mean()
+    dz = z - zm
+    s = np.sum(np.conj(dz) * (w - wm)) / np.sum(np.abs(dz) ** 2)
+    return s, wm - s * zm
+
+
+def _match_field(index, z_img, s, t, ra0, dec0, width, height, tol_px):
+    """把视场内星表星投影回像素，返回 (匹配的图像下标, 星表下标, 像素残差)。"""
+    half_diag = 0.5 * math.hypot(width, height)
+    radius = math.degrees(math.atan(abs(s) * half_diag)) * 1.05
+    cand = index.cone(ra0, dec0, min(radius, 80.0))
+    if cand.size == 0:
+        return np.empty(0, int), np.empty(0, int), np.empty(0)
+    w = gnomonic(ra0, dec0, index.stars['ra'][cand], index.stars['dec'][cand])
+    zc = (w - t) / s
+    inside = ((zc.real > -tol_px) & (zc.real < width + tol_px) &
+              (zc.imag > -tol_px) & (zc.imag < height + tol_px))
+    cand, zc = cand[inside], zc[inside]
+    if cand.size == 0:
+        return np.empty(0, int), np.empty(0, int), np.empty(0)
+    d = np.abs(z_img[:, None] - zc[None, :])
+    nearest = np.argmin(d, axis=1)
+    dmin = d[np.arange(len(z_img)), nearest]
+    ok = dmin < tol_px
+    return np.nonzero(ok)[0], cand[nearest[ok]], dmin[ok]
+
+
+def _quads_from_stars(z, n_pair=16, n_inner=5):
+    """图像四星组：最亮 n_pair 颗中的每一对作 A、B，AB 为直径的圆内最亮的 n_inner 颗两两取 C、D。"""
+    n = min(len(z), n_pair)
+    quads = []
+    for i in range(n):
+        for j in range(i + 1, n):
+            mid, r = (z[i] + z[j]) / 2, abs(z[i] - z[j]) / 2
+            inner = [k for k in range(len(z)) if k != i and k != j and abs(z[k] - mid) < r]
+            inner = inner[:n_inner]
+            for a in range(len(inner)):
+                for b in range(a + 1, len(inner)):
+                    quads.append((i, j, inner[a], inner[b]))
+    return np.array(quads, dtype=int).reshape(-1, 4)
+
+
+def solve_offline(x, y, width, height, index=None, max_hypotheses=400,
+                  min_matches=6, timeout=20.0):
+    """
+    用星点坐标离线解析。返回 dict (ra, dec, rotation, pixscale, width_deg, height_deg,
+    matches, parity, stars) 或 None。rotation 为图像"上"方向相对北向东的位置角。
+    """
+    index = index or get_star_index()
+    t_start = time.monotonic()
+    z_all = np.asarray(x, dtype=float) + 1j * np.asarray(y, dtype=float)
+    diag = math.hypot(width, height)
+    for parity in (1, -1):
+        # parity = -1 时上下镜像 (FITS 自下而上存储、天顶镜等)
+        z = z_all if parity == 1 else z_all.real + 1j * (height - z_all.imag)
+        quads = _quads_from_stars(z)
+        if len(quads) == 0:
+            return None
+        codes, order = quad_codes(z[quads])
+        img_quads = np.take_along_axis(quads, order, axis=1)
+        img_i, cat_i, _ = index.lookup(codes)
+        for h in range(min(len(img_i), max_hypotheses)):
+            if time.monotonic() - t_start > timeout:
+                return None
+            zi = z[img_quads[img_i[h]]]
+            stars = index.quads['stars'][cat_i[h]]
+            ra_q, dec_q = index.stars['ra'][stars], index.stars['dec'][stars]
+            center = _radec_to_unit(ra_q, dec_q).sum(axis=0)
+            ra0, dec0 = _unit_to_radec(*center)
+            ra0, dec0 = float(ra0), float(dec0)
+            s, t = _fit_similarity(zi, gnomonic(ra0, dec0, ra_q, dec_q))
+            fov = math.degrees(math.atan(abs(s) * diag / 2)) * 2
+            if not 0.5 < fov < 150:
+                continue
+            tol = 0.02 * diag
+            for _ in range(3):
+                mi, mc, _ = _match_field(index, z, s, t, ra0, dec0, width, height, tol)
+                if len(mi) < min_matches:
+                    break
+                # 以图像中心重新取切点，用全部匹配星重拟合
+                ra0, dec0 = inverse_gnomonic(ra0, dec0, s * complex(width / 2, height / 2) + t)
+                ra0, dec0 = float(ra0), float(dec0)
+                s, t = _fit_similarity(z[mi], gnomonic(ra0, dec0, index.stars['ra'][mc],
+                                                       index.stars['dec'][mc]))
+                tol = max(0.006 * diag, 2.0)
+            else:
+                if len(mi) >= max(min_matches, 0.4 * min(len(z), 40)):
+                    up = s * (-1j) * (1 if parity == 1 else -1)
+                    return {
+                        "ra": ra0, "dec": dec0,
+                        "rotation": math.degrees(math.atan2(up.real, up.imag)) % 360.0,
+                        "pixscale": math.degrees(abs(s)) * 3600,
+                        "width_deg": math.degrees(abs(s)) * width,
+                        "height_deg": math.degrees(abs(s)) * height,
+                        "matches": len(mi), "parity": parity,
+                        "stars": mc,
+                    }
+    return None
+
+
+def solve_star_image_offline(file_path=None, file_bytes=None, progress_cb=None, hints=None):
+    """离线盲解 (不使用 hints)，返回值与 solve_star_image 相同: (success, ra, dec, az, alt, label)。"""
+    def _report(msg):
+        if progress_cb:
+            try:
+                progress_cb(msg)
+            except Exception:
+                pass
+
+    try:
+        source = ImageSource.open(file_path, file_bytes)
+    except FileNotFoundError as e:
+        return False, 0, 0, 0, 0, str(e)
+    try:
+        _report("🖼 读取星图 ...")
+        with source:
+            with metrics.timer("solve_phase_seconds", backend="offline", phase="load"):
+                img = load_image_gray(source)
+            _report("✴️ 提取星点 ...")
+            with metrics.timer("solve_phase_seconds", backend="offline", phase="extract"):
+                x, y, _ = extract_stars(img, release=source.release)
+            height, width = img.shape[:2]
+            del img
+        if len(x) < 6:
+            return False, 0, 0, 0, 0, f"星点过少 ({len(x)})，无法离线解析"
+        _report(f"🔍 离线匹配 {len(x)} 颗星 ...")
+        index = get_star_index()
+        with metrics.timer("solve_phase_seconds", backend="offline", phase="match"):
+            result = solve_offline(x, y, width, height, index)
+        if result is None:
+            return False, 0, 0, 0, 0, "解析失败: 无法匹配星图 (离线)"
+        ra, dec = result["ra"], result["dec"]
+        az, alt = get_az_alt(ra, dec)
+        names = annotate_field(ra, dec, math.hypot(result["width_deg"], result["height_deg"]) / 2)
+        if names is None:
+            stars = sorted(set(int(i) for i in result["stars"]),
+                           key=lambda i: index.stars['mag'][i])
+            names = [index.names[int(index.stars['hip'][i])] for i in stars
+                     if int(index.stars['hip'][i]) in index.names]
+        label = ", ".join(names[:3]) if names else "Star Field"
+        return True, ra, dec, az, alt, f"{label} (rot {result['rotation']:.1f}°)"
+    except Exception as e:
+        return False, 0, 0, 0, 0, str(e)
+
+
+SOLVER_BACKENDS = {
+    "nova": solve_star_image_nova,
+    "offline": solve_star_image_offline,
+    "local": solve_star_image_local,
+}
+
+
+def register_backend(name, fn):
+    """
+    注册解析后端。fn(file_path, file_bytes, progress_cb, hints) 返回
+    (success, ra, dec, az, alt, label)，之后可在 STARLINK_SOLVER 或 backend 参数中按名字使用。
+    """
+    SOLVER_BACKENDS[name] = fn
+
+
+def backend_chain(backend=None):
+    """'local,nova' → ['local', 'nova']；未知名字抛 ValueError。"""
+    names = [n.strip() for n in (backend or SOLVER_BACKEND).split(",") if n.strip()]
+    unknown = [n for n in names if n not in SOLVER_BACKENDS]
+    if unknown or not names:
+        raise ValueError(f"未知解析后端: {', '.join(unknown) or backend}")
+    return names
+
+
+def solve_hints(ra=None, dec=None, radius=SOLVE_HINT_RADIUS, scale=None):
+    """位置/尺度提示：通常取自当前的 GOTO 目标，ra/dec 缺省时只给尺度。"""
+    hints = {}
+    if ra is not None and dec is not None:
+        hints.update(ra=float(ra) % 360.0, dec=float(dec), radius=radius)
+    if scale:
+        hints["scale"] = float(scale)
+    return hints
+
+
+def solve_star_image(file_path=None, file_bytes=None, progress_cb=None, backend=None,
+                     hints=None):
+    """
+    识别星图。backend 为 'nova' (Astrometry.net 云端)、'offline' (本地亮星表)、
+    'local' (solve-field / ASTAP 子进程) 或用逗号分隔的回退链 (如 'local,nova')，
+    缺省取环境变量 STARLINK_SOLVER；前一个后端失败或超时时依次改用下一个。
+    hints 见 solve_hints。返回 (success, ra, dec, az, alt, label)。
+    """
+    try:
+        names = backend_chain(backend)
+    except ValueError as e:
+        return False, 0, 0, 0, 0, str(e)
+    result = None
+    for i, name in enumerate(names):
+        if i and progress_cb:
+            try:
+                progress_cb(f"↪️ {names[i - 1]} 未成功 ({result[5]})，改用 {name} ...")
+            except Exception:
+                pass
+        try:
+            with metrics.timer("solve_seconds", backend=name):
+                result = SOLVER_BACKENDS[name](file_path=file_path, file_bytes=file_bytes,
+                                               progress_cb=progress_cb, hints=hints)
+        except Exception as e:
+            # 任何后端异常都只算这一环失败，继续尝试回退链中的下一个
+            result = (False, 0, 0, 0, 0, f"{name} 出错: {e}")
+        if result[0]:
+            break
+        metrics.inc("solve_failures", backend=name)
+    return result
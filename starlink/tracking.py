@@ -0,0 +1,607 @@
+"""
+持续追踪引擎与观测计划调度。
+"""
+import math
+import threading
+import time
+
+import numpy as np
+
+from . import metrics
+from .astro import (EPHEMERIS_CACHE, ObserverFrame, VisibilityTargets, _radec_to_unit,
+                    get_az_alt, visibility_windows)
+from .transport import (MAX_WAYPOINTS, TRAJ_AZALT, TRAJ_RADEC, Trajectory,
+                        send_trajectory_command, send_udp_command)
+
+
+class TrackingStats:
+    """调度统计：抖动 (实际唤醒 - 截止时间) 与错过的周期数。"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.ticks = 0
+        self.missed = 0
+        self.send_failures = 0
+        self.segments = 0
+        self.jitter_sum = 0.0
+        self.jitter_sq_sum = 0.0
+        self.jitter_max = 0.0
+        self.last_error = ""
+
+    def record(self, jitter):
+        self.ticks += 1
+        self.jitter_sum += jitter
+        self.jitter_sq_sum += jitter * jitter
+        if jitter > self.jitter_max:
+            self.jitter_max = jitter
+
+    def snapshot(self):
+        n = max(self.ticks, 1)
+        return {
+            "ticks": self.ticks,
+            "missed": self.missed,
+            "send_failures": self.send_failures,
+            "segments": self.segments,
+            "jitter_mean_ms": self.jitter_sum / n * 1000,
+            "jitter_rms_ms": math.sqrt(self.jitter_sq_sum / n) * 1000,
+            "jitter_max_ms": self.jitter_max * 1000,
+            "last_error": self.last_error,
+        }
+
+
+class TrackingEngine:
+    """
+    闭环持续追踪：后台线程按固定频率 (1~50 Hz) 重新计算目标坐标并推送给赤道仪。
+
+    截止时间按 start + k * period 计算 (time.monotonic)，不会因每次处理耗时而累积漂移；
+    落后超过一个周期时直接跳到下一个周期并计入 missed。
+    target 可以是天体名 ('Moon')、固定坐标 (ra, dec)，
+    或 {设备: 目标} 字典 (多台赤道仪各追各的目标，send_fn 的第一个参数为设备)。
+    on_update(ra, dec, az, alt, ok, msg) 在追踪线程中回调，UI 端需自行节流。
+
+    mode='trajectory' 时不再逐点发送：每次上传未来 horizon 秒、间隔 step 秒的航点
+    (Trajectory)，由下位机本地插值；当前段剩余不足 lead 秒或换目标时才重新上传。
+    """
+    MIN_RATE = 1.0
+    MAX_RATE = 50.0
+    MODES = ('stream', 'trajectory')
+
+    def __init__(self, ip=None, rate_hz=5.0, send_fn=None, on_update=None,
+                 cache=None, mode='stream', horizon=30.0, step=1.0, lead=10.0,
+                 trajectory_fn=None, trajectory_kind=TRAJ_RADEC):
+        self.ip = ip
+        self.rate_hz = self._clamp_rate(rate_hz)
+        self.on_update = on_update
+        self.stats = TrackingStats()
+        self._metrics = None
+        self.horizon = float(horizon)
+        self.step = float(step)
+        self.lead = float(lead)
+        self.trajectory_kind = trajectory_kind
+        if mode not in self.MODES:
+            raise ValueError(f"未知追踪模式: {mode}")
+        self.mode = mode
+        self._send = send_fn or send_udp_command
+        self._send_trajectory = trajectory_fn or send_trajectory_command
+        self._cache = cache or EPHEMERIS_CACHE
+        self._target = None
+        self._generation = 0
+        self._segments = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reschedule = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def _clamp_rate(cls, rate_hz):
+        return min(max(float(rate_hz), cls.MIN_RATE), cls.MAX_RATE)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def target(self):
+        with self._lock:
+            return self._target
+
+    def set_rate(self, rate_hz):
+        self.rate_hz = self._clamp_rate(rate_hz)
+        self._reschedule.set()
+
+    def set_mode(self, mode):
+        if mode not in self.MODES:
+            raise ValueError(f"未知追踪模式: {mode}")
+        self.mode = mode
+        self._segments = {}
+        self._reschedule.set()
+
+    def retarget(self, target):
+        with self._lock:
+            self._target = target
+            self._generation += 1
+        # 新目标立即发送，不等下一个周期
+        self._reschedule.set()
+
+    def start(self, target=None):
+        if target is not None:
+            self.retarget(target)
+        if self.running:
+            return
+        self._stop.clear()
+        self.stats.reset()
+        if self._metrics is None:
+            self._metrics = metrics.register_collector("tracking", self.stats.snapshot,
+                                                       engine=f"{id(self):x}")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self._reschedule.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+        if self._metrics is not None:
+            metrics.unregister_collector(self._metrics)
+            self._metrics = None
+
+    def _compute(self, target, frame):
+        if isinstance(target, str):
+            return self._cache.star_coords(target, frame)
+        ra, dec = float(target[0]), float(target[1])
+        az, alt = get_az_alt(ra, dec, frame)
+        return ra, dec, az, alt
+
+    def build_trajectory(self, target, t0):
+        """从 t0 起未来 horizon 秒的航点 (最多 MAX_WAYPOINTS 个)，一次批量历表计算。"""
+        n = min(int(self.horizon / self.step) + 1, MAX_WAYPOINTS)
+        offsets = np.arange(n) * self.step
+        ts = t0 + offsets
+        if isinstance(target, str):
+            ra, dec = self._cache.radec_batch(target, ts)
+        else:
+            ra = np.full(n, float(target[0]))
+            dec = np.full(n, float(target[1]))
+        if self.trajectory_kind == TRAJ_AZALT:
+            az, alt = ObserverFrame(ts).az_alt(ra, dec)
+            return Trajectory(t0, offsets, az, alt, TRAJ_AZALT)
+        return Trajectory(t0, offsets, ra, dec, TRAJ_RADEC)
+
+    def _dispatch(self, device, target, frame, generation):
+        ra, dec, az, alt = self._compute(target, frame)
+        if self.mode != 'trajectory':
+            ok, msg = self._send(device, ra, dec)
+            return ra, dec, az, alt, ok, msg
+        now = float(frame.timestamp)
+        segment = self._segments.get(device)
+        if (segment is not None and segment[0] == generation
+                and now < segment[1] - self.lead):
+            return ra, dec, az, alt, True, "Trajectory: on segment"
+        trajectory = self.build_trajectory(target, now)
+        ok, msg = self._send_trajectory(device, trajectory)
+        if ok:
+            self._segments[device] = (generation, trajectory.t_end)
+            self.stats.segments += 1
+        return ra, dec, az, alt, ok, msg
+
+    @metrics.timed("tracking_tick_seconds")
+    def _tick(self):
+        with self._lock:
+            target, generation = self._target, self._generation
+        if target is None:
+            return
+        try:
+            frame = ObserverFrame()
+            if isinstance(target, dict):
+                # 每台设备各自的目标 {device: target}，共享同一帧
+                ok, msg = True, ""
+                for device, sub_target in target.items():
+                    ra, dec, az, alt, sent, sent_msg = self._dispatch(
+                        device, sub_target, frame, generation)
+                    if not sent:
+                        ok, msg = False, sent_msg
+                msg = msg or f"Success x{len(target)}"
+            else:
+                ra, dec, az, alt, ok, msg = self._dispatch(
+                    self.ip, target, frame, generation)
+        except Exception as e:
+            ra = dec = az = alt = 0
+            ok, msg = False, f"Tracking Error: {e}"
+        if not ok:
+            self.stats.send_failures += 1
+            self.stats.last_error = msg
+        if self.on_update:
+            try:
+                self.on_update(ra, dec, az, alt, ok, msg)
+            except Exception:
+                pass
+
+    def _run(self):
+        period = 1.0 / self.rate_hz
+        start = time.monotonic()
+        k = 0
+        while not self._stop.is_set():
+            if self._reschedule.is_set():
+                self._reschedule.clear()
+                period = 1.0 / self.rate_hz
+                start = time.monotonic()
+                k = 0
+            deadline = start + k * period
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                # 等待期间 retarget/set_rate 会打断等待并重新对齐
+                self._reschedule.wait(delay)
+                if self._stop.is_set():
+                    break
+                if self._reschedule.is_set():
+                    continue
+            late = time.monotonic() - deadline
+            if late >= period:
+                skipped = int(late // period)
+                self.stats.missed += skipped
+                k += skipped
+                late -= skipped * period
+            self.stats.record(late)
+            self._tick()
+            k += 1
+
+
+# ---- 观测计划调度 (Session Scheduler) ----
+SLEW_RATE_DEG_S = 3.0   # 赤道仪 GOTO 速度 (度 / 秒)
+SLEW_SETTLE_S = 5.0     # 每次转动后的稳定时间 (秒)
+TWILIGHT_ALT = -12.0    # 航海暮光：太阳低于此高度视为天黑
+
+
+class SessionTarget:
+    """一个观测目标：target 为天体名或 (ra, dec)，min_alt 为最低高度 (度)，dwell 为停留时长 (秒)。"""
+
+    def __init__(self, name, target, min_alt=30.0, dwell=600.0):
+        self.name = name
+        self.target = target
+        self.min_alt = float(min_alt)
+        self.dwell = float(dwell)
+
+    def to_dict(self):
+        return {"name": self.name, "target": self.target,
+                "min_alt": self.min_alt, "dwell": self.dwell}
+
+
+class SessionPlan:
+    """plan() 的结果：entries 按执行顺序排列，skipped 为无法排入可见窗口的目标名。"""
+
+    def __init__(self, t_start, t_end, entries, skipped, seed_slew, elapsed, moves):
+        self.t_start = t_start
+        self.t_end = t_end
+        self.entries = entries
+        self.skipped = skipped
+        self.seed_slew = seed_slew
+        self.total_slew = sum(e["slew_seconds"] for e in entries)
+        self.elapsed = elapsed
+        self.moves = moves
+
+    def __len__(self):
+        return len(self.entries)
+
+    def summary(self):
+        saved = self.seed_slew - self.total_slew
+        return (f"{len(self.entries)} targets, slew {self.total_slew / 60:.1f} min "
+                f"(-{saved / 60:.1f} min vs greedy), {len(self.skipped)} skipped, "
+                f"planned in {self.elapsed * 1000:.0f} ms")
+
+
+def night_window(t=None, twilight=TWILIGHT_ALT, lat=None, lon=None):
+    """从 t 起的下一个夜晚 (太阳低于 twilight)：(开始, 结束)。极昼时返回 None。"""
+    t = time.time() if t is None else float(t)
+    t_max = t + 86400.0
+    sun_up = visibility_windows(["Sun"], t, t_max, alt_limit=twilight, lat=lat, lon=lon)[0]
+    start = t
+    for o, c in sun_up:
+        if o <= start < c:
+            start = c
+        elif o > start:
+            return start, o
+    return (start, t_max) if start < t_max else None
+
+
+class SessionScheduler:
+    """
+    观测计划：在可见窗口 (高度 ≥ min_alt) 约束下排列目标顺序，使赤道仪总转动时间最短。
+
+    两两转动时间矩阵一次算好 (单位向量点积)，路径末尾接一个到所有点距离为 0 的哑节点，
+    开放路径就变成固定两端的闭合路径。先按 "转动 + 等待" 最近邻贪心得到初始解并插回遗漏目标，
+    再用 2-opt (翻转一段) 与 or-opt (挪动 1~3 个连续目标) 改进：每轮用矩阵运算一次算出全部候选
+    的增益，按增益从大到小模拟时间线，接受第一个仍满足可见窗口的移动。
+    """
+
+    def __init__(self, targets, t_start, t_end, start=None, slew_rate=SLEW_RATE_DEG_S,
+                 settle=SLEW_SETTLE_S, lat=None, lon=None):
+        self.targets = list(targets)
+        self.t_start, self.t_end = float(t_start), float(t_end)
+        n = len(self.targets)
+        self.n = n
+        self.depot, self.end = n, n + 1
+        coords = [t.target for t in self.targets]
+        self.windows = visibility_windows(coords, t_start, t_end,
+                                          [t.min_alt for t in self.targets], lat, lon)
+        self.dwell = np.array([t.dwell for t in self.targets], dtype=float)
+
+        # 转动时间矩阵 (秒)，坐标取时段中点
+        vt = VisibilityTargets(coords)
+        ra, dec = vt.radec(np.arange(n), np.full(n, (self.t_start + self.t_end) / 2))
+        units = _radec_to_unit(ra, dec)
+        if start is not None:
+            units = np.vstack([units, _radec_to_unit(*start)])
+        sep = np.degrees(np.arccos(np.clip(units @ units.T, -1.0, 1.0)))
+        slew = sep / slew_rate + np.where(sep > 1e-6, settle, 0.0)
+        self.cost = np.zeros((n + 2, n + 2))
+        self.cost[:len(units), :len(units)] = slew
+        self._cost_rows = self.cost.tolist()  # 逐步模拟时用纯 Python 索引更快
+        self._dwell = self.dwell.tolist()
+
+        # 最近邻时向量化求最早开始时刻用的定长窗口表
+        width = max([len(w) for w in self.windows] + [1])
+        self._open = np.full((n, width), np.inf)
+        self._close = np.full((n, width), -np.inf)
+        for k, spans in enumerate(self.windows):
+            for j, (o, c) in enumerate(spans):
+                self._open[k, j], self._close[k, j] = o, c
+
+    def slew_cost(self, order):
+        route = [self.depot] + list(order)
+        return float(self.cost[route[:-1], route[1:]].sum()) if order else 0.0
+
+    def simulate(self, order):
+        """按顺序推进时间线，返回每个目标的开始时刻；任一目标赶不上可见窗口时返回 None。"""
+        t, prev, starts = self.t_start, self.depot, []
+        for k in order:
+            arrive = t + self._cost_rows[prev][k]
+            dwell = self._dwell[k]
+            for o, c in self.windows[k]:
+                s = arrive if arrive > o else o
+                if s + dwell <= c:
+                    break
+            else:
+                return None
+            starts.append(s)
+            t, prev = s + dwell, k
+        return starts
+
+    def _earliest(self, ks, arrive):
+        s = np.maximum(arrive[:, None], self._open[ks])
+        ok = s + self.dwell[ks, None] <= self._close[ks]
+        return np.where(ok, s, np.inf).min(axis=1)
+
+    def seed(self):
+        """最近邻贪心：每步选 "转动 + 等待" 最短、仍能在窗口内完成的目标。"""
+        remaining = np.array([k for k in range(self.n) if self.windows[k]], dtype=int)
+        order, t, prev = [], self.t_start, self.depot
+        while remaining.size:
+            s = self._earliest(remaining, t + self.cost[prev, remaining])
+            feasible = np.isfinite(s)
+            if not feasible.any():
+                break
+            remaining = remaining[feasible]
+            s = s[feasible]
+            best = int(np.argmin(s))
+            k = int(remaining[best])
+            order.append(k)
+            t, prev = s[best] + self.dwell[k], k
+            remaining = np.delete(remaining, best)
+        return order
+
+    def insert_skipped(self, order):
+        """把贪心阶段漏掉的目标按最小转动增量插回 (仍需满足可见窗口)。"""
+        placed = set(order)
+        for k in range(self.n):
+            if k in placed or not self.windows[k]:
+                continue
+            route = np.array([self.depot] + order + [self.end])
+            a, b = route[:-1], route[1:]
+            delta = self.cost[a, k] + self.cost[k, b] - self.cost[a, b]
+            for pos in np.argsort(delta, kind='stable'):
+                candidate = order[:pos] + [k] + order[pos:]
+                if self.simulate(candidate) is not None:
+                    order = candidate
+                    break
+        return order
+
+    def _two_opt(self, route):
+        """翻转 route[i..j] 的增益矩阵 (负值为改进)。"""
+        m = len(route) - 2
+        i = np.arange(1, m + 1)
+        prev, first = route[i - 1], route[i]
+        last, nxt = route[i], route[i + 1]
+        delta = (self.cost[prev[:, None], last[None, :]] + self.cost[first[:, None], nxt[None, :]]
+                 - self.cost[prev, first][:, None] - self.cost[last, nxt][None, :])
+        delta[np.tril_indices(m)] = np.inf
+        return delta
+
+    def _or_opt(self, route, length):
+        """把 route[i..i+length-1] 挪到边 (route[j], route[j+1]) 之间的增益矩阵，及是否反向插入。"""
+        m = len(route) - 2
+        i = np.arange(1, m - length + 2)
+        p, s0, sl, q = route[i - 1], route[i], route[i + length - 1], route[i + length]
+        removed = self.cost[p, s0] + self.cost[sl, q] - self.cost[p, q]
+        j = np.arange(m + 1)
+        a, b = route[j], route[j + 1]
+        forward = self.cost[a[None, :], s0[:, None]] + self.cost[sl[:, None], b[None, :]]
+        backward = self.cost[a[None, :], sl[:, None]] + self.cost[s0[:, None], b[None, :]]
+        reverse = backward < forward
+        delta = np.minimum(forward, backward) - self.cost[a, b][None, :] - removed[:, None]
+        # 插入点不能落在这段自身或紧邻它的边上
+        jj, ii = np.meshgrid(j, i)
+        delta[(jj >= ii - 1) & (jj <= ii + length - 1)] = np.inf
+        return delta, reverse
+
+    @staticmethod
+    def _apply(order, move):
+        kind, i, j, length, reverse = move
+        route = [None] + order  # 与增益矩阵一致，下标 0 为起点
+        if kind == '2opt':
+            route[i:j + 1] = route[i:j + 1][::-1]
+        else:
+            segment = route[i:i + length]
+            if reverse:
+                segment = segment[::-1]
+            rest = route[:i] + route[i + length:]
+            pos = j + 1 if j < i else j + 1 - length
+            route = rest[:pos] + segment + rest[pos:]
+        return route[1:]
+
+    def improve(self, order, time_budget=2.0, tries=32, max_or=3):
+        """2-opt / or-opt 局部搜索，直到没有可行的改进或超出 time_budget 秒。返回 (order, 移动次数)。"""
+        deadline = time.perf_counter() + time_budget
+        moves = 0
+        while len(order) >= 2 and time.perf_counter() < deadline:
+            route = np.array([self.depot] + order + [self.end])
+            candidates = []
+
+            def collect(delta, make):
+                flat = delta.ravel()
+                k = min(tries, flat.size)
+                top = np.argpartition(flat, k - 1)[:k]
+                for idx in top[flat[top] < -1e-9]:
+                    candidates.append((float(flat[idx]), make(*np.unravel_index(idx, delta.shape))))
+
+            collect(self._two_opt(route), lambda r, c: ('2opt', r + 1, c + 1, 0, False))
+            for length in range(1, min(max_or, len(order) - 1) + 1):
+                delta, reverse = self._or_opt(route, length)
+                collect(delta, lambda r, c, L=length, rv=reverse:
+                        ('or', r + 1, c, L, bool(rv[r, c])))
+            candidates.sort(key=lambda item: item[0])
+            for _, move in candidates[:tries]:
+                candidate = self._apply(order, move)
+                if self.simulate(candidate) is not None:
+                    order = candidate
+                    moves += 1
+                    break
+            else:
+                break
+        return order, moves
+
+    def plan(self, time_budget=2.0):
+        t0 = time.perf_counter()
+        order = self.insert_skipped(self.seed())
+        seed_slew = self.slew_cost(order)
+        order, moves = self.improve(order, time_budget)
+        starts = self.simulate(order) or []
+
+        entries, t, prev = [], self.t_start, self.depot
+        if order:
+            vt = VisibilityTargets([self.targets[k].target for k in order])
+            ra, dec = vt.radec(np.arange(len(order)), np.array(starts))
+        for n, (k, s) in enumerate(zip(order, starts)):
+            slew = float(self.cost[prev, k])
+            target = self.targets[k]
+            entries.append({
+                "name": target.name,
+                "target": target.target,
+                "ra": float(ra[n]),
+                "dec": float(dec[n]),
+                "slew_start": s - slew if s - slew > t else t,
+                "start": s,
+                "end": s + target.dwell,
+                "slew_seconds": slew,
+                "wait_seconds": s - t - slew,
+            })
+            t, prev = s + target.dwell, k
+        placed = set(order)
+        skipped = [self.targets[k].name for k in range(self.n) if k not in placed]
+        return SessionPlan(self.t_start, self.t_end, entries, skipped, seed_slew,
+                           time.perf_counter() - t0, moves)
+
+
+def plan_session(targets, t_start=None, t_end=None, start=None, time_budget=2.0, **kwargs):
+    """便捷入口：时段缺省为从现在起的下一个夜晚。"""
+    if t_start is None or t_end is None:
+        night = night_window(t_start)
+        if night is None:
+            raise ValueError("未来 24 h 内没有天黑的时段")
+        t_start, t_end = night if t_end is None else (night[0], t_end)
+    return SessionScheduler(targets, t_start, t_end, start=start, **kwargs).plan(time_budget)
+
+
+class SessionRunner:
+    """
+    按计划驱动赤道仪：在每个目标的 slew_start 时刻发出 GOTO，保证 start 时已到位。
+
+    追踪引擎在运行时改为 tracker.retarget(目标)，由追踪线程持续推送；否则走 send_fn
+    (默认 send_udp_command) 发送一次。speed > 1 用于快速演练 (时间按倍数压缩)。
+    on_event(index, entry, ok, msg) 在后台线程中回调，index 为 None 表示计划结束。
+    """
+
+    def __init__(self, plan, ip=None, send_fn=None, tracker=None, on_event=None, speed=1.0):
+        self.plan = plan
+        self.ip = ip
+        self.tracker = tracker
+        self.on_event = on_event
+        self.speed = float(speed)
+        self.current = None
+        self._send = send_fn or send_udp_command
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+
+    def _goto(self, entry, now):
+        target = entry["target"]
+        if self.tracker is not None and self.tracker.running:
+            self.tracker.retarget(target)
+            return True, f"🎯 Tracking {entry['name']}"
+        if isinstance(target, str):
+            ra, dec = EPHEMERIS_CACHE.radec(target, now)
+        else:
+            ra, dec = target
+        return self._send(self.ip, ra, dec)
+
+    def _emit(self, *args):
+        if self.on_event:
+            try:
+                self.on_event(*args)
+            except Exception:
+                pass
+
+    def _run(self):
+        wall0 = time.time()
+        # 实时运行按真实时钟等到各目标的 slew_start；只有快速演练才把时钟拨到计划开始时刻
+        sim0 = self.plan.t_start if self.speed > 1.0 else wall0
+
+        def sim_now():
+            return sim0 + (time.time() - wall0) * self.speed
+
+        for index, entry in enumerate(self.plan.entries):
+            if self._stop.is_set():
+                return
+            if sim_now() >= entry["end"]:
+                continue  # 已经错过
+            delay = (entry["slew_start"] - sim_now()) / self.speed
+            if delay > 0 and self._stop.wait(delay):
+                return
+            self.current = index
+            try:
+                ok, msg = self._goto(entry, sim_now())
+            except Exception as e:
+                ok, msg = False, f"Session Error: {e}"
+            self._emit(index, entry, ok, msg)
+        self.current = None
+        self._emit(None, None, True, "Session complete")
@@ -0,0 +1,949 @@
+"""
+赤道仪通信：UDP 帧协议、ACK / 重传、轨迹上传、遥测接收、多设备编组与本地模拟赤道仪 (FakeMount)。
+"""
+import asyncio
+import ipaddress
+import json
+import math
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from . import metrics
+
+
+MOUNT_PORT = 8888
+# 默认 text (旧固件也能用)；binary / auto 需显式选择。
+# auto: 先按 text 发送，同时发一次 PING 探测，设备回 ACK 后改用 binary
+MOUNT_PROTOCOL = os.getenv("STARLINK_MOUNT_PROTOCOL", "text")  # text | binary | auto
+MOUNT_PROTOCOLS = ("text", "binary", "auto")
+
+# 二进制帧 (小端, 32 字节):
+#   magic 'SL' | version u8 | cmd u8 | seq u32 | timestamp f64 (Unix 秒) | ra f64 | dec f64
+FRAME_MAGIC = b'SL'
+FRAME_VERSION = 1
+FRAME = struct.Struct('<2sBBIddd')
+CMD_GOTO = 0x01
+CMD_PING = 0x03       # 空操作，只用于 auto 探测：设备回 ACK 即可，不改变指向
+CMD_ACK = 0x80
+CMD_TELEMETRY = 0x81  # 下位机上报: seq 为最近执行的 GOTO 序号, ra/dec 为实际指向
+FRAME_DTYPE = np.dtype([
+    ('magic', 'S2'), ('version', 'u1'), ('cmd', 'u1'), ('seq', '<u4'),
+    ('timestamp', '<f8'), ('ra', '<f8'), ('dec', '<f8'),
+])
+TELEMETRY_PORT = 8889
+
+# 轨迹帧 (cmd=0x02): 20 字节头 + N 个 20 字节航点, N <= 64 (整帧 <= 1300 字节, 不会分片)
+#   头:   magic 'SL' | version u8 | cmd u8 | seq u32 | t0 f64 (Unix 秒)
+#         | kind u8 (0=RA/Dec, 1=Az/Alt) | reserved u8 | count u16
+#   航点: dt f32 (相对 t0 的秒数) | a f64 (RA 或 Az, 度) | b f64 (Dec 或 Alt, 度)
+CMD_TRAJECTORY = 0x02
+TRAJ_RADEC = 0
+TRAJ_AZALT = 1
+TRAJ_HEADER = struct.Struct('<2sBBIdBBH')
+WAYPOINT_DTYPE = np.dtype([('dt', '<f4'), ('a', '<f8'), ('b', '<f8')])
+MAX_WAYPOINTS = 64
+
+
+def pack_frame(cmd, seq, ra=0.0, dec=0.0, timestamp=None):
+    ts = time.time() if timestamp is None else timestamp
+    return FRAME.pack(FRAME_MAGIC, FRAME_VERSION, cmd, seq & 0xFFFFFFFF,
+                      ts, ra, dec)
+
+
+def unpack_frame(data):
+    """解析二进制帧，返回 (cmd, seq, timestamp, ra, dec)；格式不符返回 None。"""
+    if len(data) < FRAME.size or data[:2] != FRAME_MAGIC:
+        return None
+    magic, version, cmd, seq, ts, ra, dec = FRAME.unpack_from(data)
+    if version != FRAME_VERSION:
+        return None
+    return cmd, seq, ts, ra, dec
+
+
+class Trajectory:
+    """一段带时间戳的航点轨迹，下位机在相邻航点之间线性插值。"""
+
+    def __init__(self, t0, offsets, a, b, kind=TRAJ_RADEC):
+        n = len(offsets)
+        if not 2 <= n <= MAX_WAYPOINTS:
+            raise ValueError(f"航点数必须在 2~{MAX_WAYPOINTS} 之间: {n}")
+        self.t0 = float(t0)
+        self.kind = kind
+        self.waypoints = np.zeros(n, dtype=WAYPOINT_DTYPE)
+        self.waypoints['dt'] = offsets
+        self.waypoints['a'] = a
+        self.waypoints['b'] = b
+
+    @property
+    def t_end(self):
+        return self.t0 + float(self.waypoints['dt'][-1])
+
+    def pack(self, seq):
+        header = TRAJ_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, CMD_TRAJECTORY,
+                                  seq & 0xFFFFFFFF, self.t0, self.kind, 0,
+                                  len(self.waypoints))
+        return header + self.waypoints.tobytes()
+
+    @classmethod
+    def unpack(cls, data):
+        """解析轨迹帧，返回 (seq, Trajectory)；格式不符返回 None。"""
+        if len(data) < TRAJ_HEADER.size or data[:2] != FRAME_MAGIC:
+            return None
+        _, version, cmd, seq, t0, kind, _, count = TRAJ_HEADER.unpack_from(data)
+        if version != FRAME_VERSION or cmd != CMD_TRAJECTORY:
+            return None
+        if len(data) < TRAJ_HEADER.size + count * WAYPOINT_DTYPE.itemsize:
+            return None
+        wp = np.frombuffer(data, dtype=WAYPOINT_DTYPE, count=count,
+                           offset=TRAJ_HEADER.size)
+        return seq, cls(t0, wp['dt'], wp['a'], wp['b'], kind)
+
+    def interpolate(self, t):
+        """t (Unix 秒, 标量或数组) 处的 (a, b)，超出范围时取端点。"""
+        wp = self.waypoints
+        a = np.unwrap(wp['a'], period=360.0)
+        dt = np.asarray(t, dtype=float) - self.t0
+        return np.interp(dt, wp['dt'], a) % 360.0, np.interp(dt, wp['dt'], wp['b'])
+
+
+def format_text_command(ra, dec):
+    """旧版固件兼容格式: "RA,DEC" (UTF-8, 4 位小数)。"""
+    return f"{ra:.4f},{dec:.4f}".encode('utf-8')
+
+
+class DeviceLinkStats:
+    """单台设备的链路统计：发送/回执/重传/丢包与往返时延 (RTT)。"""
+
+    def __init__(self):
+        self.sent = 0
+        self.acked = 0
+        self.retransmits = 0
+        self.lost = 0
+        self.superseded = 0
+        self.rtt_last = None
+        self.rtt_min = None
+        self.rtt_max = None
+        self.rtt_avg = None
+        self.last_ack_time = None
+
+    def record_rtt(self, rtt):
+        self.acked += 1
+        self.last_ack_time = time.time()
+        self.rtt_last = rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+        # 指数滑动平均，与 TCP SRTT 相同的 1/8 权重
+        self.rtt_avg = rtt if self.rtt_avg is None else self.rtt_avg + (rtt - self.rtt_avg) / 8
+
+    def snapshot(self):
+        settled = self.acked + self.lost
+        return {
+            "sent": self.sent,
+            "acked": self.acked,
+            "retransmits": self.retransmits,
+            "lost": self.lost,
+            "superseded": self.superseded,
+            "loss_rate": self.lost / settled if settled else 0.0,
+            "rtt_last_ms": None if self.rtt_last is None else self.rtt_last * 1000,
+            "rtt_avg_ms": None if self.rtt_avg is None else self.rtt_avg * 1000,
+            "rtt_min_ms": None if self.rtt_min is None else self.rtt_min * 1000,
+            "rtt_max_ms": None if self.rtt_max is None else self.rtt_max * 1000,
+        }
+
+
+class MountTransport(asyncio.DatagramProtocol):
+    """
+    长连接 UDP 传输：整个进程共用一个 datagram socket，向任意设备 sendto。
+
+    二进制帧带序号，设备可选回 ACK。只有回过 ACK 的设备才会被重传，
+    避免对不支持回执的固件刷包；被同一设备更新的目标取代的帧不再重传。
+    auto 协议的设备只发一次 PING 探测 (不重传)，收到 ACK 前按 text 发送。
+    所有方法都必须在事件循环线程中调用。
+    """
+
+    def __init__(self, ack_timeout=0.25, max_retries=2):
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.transport = None
+        self.devices = {}
+        self.on_datagram = None
+        self._seq = {}
+        self._latest = {}
+        self._pending = {}
+        self._acking = set()
+        self._protocol = {}         # auto 探测结果: 回过 ACK 的 addr -> 'binary'
+        self._probed = set()
+        self.commands = {}
+        self._latest_command = {}
+
+    async def open(self, local_addr=('0.0.0.0', 0)):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=local_addr)
+        return self
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def close(self):
+        for entry in self._pending.values():
+            entry[3].cancel()
+        self._pending.clear()
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def stats(self, addr):
+        if addr not in self.devices:
+            self.devices[addr] = DeviceLinkStats()
+            metrics.register_collector("mount_link", self.devices[addr].snapshot,
+                                       device=f"{addr[0]}:{addr[1]}")
+        return self.devices[addr]
+
+    def is_acking(self, addr):
+        return addr in self._acking
+
+    def protocol_for(self, addr, protocol):
+        """
+        实际使用的协议。auto 首次调用时向设备发一次 PING (不重传、不等待)，
+        收到 ACK 之前一律按 text 发送，不会让 GOTO 帧落到只懂文本的固件上。
+        """
+        if protocol != 'auto':
+            return protocol
+        if addr not in self._probed:
+            self._probed.add(addr)
+            seq = self.next_seq(addr)
+            self.send_raw(addr, pack_frame(CMD_PING, seq))
+            # 只登记 RTT，不进入重传 (tries 已到上限)
+            self._arm(addr, seq, None, self.max_retries)
+            metrics.inc("mount_protocol_probes")
+        return self._protocol.get(addr, 'text')
+
+    def next_seq(self, addr):
+        seq = (self._seq.get(addr, 0) + 1) & 0xFFFFFFFF
+        self._seq[addr] = seq
+        return seq
+
+    def send_raw(self, addr, payload):
+        self.transport.sendto(payload, addr)
+        self.stats(addr).sent += 1
+
+    def send_target(self, addr, ra, dec, protocol='binary', cmd=CMD_GOTO):
+        """发送目标坐标，返回序号 (text 模式返回 None)。"""
+        if self.protocol_for(addr, protocol) == 'text':
+            self.send_raw(addr, format_text_command(ra, dec))
+            return None
+        seq = self.next_seq(addr)
+        self._record_command(addr[0], seq, ra, dec)
+        self._send_sequenced(addr, seq, pack_frame(cmd, seq, ra, dec))
+        return seq
+
+    def send_trajectory(self, addr, trajectory):
+        """上传一段轨迹 (仅 binary 协议)，返回序号。"""
+        seq = self.next_seq(addr)
+        if trajectory.kind == TRAJ_RADEC:
+            wp = trajectory.waypoints
+            self._record_command(addr[0], seq, float(wp['a'][0]),
+                                 float(wp['b'][0]), trajectory)
+        self._send_sequenced(addr, seq, trajectory.pack(seq))
+        return seq
+
+    def _send_sequenced(self, addr, seq, payload):
+        old = self._latest.get(addr)
+        if old is not None and (addr, old) in self._pending:
+            self._pending.pop((addr, old))[3].cancel()
+            self.stats(addr).superseded += 1
+        self._latest[addr] = seq
+        self.send_raw(addr, payload)
+        self._arm(addr, seq, payload, 0)
+
+    def _record_command(self, ip, seq, ra, dec, trajectory=None):
+        # 最近 64 条命令按 seq 取模存放，遥测按 seq 反查发送时刻
+        history = self.commands.get(ip)
+        if history is None:
+            history = self.commands[ip] = [None] * 64
+        entry = (seq, time.monotonic(), ra, dec, trajectory)
+        history[seq % 64] = entry
+        self._latest_command[ip] = entry
+
+    def last_command(self, ip, seq=None):
+        """
+        返回 (seq, 发送时刻 monotonic, ra, dec, trajectory)；seq 为空时返回最新一条。
+        trajectory 仅轨迹命令非空。
+        """
+        history = self.commands.get(ip)
+        if history is None:
+            return None
+        if seq is None:
+            return self._latest_command.get(ip)
+        entry = history[seq % 64]
+        return entry if entry is not None and entry[0] == seq else None
+
+    def _arm(self, addr, seq, payload, tries):
+        loop = asyncio.get_running_loop()
+        handle = loop.call_later(self.ack_timeout, self._on_timeout, addr, seq)
+        self._pending[(addr, seq)] = (payload, time.monotonic(), tries, handle)
+
+    def _on_timeout(self, addr, seq):
+        entry = self._pending.pop((addr, seq), None)
+        if entry is None:
+            return
+        payload, _, tries, _ = entry
+        if addr not in self._acking:
+            return  # 设备从未回过 ACK：不计丢包也不重传
+        if tries < self.max_retries:
+            self.stats(addr).retransmits += 1
+            self.send_raw(addr, payload)
+            self._arm(addr, seq, payload, tries + 1)
+        else:
+            self.stats(addr).lost += 1
+
+    def datagram_received(self, data, addr):
+        frame = unpack_frame(data)
+        if frame is not None and frame[0] == CMD_ACK:
+            entry = self._pending.pop((addr, frame[1]), None)
+            self._acking.add(addr)
+            if addr in self._probed and addr not in self._protocol:
+                print(f"{addr[0]}:{addr[1]} 回复了 ACK，改用 binary 协议")
+            self._protocol[addr] = 'binary'
+            if entry is not None:
+                entry[3].cancel()
+                self.stats(addr).record_rtt(time.monotonic() - entry[1])
+            return
+        if self.on_datagram is not None:
+            self.on_datagram(data, addr)
+
+    def error_received(self, exc):
+        metrics.inc("udp_errors")
+        print(f"UDP Error: {exc}")
+
+
+class MountLink:
+    """
+    MountTransport 的同步门面：在一个后台线程里运行专用事件循环，
+    UI 回调与追踪线程通过 send() 线程安全地投递命令。
+    """
+
+    def __init__(self, ack_timeout=0.25, max_retries=2):
+        self.transport = MountTransport(ack_timeout, max_retries)
+        self.telemetry = TelemetryHub(self.transport)
+        # 下位机也可以直接把遥测回发到命令 socket
+        self.transport.on_datagram = self.telemetry.ingest
+        self.telemetry_endpoint = None
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._resolved = {}
+
+    def start(self):
+        with self._lock:
+            if self.loop is not None:
+                return self
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self.transport.open(), loop).result(5)
+            self.loop = loop
+        return self
+
+    def stop(self):
+        with self._lock:
+            if self.loop is None:
+                return
+            self.loop.call_soon_threadsafe(self.transport.close)
+            if self.telemetry_endpoint is not None:
+                self.loop.call_soon_threadsafe(self.telemetry_endpoint.close)
+                self.telemetry_endpoint = None
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(2)
+            self.loop = None
+
+    def resolve(self, ip, port=MOUNT_PORT):
+        """主机名只解析一次；非法地址在这里抛出，而不是被 datagram 回调吞掉。"""
+        key = (ip, port)
+        if key not in self._resolved:
+            if len(self._resolved) >= 64:
+                self._resolved.clear()
+            self._resolved[key] = (socket.gethostbyname(ip.strip()), port)
+        return self._resolved[key]
+
+    def cached_addr(self, ip, port=MOUNT_PORT):
+        """不做 DNS 查询：字面 IP 或已解析过的主机名返回地址，否则返回 None。"""
+        addr = self._resolved.get((ip, port))
+        if addr is not None:
+            return addr
+        try:
+            return str(ipaddress.IPv4Address(ip.strip())), port
+        except ValueError:
+            return None
+
+    def call(self, fn, *args, timeout=1.5):
+        """在传输线程中执行 fn(*args) 并等待结果。"""
+        self.start()
+
+        async def _run():
+            return fn(*args)
+        return asyncio.run_coroutine_threadsafe(_run(), self.loop).result(timeout)
+
+    def send(self, ip, ra, dec, port=MOUNT_PORT, protocol=None):
+        addr = self.resolve(ip, port)
+        return self.call(self.transport.send_target, addr, ra, dec,
+                         protocol or MOUNT_PROTOCOL)
+
+    def send_trajectory(self, ip, trajectory, port=MOUNT_PORT):
+        addr = self.resolve(ip, port)
+        return self.call(self.transport.send_trajectory, addr, trajectory)
+
+    def protocol_for(self, ip, protocol=None, port=MOUNT_PORT):
+        addr = self.resolve(ip, port)
+        return self.call(self.transport.protocol_for, addr, protocol or MOUNT_PROTOCOL)
+
+    def is_acking(self, ip, port=MOUNT_PORT):
+        return self.transport.is_acking(self.resolve(ip, port))
+
+    def stats(self, ip, port=MOUNT_PORT):
+        return self.transport.stats(self.resolve(ip, port)).snapshot()
+
+    def start_telemetry(self, port=TELEMETRY_PORT):
+        """在传输线程中监听遥测端口，重复调用无副作用。"""
+        self.start()
+        if self.telemetry_endpoint is not None:
+            return self.telemetry_endpoint
+
+        async def _open():
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: TelemetryListener(self.telemetry),
+                local_addr=('0.0.0.0', port))
+            return transport
+        self.telemetry_endpoint = asyncio.run_coroutine_threadsafe(
+            _open(), self.loop).result(5)
+        return self.telemetry_endpoint
+
+    def pointing_stats(self, ip):
+        """
+        返回设备的指向误差统计；尚无遥测时返回 None。
+        供广播线程每秒调用，不做 DNS 查询：主机名在发送时解析过之后才有统计。
+        """
+        addr = self.cached_addr(ip)
+        entry = self.telemetry.devices.get(addr[0]) if addr else None
+        return entry[1].snapshot() if entry else None
+
+
+def angular_separation_deg(ra1, dec1, ra2, dec2):
+    """两点球面角距 (度)，haversine 公式，小角度下数值稳定。"""
+    ra1, dec1, ra2, dec2 = map(math.radians, (ra1, dec1, ra2, dec2))
+    h = (math.sin((dec2 - dec1) / 2) ** 2 +
+         math.cos(dec1) * math.cos(dec2) * math.sin((ra2 - ra1) / 2) ** 2)
+    return math.degrees(2 * math.asin(min(1.0, math.sqrt(h))))
+
+
+def angular_separation_deg_batch(ra1, dec1, ra2, dec2):
+    """angular_separation_deg 的 numpy 版本，参数可广播。"""
+    ra1, dec1, ra2, dec2 = (np.radians(np.asarray(v, dtype=float)) for v in (ra1, dec1, ra2, dec2))
+    h = (np.sin((dec2 - dec1) / 2) ** 2 +
+         np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2) ** 2)
+    return np.degrees(2 * np.arcsin(np.minimum(1.0, np.sqrt(h))))
+
+
+class TelemetryRing:
+    """
+    预分配的遥测环形缓冲区。
+
+    原始 32 字节帧直接拷贝进固定大小的 bytearray，通过 FRAME_DTYPE 视图按列读取；
+    接收时刻、指向误差与命令滞后存放在预分配的 float64 数组中。
+    写入不会扩容，整晚运行内存占用恒定 (capacity * 56 字节)。
+    """
+
+    def __init__(self, capacity=65536):
+        self.capacity = int(capacity)
+        self._raw = bytearray(self.capacity * FRAME.size)
+        self._mv = memoryview(self._raw)
+        self.frames = np.frombuffer(self._raw, dtype=FRAME_DTYPE)
+        self.t_recv = np.zeros(self.capacity)
+        self.error = np.full(self.capacity, np.nan)
+        self.lag = np.full(self.capacity, np.nan)
+        self.head = 0
+        self.count = 0
+
+    def push(self, data, t_recv, error, lag):
+        i = self.head
+        off = i * FRAME.size
+        self._mv[off:off + FRAME.size] = data[:FRAME.size]
+        self.t_recv[i] = t_recv
+        self.error[i] = error
+        self.lag[i] = lag
+        self.head = i + 1 if i + 1 < self.capacity else 0
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _order(self, n=None):
+        n = self.count if n is None else min(n, self.count)
+        return (np.arange(self.head - n, self.head)) % self.capacity
+
+    def latest(self, n=None):
+        """按时间顺序返回最近 n 条记录 (拷贝)：dict 列名 → 数组。"""
+        idx = self._order(n)
+        frames = self.frames[idx]
+        return {
+            "t_recv": self.t_recv[idx], "t_mount": frames['timestamp'],
+            "seq": frames['seq'], "ra": frames['ra'], "dec": frames['dec'],
+            "error": self.error[idx], "lag": self.lag[idx],
+        }
+
+
+class PointingStats:
+    """增量式指向误差统计：RMS / 最大误差 / 最大命令滞后，O(1) 更新。"""
+
+    def __init__(self):
+        self.n = 0
+        self.sum_sq = 0.0
+        self.max_error = 0.0
+        self.last_error = None
+        self.lag_n = 0
+        self.lag_sum = 0.0
+        self.max_lag = 0.0
+        self.last_seq = None
+
+    def update(self, error, lag):
+        if error == error:  # 跳过 NaN (尚未发过命令)
+            self.n += 1
+            self.sum_sq += error * error
+            self.last_error = error
+            if error > self.max_error:
+                self.max_error = error
+        if lag == lag:
+            self.lag_n += 1
+            self.lag_sum += lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+    def snapshot(self):
+        return {
+            "samples": self.n,
+            "rms_error_deg": math.sqrt(self.sum_sq / self.n) if self.n else None,
+            "max_error_deg": self.max_error if self.n else None,
+            "last_error_deg": self.last_error,
+            "mean_lag_ms": self.lag_sum / self.lag_n * 1000 if self.lag_n else None,
+            "max_lag_ms": self.max_lag * 1000 if self.lag_n else None,
+        }
+
+
+class TelemetryHub:
+    """
+    遥测汇总：按设备 IP 维护 TelemetryRing + PointingStats。
+    误差 = 上报指向与最近一次命令目标的角距；滞后 = 某个 seq 首次被上报时距其发送的时间。
+    """
+
+    def __init__(self, transport, capacity=65536):
+        self.transport = transport
+        self.capacity = capacity
+        self.devices = {}
+        self.dropped = 0
+
+    def device(self, ip):
+        if ip not in self.devices:
+            self.devices[ip] = (TelemetryRing(self.capacity), PointingStats())
+            metrics.register_collector("mount_pointing", self.devices[ip][1].snapshot, device=ip)
+        return self.devices[ip]
+
+    def ingest(self, data, addr):
+        if (len(data) < FRAME.size or data[0] != FRAME_MAGIC[0]
+                or data[1] != FRAME_MAGIC[1] or data[3] != CMD_TELEMETRY):
+            self.dropped += 1
+            return
+        _, _, _, seq, _, ra, dec = FRAME.unpack_from(data)
+        ip = addr[0]
+        ring, stats = self.device(ip)
+        now = time.monotonic()
+        cmd = self.transport.last_command(ip)
+        if cmd is None:
+            error = math.nan
+        elif cmd[4] is not None:
+            # 轨迹命令：与当前时刻的插值目标比较
+            cmd_ra, cmd_dec = cmd[4].interpolate(time.time())
+            error = angular_separation_deg(ra, dec, float(cmd_ra), float(cmd_dec))
+        else:
+            error = angular_separation_deg(ra, dec, cmd[2], cmd[3])
+        lag = math.nan
+        if seq != stats.last_seq:
+            stats.last_seq = seq
+            applied = self.transport.last_command(ip, seq)
+            if applied is not None:
+                lag = now - applied[1]
+        ring.push(data, time.time(), error, lag)
+        stats.update(error, lag)
+
+
+class TelemetryListener(asyncio.DatagramProtocol):
+    """独立端口 (默认 8889) 上的遥测接收端点。"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def datagram_received(self, data, addr):
+        self.hub.ingest(data, addr)
+
+
+_mount_link = None
+_mount_link_lock = threading.Lock()
+
+
+def get_mount_link():
+    global _mount_link
+    with _mount_link_lock:
+        if _mount_link is None:
+            _mount_link = MountLink()
+        return _mount_link
+
+
+class MountDevice:
+    """注册表中的一台赤道仪：地址、端口、协议变体与发送健康状态。"""
+
+    def __init__(self, name, ip, port=MOUNT_PORT, protocol=None):
+        self.name = name
+        self.ip = ip
+        self.port = int(port)
+        self.protocol = protocol or MOUNT_PROTOCOL
+        self.addr = None
+        self.target = None
+        self.last_send = None
+        self.last_error = ""
+        self.consecutive_failures = 0
+
+    def to_dict(self):
+        return {"name": self.name, "ip": self.ip, "port": self.port,
+                "protocol": self.protocol}
+
+
+class MountRegistry:
+    """设备注册表，可保存为 JSON (mounts.json) 供下次启动加载。"""
+
+    def __init__(self, devices=()):
+        self._devices = {}
+        for dev in devices:
+            self._devices[dev.name] = dev
+
+    def add(self, name, ip, port=MOUNT_PORT, protocol=None):
+        dev = MountDevice(name, ip, port, protocol)
+        self._devices[name] = dev
+        return dev
+
+    def remove(self, name):
+        return self._devices.pop(name, None)
+
+    def get(self, name):
+        return self._devices[name]
+
+    def names(self):
+        return list(self._devices)
+
+    def __iter__(self):
+        return iter(list(self._devices.values()))
+
+    def __len__(self):
+        return len(self._devices)
+
+    @classmethod
+    def from_spec(cls, spec, protocol=None):
+        """解析 UI 输入 "ip[:port][/protocol], ..."，设备名即原始条目。"""
+        registry = cls()
+        for item in str(spec).split(','):
+            item = item.strip()
+            if not item:
+                continue
+            host, _, proto = item.partition('/')
+            ip, _, port = host.partition(':')
+            registry.add(item, ip.strip(), int(port or MOUNT_PORT),
+                         proto.strip() or protocol)
+        return registry
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(MountDevice(**d) for d in json.load(f))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([d.to_dict() for d in self], f, ensure_ascii=False, indent=2)
+
+
+class MountFleet:
+    """
+    多台赤道仪扇出控制器。
+
+    所有设备共用 MountLink 的一个事件循环和一个 socket：地址解析用 loop.getaddrinfo 并发完成，
+    之后每台设备的发送只是一次非阻塞 sendto，几十台设备也不需要额外线程或 socket。
+    """
+    OFFLINE_AFTER = 5.0
+
+    def __init__(self, registry, link=None):
+        self.registry = registry
+        self.link = link or get_mount_link()
+
+    async def _send_device(self, dev, target):
+        transport = self.link.transport
+        try:
+            if dev.addr is None:
+                loop = asyncio.get_running_loop()
+                info = await loop.getaddrinfo(dev.ip, dev.port, family=socket.AF_INET,
+                                              type=socket.SOCK_DGRAM)
+                dev.addr = info[0][4]
+            protocol = transport.protocol_for(dev.addr, dev.protocol)
+            if isinstance(target, Trajectory):
+                if protocol == 'text':
+                    raise ValueError("text 协议不支持轨迹上传")
+                transport.send_trajectory(dev.addr, target)
+                msg = f"Trajectory: {len(target.waypoints)} pts"
+            else:
+                ra, dec = target
+                transport.send_target(dev.addr, ra, dec, protocol)
+                msg = _sent_message(transport.is_acking(dev.addr), protocol, ra, dec)
+            dev.target = target
+            dev.last_send = time.monotonic()
+            dev.consecutive_failures = 0
+            return True, msg
+        except Exception as e:
+            dev.consecutive_failures += 1
+            dev.last_error = f"UDP Error: {e}"
+            return False, dev.last_error
+
+    async def _send_many(self, assignments):
+        results = await asyncio.gather(*(
+            self._send_device(dev, target) for dev, target in assignments))
+        return {dev.name: res for (dev, _), res in zip(assignments, results)}
+
+    def _run(self, assignments, timeout=5.0):
+        link = self.link.start()
+        return asyncio.run_coroutine_threadsafe(
+            self._send_many(assignments), link.loop).result(timeout)
+
+    def broadcast(self, ra, dec):
+        """所有设备指向同一目标，返回 {name: (ok, msg)}。"""
+        return self._run([(dev, (float(ra), float(dec))) for dev in self.registry])
+
+    def broadcast_trajectory(self, trajectory):
+        """所有设备上传同一段轨迹。"""
+        return self._run([(dev, trajectory) for dev in self.registry])
+
+    def send_targets(self, targets):
+        """每台设备各自的目标：{name: (ra, dec)}。"""
+        return self._run([(self.registry.get(name), (float(ra), float(dec)))
+                          for name, (ra, dec) in targets.items()])
+
+    def health(self):
+        """每台设备的链路与指向健康状况。"""
+        now = time.monotonic()
+        report = {}
+        for dev in self.registry:
+            link = self.link.transport.stats(dev.addr).snapshot() if dev.addr else {}
+            pointing = None
+            if dev.addr and dev.addr[0] in self.link.telemetry.devices:
+                pointing = self.link.telemetry.devices[dev.addr[0]][1].snapshot()
+            acking = self.link.transport.is_acking(dev.addr)
+            last_ack = (self.link.transport.stats(dev.addr).last_ack_time
+                        if dev.addr else None)
+            if dev.consecutive_failures:
+                status = "error"
+            elif not acking:
+                status = "unknown" if dev.last_send is None else "no-ack"
+            elif last_ack is not None and time.time() - last_ack > self.OFFLINE_AFTER:
+                status = "offline"
+            else:
+                status = "ok"
+            report[dev.name] = {
+                "status": status,
+                "last_send_age": None if dev.last_send is None else now - dev.last_send,
+                "consecutive_failures": dev.consecutive_failures,
+                "last_error": dev.last_error,
+                "link": link,
+                "pointing": pointing,
+            }
+        return report
+
+
+_fleets = {}
+
+
+def get_fleet(spec, protocol=None):
+    """按 UI 输入复用 MountFleet，保持设备健康统计的连续性。"""
+    key = (str(spec).strip(), protocol)
+    if key not in _fleets:
+        if len(_fleets) > 32:
+            _fleets.clear()
+        _fleets[key] = MountFleet(MountRegistry.from_spec(spec, protocol))
+    return _fleets[key]
+
+
+def _sent_message(acked, protocol, ra, dec):
+    """发送结果：设备回过 ACK 才报 Success，否则注明没有回执 (命令已发出，但无法确认到达)。"""
+    if acked:
+        return f"Success: {ra:.2f}, {dec:.2f}"
+    return f"Sent ({'text, ' if protocol == 'text' else ''}no ack): {ra:.2f}, {dec:.2f}"
+
+
+@metrics.timed("mount_send_seconds", ok=lambda result: result[0])
+def send_udp_command(ip, ra_str, dec_str, protocol=None):
+    try:
+        ra_val = float(str(ra_str).replace('°', '').strip())
+        dec_val = float(str(dec_str).replace('°', '').strip())
+        if ',' in str(ip):
+            # 多台设备: "ip1, ip2:8890/text, ..."
+            results = get_fleet(ip, protocol).broadcast(ra_val, dec_val)
+            failed = [name for name, (ok, _) in results.items() if not ok]
+            if failed:
+                return False, f"UDP Error: {len(failed)}/{len(results)} failed ({', '.join(failed)})"
+            no_ack = sum(msg.startswith("Sent") for _, msg in results.values())
+            note = f" ({no_ack} no ack)" if no_ack else ""
+            return True, f"Success x{len(results)}{note}: {ra_val:.2f}, {dec_val:.2f}"
+        link = get_mount_link()
+        protocol = protocol or MOUNT_PROTOCOL
+        sent_as = link.protocol_for(ip, protocol)
+        link.send(ip, ra_val, dec_val, protocol=sent_as)
+        return True, _sent_message(link.is_acking(ip), sent_as, ra_val, dec_val)
+    except Exception as e:
+        return False, f"UDP Error: {e}"
+
+
+@metrics.timed("mount_trajectory_seconds", ok=lambda result: result[0])
+def send_trajectory_command(ip, trajectory, protocol=None):
+    """上传轨迹段，返回 (success, msg)。多台设备时同一段轨迹广播给全部设备。"""
+    try:
+        if ',' in str(ip):
+            results = get_fleet(ip, protocol).broadcast_trajectory(trajectory)
+            failed = [name for name, (ok, _) in results.items() if not ok]
+            if failed:
+                return False, f"UDP Error: {len(failed)}/{len(results)} failed ({', '.join(failed)})"
+            return True, f"Trajectory x{len(results)}: {len(trajectory.waypoints)} pts"
+        link = get_mount_link()
+        if link.protocol_for(ip, protocol) == 'text':
+            return False, "UDP Error: text 协议不支持轨迹上传"
+        link.send_trajectory(ip, trajectory)
+        return True, f"Trajectory: {len(trajectory.waypoints)} pts"
+    except Exception as e:
+        return False, f"UDP Error: {e}"
+
+
+class FakeMount(asyncio.DatagramProtocol):
+    """
+    本地模拟赤道仪，供开发与测试使用，不需要真实 ESP32。
+
+    解析 GOTO / 轨迹 / 文本命令并回 ACK，按轨迹插值当前指向，
+    可按 telemetry_rate 向 telemetry_addr 回传遥测帧；drop_rate 与 ack_delay 用于模拟弱 Wi-Fi。
+    """
+
+    def __init__(self, ack=True, drop_rate=0.0, ack_delay=0.0,
+                 telemetry_addr=None, telemetry_rate=10.0, seed=None):
+        import random
+        self.ack = ack
+        self.drop_rate = drop_rate
+        self.ack_delay = ack_delay
+        self.telemetry_addr = telemetry_addr
+        self.telemetry_rate = telemetry_rate
+        self.counts = {"goto": 0, "ping": 0, "trajectory": 0, "text": 0,
+                       "invalid": 0, "dropped": 0}
+        self.bytes_received = 0
+        self.position = None
+        self.trajectory = None
+        self.last_seq = 0
+        self.transport = None
+        self.loop = None
+        self._rng = random.Random(seed)
+        self._thread = None
+        self._telemetry_task = None
+
+    async def open(self, host='127.0.0.1', port=0):
+        self.loop = asyncio.get_running_loop()
+        await self.loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        if self.telemetry_addr is not None:
+            self._telemetry_task = self.loop.create_task(self._telemetry_loop())
+        return self.transport.get_extra_info('sockname')[1]
+
+    def start_in_thread(self, host='127.0.0.1', port=0):
+        """在独立线程的事件循环中运行，返回实际绑定的端口。"""
+        loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=loop.run_forever, daemon=True)
+        self._thread.start()
+        return asyncio.run_coroutine_threadsafe(self.open(host, port), loop).result(5)
+
+    def close(self):
+        loop = self.loop
+        if loop is None:
+            return
+
+        def _close():
+            if self._telemetry_task is not None:
+                self._telemetry_task.cancel()
+            if self.transport is not None:
+                self.transport.close()
+            if self._thread is not None:
+                # 排在任务取消之后再停循环
+                loop.call_soon(loop.stop)
+        loop.call_soon_threadsafe(_close)
+        if self._thread is not None:
+            self._thread.join(2)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def current_position(self, t=None):
+        """模拟的当前指向 (ra, dec)；有轨迹时按时间插值。"""
+        if self.trajectory is not None and self.trajectory.kind == TRAJ_RADEC:
+            ra, dec = self.trajectory.interpolate(time.time() if t is None else t)
+            return float(ra), float(dec)
+        return self.position
+
+    def datagram_received(self, data, addr):
+        if self._rng.random() < self.drop_rate:
+            self.counts["dropped"] += 1
+            return
+        self.bytes_received += len(data)
+        if data[:2] != FRAME_MAGIC:
+            try:
+                ra, dec = (float(v) for v in data.decode('utf-8').split(','))
+                self.position = (ra, dec)
+                self.trajectory = None
+                self.counts["text"] += 1
+            except ValueError:
+                self.counts["invalid"] += 1
+            return
+        if len(data) >= 4 and data[3] == CMD_TRAJECTORY:
+            parsed = Trajectory.unpack(data)
+            if parsed is None:
+                self.counts["invalid"] += 1
+                return
+            seq, self.trajectory = parsed
+            self.counts["trajectory"] += 1
+        else:
+            frame = unpack_frame(data)
+            if frame is None or frame[0] not in (CMD_GOTO, CMD_PING):
+                self.counts["invalid"] += 1
+                return
+            seq = frame[1]
+            if frame[0] == CMD_PING:
+                self.counts["ping"] += 1
+            else:
+                self.position = (frame[3], frame[4])
+                self.trajectory = None
+                self.counts["goto"] += 1
+        self.last_seq = seq
+        if self.ack:
+            ack = pack_frame(CMD_ACK, seq)
+            if self.ack_delay:
+                self.loop.call_later(self.ack_delay, self.transport.sendto, ack, addr)
+            else:
+                self.transport.sendto(ack, addr)
+
+    async def _telemetry_loop(self):
+        period = 1.0 / self.telemetry_rate
+        while True:
+            await asyncio.sleep(period)
+            pos = self.current_position()
+            if pos is not None:
+                self.transport.sendto(
+                    pack_frame(CMD_TELEMETRY, self.last_seq, pos[0], pos[1]),
+                    self.telemetry_addr)
@@ -0,0 +1,42 @@
+"""astro 的历表缓存回归测试。"""
+import time
+
+import numpy as np
+
+from starlink import astro
+
+
+def _angle_diff(a, b):
+    return np.abs((np.asarray(a) - np.asarray(b) + 180.0) % 360.0 - 180.0)
+
+
+def test_cache_tight_tolerance_radec_covers_query():
+    """误差要求极严时窗口会多次减半，返回的窗口仍须覆盖查询时刻，不得外推。"""
+    t = time.time()
+    cache = astro.EphemerisCache(max_error_deg=1e-12)
+    ra, dec = cache.radec("Moon", t)
+    ra0, dec0 = astro.get_real_planet_coords("Moon", astro.ObserverFrame(t))
+    assert cache.stats["refits"] > 0
+    assert all(w.covers(t) for w in cache._windows["Moon"])
+    assert _angle_diff(ra, ra0) < 1e-6 and abs(dec - dec0) < 1e-6
+
+
+def test_cache_tight_tolerance_radec_batch_terminates():
+    t = time.time()
+    ts = t + np.linspace(0.0, 600.0, 25)
+    cache = astro.EphemerisCache(max_error_deg=1e-12)
+    ra, dec = cache.radec_batch("Moon", ts)
+    ra0, dec0 = astro.get_real_planet_coords_batch("Moon", ts)
+    assert ra.shape == ts.shape
+    assert _angle_diff(ra, ra0).max() < 1e-6
+    assert np.abs(dec - dec0).max() < 1e-6
+
+
+def test_cache_keeps_windows_for_past_and_future_queries():
+    t = time.time()
+    cache = astro.EphemerisCache(max_windows=4)
+    for r in range(3):
+        for offset in (-3 * 86400, 0.0, 2 * 86400):
+            cache.radec("Sun", t + offset + r)
+    assert cache.stats["fits"] == 3
+    assert cache.stats["evictions"] == 0
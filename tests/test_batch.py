@@ -0,0 +1,60 @@
+"""批量解析的扫描阶段：去重、不可读文件与停止。"""
+import os
+import threading
+
+import pytest
+
+from starlink import solver
+from starlink.batch import BatchResultWriter, solve_directory
+
+
+@pytest.fixture
+def stub_backend(monkeypatch):
+    calls = []
+
+    def stub(file_path=None, file_bytes=None, progress_cb=None, hints=None):
+        calls.append(file_path)
+        return True, 10.0, 20.0, 30.0, 40.0, "stub"
+    monkeypatch.setitem(solver.SOLVER_BACKENDS, "stub", stub)
+    return calls
+
+
+@pytest.fixture
+def frames(tmp_path):
+    for name, data in (("a.png", b"frame a"), ("b.png", b"frame a"), ("c.png", b"frame c")):
+        (tmp_path / name).write_bytes(data)
+    return tmp_path
+
+
+def test_unreadable_file_becomes_failed_row(frames, stub_backend):
+    if not hasattr(os, "symlink"):
+        pytest.skip("需要符号链接")
+    os.symlink(str(frames / "missing.png"), str(frames / "broken.png"))
+    output = str(frames / "out.jsonl")
+    seen = []
+    snap = solve_directory(str(frames), output, backend="stub", concurrency=2,
+                           progress_cb=lambda p: seen.append(p.snapshot()["scanned"]))
+
+    assert snap["total"] == snap["scanned"] == 4
+    assert snap["solved"] == 2 and snap["failed"] == 1 and snap["duplicates"] == 1
+    assert sorted(map(os.path.basename, stub_backend)) == ["a.png", "c.png"]
+    rows = {os.path.basename(r["file"]): r for r in BatchResultWriter(output).rows()}
+    assert not rows["broken.png"]["success"]
+    assert rows["broken.png"]["label"].startswith("读取失败")
+    assert rows["b.png"]["duplicate_of"] == str(frames / "a.png")
+    # 扫描过程中逐帧报告进度
+    assert [n for n in seen if n][:4] == [1, 2, 3, 4]
+
+
+def test_stop_during_scan_submits_nothing(frames, stub_backend):
+    stop = threading.Event()
+
+    def on_progress(p):
+        if p.scanned == 1:
+            stop.set()
+
+    snap = solve_directory(str(frames), str(frames / "out.jsonl"), backend="stub",
+                           progress_cb=on_progress, stop_event=stop)
+    assert snap["scanned"] == 1 and snap["total"] == 3
+    assert stub_backend == []
+    assert not os.path.exists(frames / "out.jsonl")
@@ -0,0 +1,103 @@
+"""本地解析后端测试：用 tools/fake_solver.py 替身进程验证解析、超时结束进程组与回退链。"""
+import os
+import signal
+import struct
+import time
+
+import pytest
+
+from starlink import local_solver, solver
+from starlink.local_solver import LocalSolver
+
+FAKE_SOLVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "tools", "fake_solver.py")
+
+# 只有文件头的 PNG：本地后端只读尺寸，替身进程不解码像素
+PNG_HEADER = (b'\x89PNG\r\n\x1a\n' + struct.pack('>I4sII', 13, b'IHDR', 1920, 1080)
+              + bytes(16))
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="fake_solver.py 依赖 shebang 启动")
+
+
+@pytest.fixture
+def fake_local(monkeypatch):
+    """把共享的本地解析器换成 fake_solver。"""
+    for name in ("FAKE_SOLVER_DELAY", "FAKE_SOLVER_FAIL", "FAKE_SOLVER_RA", "FAKE_SOLVER_DEC"):
+        monkeypatch.delenv(name, raising=False)
+    local = LocalSolver(executable=FAKE_SOLVER, kind="solve-field", workers=1, timeout=0.5)
+    monkeypatch.setattr(local_solver, "_local_solver", local)
+    return local
+
+
+@pytest.fixture
+def stub_calls(monkeypatch):
+    """注册回退链末端的 stub 后端，返回其调用记录。"""
+    calls = []
+
+    def stub(file_path=None, file_bytes=None, progress_cb=None, hints=None):
+        calls.append(file_bytes)
+        return True, 1.0, 2.0, 3.0, 4.0, "stub"
+    monkeypatch.setitem(solver.SOLVER_BACKENDS, "stub", stub)
+    return calls
+
+
+def test_fake_solver_result(fake_local):
+    fake_local.timeout = 30
+    ok, ra, dec, _, _, label = solver.solve_star_image(file_bytes=PNG_HEADER, backend="local")
+    assert ok, label
+    assert ra == pytest.approx(83.82) and dec == pytest.approx(-5.39)
+    assert fake_local.scale_memory[(1920, 1080)] == pytest.approx(5.0)
+    assert fake_local.stats["solved"] == 1
+
+
+def test_timeout_kills_process_group_and_falls_back(fake_local, stub_calls, monkeypatch):
+    monkeypatch.setenv("FAKE_SOLVER_DELAY", "30")
+    killed = []
+    real_killpg = os.killpg
+
+    def spy_killpg(pgid, sig):
+        killed.append((pgid, sig))
+        real_killpg(pgid, sig)
+    monkeypatch.setattr(local_solver.os, "killpg", spy_killpg)
+
+    messages = []
+    t0 = time.monotonic()
+    result = solver.solve_star_image(file_bytes=PNG_HEADER, backend="local,stub",
+                                     progress_cb=messages.append)
+    assert time.monotonic() - t0 < 10
+    assert result == (True, 1.0, 2.0, 3.0, 4.0, "stub")
+    assert fake_local.stats["timeouts"] == 1
+    assert fake_local.running == 0
+    assert len(killed) == 1 and killed[0][1] == signal.SIGKILL
+    with pytest.raises(ProcessLookupError):
+        os.killpg(killed[0][0], 0)  # 整个进程组都已结束
+    assert stub_calls == [PNG_HEADER]
+    assert any(m.startswith("↪️ local 未成功") for m in messages)
+
+
+def test_failure_falls_back(fake_local, stub_calls, monkeypatch):
+    monkeypatch.setenv("FAKE_SOLVER_FAIL", "1")
+    fake_local.timeout = 30
+    result = solver.solve_star_image(file_bytes=PNG_HEADER, backend="local,stub")
+    assert result[5] == "stub" and len(stub_calls) == 1
+    assert fake_local.stats["failed"] == 1
+
+
+def test_backend_exception_falls_back(stub_calls, monkeypatch):
+    def broken(**kwargs):
+        raise RuntimeError("boom")
+    monkeypatch.setitem(solver.SOLVER_BACKENDS, "broken", broken)
+    result = solver.solve_star_image(file_bytes=PNG_HEADER, backend="broken,stub")
+    assert result[5] == "stub"
+
+
+@pytest.mark.parametrize("ini", [
+    "PLTSOLVD=T\nCRVAL1=83.8\n",                    # 缺少 CRVAL2
+    "PLTSOLVD=T\nCRVAL1=abc\nCRVAL2=-5.4\n",        # 数值无法解析
+    "PLTSOLVD=T\nCRVAL1=83.8\nCRVAL2=-5.4\nIMAGEW=nan\nIMAGEH=1080\n",
+])
+def test_partial_astap_output_is_a_failure(tmp_path, ini):
+    base = str(tmp_path / "solve")
+    with open(base + ".ini", "w") as f:
+        f.write(ini)
+    assert LocalSolver(executable=FAKE_SOLVER, kind="astap").read_solution(base, None) is None
@@ -0,0 +1,88 @@
+"""NovaClient 对 FakeNovaServer 的行为测试：session 过期重登、续传与失败条目丢弃。"""
+import asyncio
+
+import pytest
+
+from starlink.nova import FakeNovaServer, NovaClient, SolveCache
+
+pytest.importorskip("httpx")
+
+
+@pytest.fixture
+def server():
+    with FakeNovaServer(queue_delay=0.05, solve_delay=0.05) as fake:
+        yield fake
+
+
+def _client(server):
+    client = NovaClient(api_key="test", base_url=server.url, poll_initial=0.01, poll_max=0.05,
+                        queue_timeout=5.0, solve_timeout=5.0)
+    client.upload_mode = "image"  # 假服务端不解码图片，直接上传原始字节
+    return client
+
+
+def _run(server, fn):
+    async def main():
+        async with _client(server) as client:
+            return await fn(client)
+    return asyncio.run(main())
+
+
+def test_expired_session_triggers_relogin(server):
+    server.session_ttl = 0.2
+
+    async def solve_twice(client):
+        first = await client.solve(b"image one")
+        await asyncio.sleep(0.3)  # 客户端仍认为 session 有效，服务端已过期
+        second = await client.solve(b"image two")
+        return first, second
+
+    first, second = _run(server, solve_twice)
+    assert first[0] and second[0]
+    assert second[1] == pytest.approx(server.ra) and second[2] == pytest.approx(server.dec)
+    # 第二次上传先被拒 ("no session")，强制重登后重传一次
+    assert server.counts["login"] == 2
+    assert server.counts["upload"] == 3
+
+
+def test_pending_entry_resumes_without_upload(server, tmp_path):
+    cache = SolveCache(directory=str(tmp_path))
+    data = b"image to resume"
+    key = cache.key_for(data)
+
+    async def resume(client):
+        sub_id = await client.upload(data)
+        cache.put(key, state="pending", subid=sub_id)
+        return await client.solve(data, cache)
+
+    result = _run(server, resume)
+    assert result[0]
+    assert server.counts["upload"] == 1
+    assert cache.stats["resumed"] == 1
+    assert cache.get(key)["state"] == "done"
+
+
+def test_failed_job_discards_cache_entry(server, tmp_path):
+    server.fail = True
+    cache = SolveCache(directory=str(tmp_path))
+    data = b"unsolvable image"
+
+    result = _run(server, lambda client: client.solve(data, cache))
+    assert not result[0]
+    assert cache.get(cache.key_for(data)) is None
+    assert cache.stats["misses"] == 1
+
+
+def test_concurrent_solves_keep_their_own_timings(server):
+    async def solve_both(client):
+        timings = [{}, {}]
+        results = await asyncio.gather(
+            client.solve(b"first image", timings=timings[0]),
+            client.solve(b"second image", timings=timings[1]))
+        return results, timings
+
+    results, timings = _run(server, solve_both)
+    assert all(r[0] for r in results)
+    for t in timings:
+        assert {"prepare", "upload", "queue", "solve", "fetch"} <= set(t)
+    assert timings[0] is not timings[1] and timings[0] != timings[1]
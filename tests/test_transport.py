@@ -0,0 +1,111 @@
+"""transport 的轨迹帧与 FakeMount 回环测试 (只用 127.0.0.1，不需要硬件)。"""
+import struct
+import time
+
+import numpy as np
+import pytest
+
+from starlink import transport
+from starlink.transport import FakeMount, MountLink, Trajectory
+
+
+@pytest.fixture
+def mount():
+    m = FakeMount()
+    m.port = m.start_in_thread()
+    yield m
+    m.close()
+
+
+@pytest.fixture
+def link():
+    link = MountLink()
+    yield link
+    link.stop()
+
+
+def _wait(pred, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not pred():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_trajectory_frame_layout():
+    traj = Trajectory(1700000000.5, [0.0, 1.0, 2.5], [10.0, 11.0, 12.0], [-5.0, -4.0, -3.0],
+                      kind=transport.TRAJ_AZALT)
+    data = traj.pack(0x1_0000_0007)
+    assert len(data) == 20 + 3 * 20
+    assert struct.unpack_from('<2sBBIdBBH', data) == (
+        b'SL', transport.FRAME_VERSION, transport.CMD_TRAJECTORY, 7,
+        1700000000.5, transport.TRAJ_AZALT, 0, 3)
+    assert struct.unpack_from('<fdd', data, 20 + 2 * 20) == (2.5, 12.0, -3.0)
+
+    seq, back = Trajectory.unpack(data)
+    assert seq == 7 and back.t0 == traj.t0 and back.kind == traj.kind
+    assert np.array_equal(back.waypoints, traj.waypoints)
+    # 截断的帧与非轨迹帧都不被接受
+    assert Trajectory.unpack(data[:-1]) is None
+    assert Trajectory.unpack(transport.pack_frame(transport.CMD_GOTO, 1, 10.0, 20.0)) is None
+
+
+def test_trajectory_waypoint_limit():
+    n = transport.MAX_WAYPOINTS
+    assert n == 64
+    full = Trajectory(0.0, np.arange(n), np.zeros(n), np.zeros(n))
+    assert len(full.pack(1)) <= 1300  # 整帧不会被 IP 分片
+    for bad in (1, n + 1):
+        with pytest.raises(ValueError):
+            Trajectory(0.0, np.arange(bad), np.zeros(bad), np.zeros(bad))
+
+
+def test_fake_mount_receives_trajectory(mount, link):
+    t0 = time.time()
+    traj = Trajectory(t0, [0.0, 10.0], [100.0, 110.0], [20.0, 30.0])
+    seq = link.send_trajectory("127.0.0.1", traj, port=mount.port)
+    assert _wait(lambda: mount.counts["trajectory"] == 1)
+    assert mount.last_seq == seq
+    assert np.array_equal(mount.trajectory.waypoints, traj.waypoints)
+    ra, dec = mount.current_position(t0 + 5.0)
+    assert ra == pytest.approx(105.0) and dec == pytest.approx(25.0)
+    assert _wait(lambda: link.is_acking("127.0.0.1", port=mount.port))
+    assert link.stats("127.0.0.1", port=mount.port)["acked"] == 1
+
+
+def test_fake_mount_interpolates_across_zero(mount, link):
+    t0 = time.time()
+    traj = Trajectory(t0, [0.0, 2.0, 4.0], [358.0, 0.0, 2.0], [10.0, 10.0, 10.0])
+    link.send_trajectory("127.0.0.1", traj, port=mount.port)
+    assert _wait(lambda: mount.trajectory is not None)
+    # 沿最短方向穿过 0°，而不是绕回 180°
+    for dt, expected in ((1.0, 359.0), (2.0, 0.0), (3.0, 1.0), (9.0, 2.0)):
+        ra, _ = mount.current_position(t0 + dt)
+        assert abs((ra - expected + 180.0) % 360.0 - 180.0) < 1e-6
+    ra, _ = traj.interpolate(t0 + np.array([0.5, 3.5]))
+    assert np.allclose(ra, [358.5, 1.5])
+
+
+def test_auto_probe_does_not_send_goto_to_text_firmware(link):
+    legacy = FakeMount(ack=False)
+    port = legacy.start_in_thread()
+    try:
+        for k in range(3):
+            protocol = link.protocol_for("127.0.0.1", "auto", port)
+            assert protocol == "text"
+            link.send("127.0.0.1", 10.0 + k, 20.0, port=port, protocol=protocol)
+        assert _wait(lambda: legacy.counts["text"] == 3)
+        time.sleep(0.3)  # 超过 ack_timeout，确认探测帧没有被重传
+        assert legacy.counts["ping"] == 1 and legacy.counts["goto"] == 0
+        assert legacy.position == (12.0, 20.0)
+    finally:
+        legacy.close()
+
+
+def test_auto_probe_switches_to_binary_after_ack(mount, link):
+    assert link.protocol_for("127.0.0.1", "auto", mount.port) == "text"
+    assert _wait(lambda: link.protocol_for("127.0.0.1", "auto", mount.port) == "binary")
+    link.send("127.0.0.1", 30.0, 40.0, port=mount.port, protocol="binary")
+    assert _wait(lambda: mount.counts["goto"] == 1)
+    assert mount.counts["ping"] == 1 and mount.position == (30.0, 40.0)
@@ -0,0 +1,166 @@
+"""
+生成离线解析所需的星表与四星组索引 (starlink/data/)。
+
+输入:
+  --hip    Hipparcos 新归算星表 hip2.dat (van Leeuwen 2007, 公有领域; 可由 PyPI 包
+           hipparcos_catalog 获得)
+  --names  starplot 的 star_designations.parquet (hip → 专名, MIT; 需要 pyarrow)，可选
+  --ongc   OpenNGC 数据库 ongc.db (CC-BY-SA-4.0; 可由 PyPI 包 pyongc 获得)，可选，
+           生成深空星表 objects.npy / object_names.json
+
+用法: python tools/build_catalogs.py --hip hip2.dat [--names star_designations.parquet] [--ongc ongc.db]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlink import astro, catalog, solver  # noqa: E402
+
+MAG_LIMIT = 6.5
+# (最小 AB 角距, 最大 AB 角距, 星等上限, 每颗 A 星取的 B 星数)
+QUAD_BANDS = [(2.0, 5.0, 6.5, 8), (5.0, 12.0, 5.5, 8), (12.0, 30.0, 4.5, 8)]
+HIP_EPOCH = 1991.25
+
+STAR_DTYPE = np.dtype([('hip', '<u4'), ('ra', '<f8'), ('dec', '<f8'), ('mag', '<f4')])
+QUAD_DTYPE = np.dtype([('key', '<u4'), ('code', '<f4', (4,)), ('stars', '<u2', (4,))])
+OBJECT_DTYPE = np.dtype([('id', 'S14'), ('messier', '<u1'), ('kind', '<u1'), ('ra', '<f8'),
+                         ('dec', '<f8'), ('mag', '<f4'), ('size', '<f4')])
+
+
+def read_hip2(path, mag_limit=MAG_LIMIT):
+    """读取 hip2.dat 并做自行改正到 J2000。"""
+    rows = []
+    with open(path, 'r') as f:
+        for line in f:
+            p = line.split()
+            if len(p) < 20:
+                continue
+            mag = float(p[19])
+            if mag > mag_limit:
+                continue
+            rows.append((int(p[0]), float(p[4]), float(p[5]), float(p[7]), float(p[8]), mag))
+    hip, ra, dec, pmra, pmde, mag = map(np.array, zip(*rows))
+    dt = 2000.0 - HIP_EPOCH
+    mas = np.radians(1 / 3.6e6)
+    dec2 = dec + pmde * mas * dt
+    ra2 = ra + pmra * mas * dt / np.cos(dec)
+    stars = np.zeros(len(hip), dtype=STAR_DTYPE)
+    stars['hip'], stars['mag'] = hip, mag
+    stars['ra'], stars['dec'] = np.degrees(ra2) % 360.0, np.degrees(dec2)
+    return stars[np.argsort(stars['mag'], kind='stable')]
+
+
+def read_names(path):
+    import pyarrow.parquet as pq
+    table = pq.read_table(path, columns=['hip', 'name']).to_pydict()
+    return {int(h): n for h, n in zip(table['hip'], table['name']) if n}
+
+
+def build_quads(stars):
+    unit = astro._radec_to_unit(stars['ra'], stars['dec'])
+    quads = set()
+    for lo, hi, mag_limit, n_b in QUAD_BANDS:
+        sel = np.nonzero(stars['mag'] <= mag_limit)[0]
+        u = unit[sel]
+        cos_lo, cos_hi = np.cos(np.radians(lo)), np.cos(np.radians(hi))
+        for ia in range(len(sel)):
+            dots = u @ u[ia]
+            cand = np.nonzero((dots < cos_lo) & (dots > cos_hi))[0]
+            # 最近的 n_b 颗作 B
+            for ib in cand[np.argsort(-dots[cand])][:n_b]:
+                mid = u[ia] + u[ib]
+                mid /= np.linalg.norm(mid)
+                r_cos = mid @ u[ia]
+                inner = np.nonzero(u @ mid > r_cos + 1e-12)[0]
+                inner = inner[(inner != ia) & (inner != ib)][:2]  # sel 已按星等排序
+                if len(inner) == 2:
+                    quads.add(tuple(sorted(sel[[ia, ib, inner[0], inner[1]]])))
+    quads = np.array(sorted(quads), dtype=np.int64)
+
+    # 每个四星组在其中心的切平面上计算码
+    center = unit[quads].sum(axis=1)
+    ra0, dec0 = astro._unit_to_radec(center[:, 0], center[:, 1], center[:, 2])
+    pts = np.empty(quads.shape, dtype=complex)
+    for i in range(4):
+        ra, dec = stars['ra'][quads[:, i]], stars['dec'][quads[:, i]]
+        r0, d0, r, d = map(np.radians, (ra0, dec0, ra, dec))
+        cos_c = np.sin(d0) * np.sin(d) + np.cos(d0) * np.cos(d) * np.cos(r - r0)
+        pts[:, i] = (np.cos(d) * np.sin(r - r0) +
+                     1j * (np.cos(d0) * np.sin(d) - np.sin(d0) * np.cos(d) * np.cos(r - r0))) / cos_c
+    # 图像 y 向下、北朝上时东在左：像素坐标 ≈ -(xi + i*eta)，与切平面只差旋转，码直接可比
+    codes, order = solver.quad_codes(pts)
+    out = np.zeros(len(quads), dtype=QUAD_DTYPE)
+    out['code'] = codes
+    out['key'] = solver.quad_hash_keys(codes)
+    out['stars'] = np.take_along_axis(quads, order, axis=1)
+    return out[np.argsort(out['key'], kind='stable')]
+
+
+def read_ongc(path):
+    """读取 OpenNGC，去掉重复与不存在的记录。返回 (rows, 俗名)。"""
+    import sqlite3
+    db = sqlite3.connect(path)
+    rows, names = [], {}
+    query = ("SELECT name, type, ra, dec, vmag, bmag, majax, messier, commonnames FROM objects "
+             "WHERE type NOT IN ('Dup', 'NonEx') AND ra IS NOT NULL")
+    for name, kind, ra, dec, vmag, bmag, majax, messier, common in db.execute(query):
+        kind = kind if kind in catalog.OBJECT_KINDS else 'Other'
+        mag = vmag if vmag is not None else bmag
+        rows.append((name, int(messier) if messier else 0, catalog.OBJECT_KINDS.index(kind),
+                     np.degrees(ra), np.degrees(dec), np.nan if mag is None else mag,
+                     np.nan if majax is None else majax))
+        if common:
+            names[name] = common.split(',')[0].strip()
+    db.close()
+    return rows, names
+
+
+def build_objects(stars, star_names, ongc_path):
+    """深空天体 + 亮星合并为按 (赤纬带, 赤经) 排序的结构化数组。"""
+    rows, names = read_ongc(ongc_path)
+    for s in stars:
+        oid = f"HIP {int(s['hip'])}"
+        rows.append((oid, 0, 0, float(s['ra']), float(s['dec']), float(s['mag']), 0.0))
+        if int(s['hip']) in star_names:
+            names[oid] = star_names[int(s['hip'])]
+    objects = np.array(rows, dtype=OBJECT_DTYPE)
+    zone = catalog.SkyCatalog._zone(objects['dec'])
+    return objects[np.lexsort((objects['ra'], zone))], names
+
+
+def run(hip_path, names_path, out_dir, ongc_path=None):
+    os.makedirs(out_dir, exist_ok=True)
+    stars = read_hip2(hip_path)
+    np.save(os.path.join(out_dir, "stars.npy"), stars)
+    print(f"stars: {len(stars)} (mag <= {MAG_LIMIT})")
+    star_names = {}
+    if names_path:
+        star_names = read_names(names_path)
+        names = {str(h): star_names[h] for h in stars['hip'].tolist() if h in star_names}
+        with open(os.path.join(out_dir, "star_names.json"), 'w', encoding='utf-8') as f:
+            json.dump(names, f, ensure_ascii=False, indent=0, sort_keys=True)
+        print(f"names: {len(names)}")
+    quads = build_quads(stars)
+    np.save(os.path.join(out_dir, "quads.npy"), quads)
+    print(f"quads: {len(quads)}")
+    if ongc_path:
+        objects, object_names = build_objects(stars, star_names, ongc_path)
+        np.save(os.path.join(out_dir, "objects.npy"), objects)
+        with open(os.path.join(out_dir, "object_names.json"), 'w', encoding='utf-8') as f:
+            json.dump(object_names, f, ensure_ascii=False, indent=0, sort_keys=True)
+        print(f"objects: {len(objects)} (named {len(object_names)})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hip", required=True)
+    parser.add_argument("--names")
+    parser.add_argument("--ongc")
+    parser.add_argument("--out", default=catalog.CATALOG_DIR)
+    args = parser.parse_args()
+    run(args.hip, args.names, args.out, args.ongc)
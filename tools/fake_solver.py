@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+模拟 solve-field / ASTAP 的替身可执行文件，用于在没有安装解析器与索引时测试本地解析后端。
+只用标准库；按命令行风格自动判断模式 (含 --dir 为 solve-field，含 -f 为 ASTAP)，
+输出与真实程序相同的结果文件 (solve-field: <out>.wcs + <out>.solved; ASTAP: <o>.ini + <o>.wcs)。
+
+环境变量:
+  FAKE_SOLVER_RA / FAKE_SOLVER_DEC  视场中心 (度)，缺省取命令行位置提示，再缺省为 M42
+  FAKE_SOLVER_SCALE                 像素比例 (角秒/像素)，缺省取尺度提示中值或 5.0
+  FAKE_SOLVER_SIZE                  图像尺寸 "宽x高"，缺省 1920x1080
+  FAKE_SOLVER_DELAY                 模拟解析耗时 (秒)
+  FAKE_SOLVER_FAIL=1                模拟无法匹配
+
+用法: STARLINK_LOCAL_SOLVER=tools/fake_solver.py python -m starlink.cli solve star.jpg --backend local
+      (测试 ASTAP 模式另设 STARLINK_LOCAL_KIND=astap)
+"""
+import os
+import sys
+import time
+
+# solve-field 中带参数的选项 (其余 -- 选项视为开关)
+_SF_VALUED = {"--dir", "--out", "--ra", "--dec", "--radius", "--scale-units", "--scale-low",
+              "--scale-high", "--cpulimit", "--downsample", "--new-fits", "--corr", "--rdls",
+              "--match", "--index-xyls", "--solved", "--wcs", "--axy"}
+
+
+def _fits_cards(cards):
+    lines = [f"{k:<8}= {v:>20}".ljust(80) if not isinstance(v, str)
+             else f"{k:<8}= '{v:<8}'".ljust(80) for k, v in cards]
+    lines.append("END".ljust(80))
+    return "".join(lines).ljust(-(-len(lines) * 80 // 2880) * 2880).encode("ascii")
+
+
+def _solution(ra_hint, dec_hint, scale_hint):
+    ra = float(os.getenv("FAKE_SOLVER_RA", ra_hint if ra_hint is not None else 83.82))
+    dec = float(os.getenv("FAKE_SOLVER_DEC", dec_hint if dec_hint is not None else -5.39))
+    scale = float(os.getenv("FAKE_SOLVER_SCALE", scale_hint or 5.0))
+    w, h = (int(v) for v in os.getenv("FAKE_SOLVER_SIZE", "1920x1080").lower().split("x"))
+    cd = scale / 3600.0
+    # 北上东左：CD1_1 为负；参考像素取图像中心
+    return [("CTYPE1", "RA---TAN"), ("CTYPE2", "DEC--TAN"),
+            ("CRVAL1", ra), ("CRVAL2", dec),
+            ("CRPIX1", (w + 1) / 2), ("CRPIX2", (h + 1) / 2),
+            ("CD1_1", -cd), ("CD1_2", 0.0), ("CD2_1", 0.0), ("CD2_2", cd),
+            ("IMAGEW", w), ("IMAGEH", h)]
+
+
+def solve_field(argv):
+    opts, files = {}, []
+    it = iter(argv)
+    for arg in it:
+        if arg in _SF_VALUED:
+            opts[arg] = next(it, "")
+        elif not arg.startswith("--"):
+            files.append(arg)
+    if not files or not os.path.exists(files[0]):
+        print("solve-field: no input file", file=sys.stderr)
+        return 1
+    out_dir = opts.get("--dir", ".")
+    stem = opts.get("--out") or os.path.splitext(os.path.basename(files[0]))[0]
+    base = os.path.join(out_dir, stem)
+    if os.getenv("FAKE_SOLVER_FAIL") == "1":
+        print("Did not solve (or no WCS file was written).")
+        return 0
+    scale = None
+    if "--scale-low" in opts and "--scale-high" in opts:
+        scale = (float(opts["--scale-low"]) + float(opts["--scale-high"])) / 2
+    cards = _solution(opts.get("--ra"), opts.get("--dec"), scale)
+    with open(base + ".wcs", "wb") as f:
+        f.write(_fits_cards([("SIMPLE", "T"), ("BITPIX", 8), ("NAXIS", 0)] + cards))
+    open(base + ".solved", "wb").close()
+    print(f"Field center: (RA,Dec) = ({cards[2][1]}, {cards[3][1]}) deg.")
+    return 0
+
+
+def astap(argv):
+    opts = dict(zip(argv[::2], argv[1:][::2]))
+    image = opts.get("-f")
+    if not image or not os.path.exists(image):
+        print("ASTAP: no input file", file=sys.stderr)
+        return 16
+    base = opts.get("-o") or os.path.splitext(image)[0]
+    if os.getenv("FAKE_SOLVER_FAIL") == "1":
+        with open(base + ".ini", "w") as f:
+            f.write("PLTSOLVD=F\nERROR=No solution found!\n")
+        return 1
+    ra = float(opts["-ra"]) * 15 if "-ra" in opts else None
+    dec = float(opts["-spd"]) - 90 if "-spd" in opts else None
+    cards = _solution(ra, dec, None)
+    with open(base + ".ini", "w") as f:
+        f.write("PLTSOLVD=T\n")
+        f.writelines(f"{k}={v}\n" for k, v in cards if not isinstance(v, str))
+    with open(base + ".wcs", "wb") as f:
+        f.write(_fits_cards([("SIMPLE", "T"), ("BITPIX", 8), ("NAXIS", 0)] + cards))
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    time.sleep(float(os.getenv("FAKE_SOLVER_DELAY", "0")))
+    return astap(argv) if "-f" in argv else solve_field(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())